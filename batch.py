@@ -0,0 +1,250 @@
+import logging
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from sha256 import K, H
+import md5
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on the number of messages processed together, keeps the lane arrays in the cache
+# friendly range and bounds the memory used by the padded copy of a group
+MAX_LANES = 1 << 14
+
+SHA256_K = np.array(K, dtype=np.uint32)
+SHA256_H = np.array(H, dtype=np.uint32)
+
+MD5_IV = np.array([md5.A_start, md5.B_start, md5.C_start, md5.D_start], dtype=np.uint32)
+
+# md5.STEPS with the k values as uint32 scalars, the round functions work on lane arrays unchanged
+MD5_STEPS = [(f, index, np.uint32(k), shift) for f, index, k, shift in md5.STEPS]
+
+def to_bytes(message):
+    """
+    This function converts a message into bytes, the same types as SHA256.update() are accepted.
+    Args:
+        message: A str or any object supporting the buffer protocol
+    """
+    if isinstance(message, str):
+        return message.encode('ascii') # encode to bytes object with ASCII format
+    return memoryview(message).cast('B').tobytes()
+
+def padded_block_count(length):
+    """
+    This function returns the number of 512-bit blocks a message of the given length occupies after padding.
+    Args:
+        length: Length of the message in bytes
+    """
+    return (length + 8) // 64 + 1 # one 0x80 byte and eight length bytes have to fit after the message
+
+def pack_lanes(messages, blocks, byteorder):
+    """
+    This function pads a group of messages that all need the same number of blocks
+    and returns their 32-bit words as a (words, lanes) uint32 array, one column per message.
+    Args:
+        messages: List of messages as bytes
+        blocks: Number of 512-bit blocks every message occupies after padding
+        byteorder: 'big' for SHA256, 'little' for MD5 (used for the words and the length field)
+    """
+    padded = bytearray()
+    for message in messages:
+        padded += message
+        padded.append(0x80)
+        padded += bytes(blocks * 64 - len(message) - 9)
+        padded += (len(message) * 8).to_bytes(8, byteorder)
+
+    dtype = '>u4' if byteorder == 'big' else '<u4'
+    words = np.frombuffer(padded, dtype=dtype).reshape(len(messages), blocks * 16)
+    # Transposed so that every word of the block is a contiguous row over all lanes
+    return np.ascontiguousarray(words.T, dtype=np.uint32)
+
+def group_by_blocks(messages):
+    """
+    This function groups the message indices by padded block count, every group is split into chunks of at most MAX_LANES.
+    Yields (blocks, indices) pairs.
+    Args:
+        messages: List of messages as bytes
+    """
+    groups = {}
+    for index, message in enumerate(messages):
+        groups.setdefault(padded_block_count(len(message)), []).append(index)
+
+    for blocks, indices in sorted(groups.items()):
+        for start in range(0, len(indices), MAX_LANES):
+            yield blocks, indices[start:start + MAX_LANES]
+
+def rotate_right(num, shift):
+    """
+    Lane-wise ROTR on a uint32 array, see sha256.rotate_right.
+    """
+    return (num >> np.uint32(shift)) | (num << np.uint32(32 - shift))
+
+def rotate_left(num, shift):
+    """
+    Lane-wise left rotation on a uint32 array, as used by MD5.
+    """
+    return (num << np.uint32(shift)) | (num >> np.uint32(32 - shift))
+
+def sha256_compress_lanes(state, words):
+    """
+    This function runs the SHA256 compression function on one block of every lane at once.
+    Args:
+        state: List of eight uint32 arrays, the chaining value of every lane
+        words: (16, lanes) uint32 array holding the block of every lane
+    """
+    # Prepare the message schedule (NIST sec 6.2.2) for all the lanes together
+    message_schedule = list(words)
+    for t in range(16, 64):
+        w15 = message_schedule[t-15]
+        w2 = message_schedule[t-2]
+        small_sigma_0 = rotate_right(w15, 7) ^ rotate_right(w15, 18) ^ (w15 >> np.uint32(3))
+        small_sigma_1 = rotate_right(w2, 17) ^ rotate_right(w2, 19) ^ (w2 >> np.uint32(10))
+        # uint32 arithmetic wraps, so no explicit mod 2**32 is needed
+        message_schedule.append(small_sigma_1 + message_schedule[t-7] + small_sigma_0 + message_schedule[t-16])
+
+    a, b, c, d, e, f, g, h = state
+    for t in range(64):
+        big_sigma_1 = rotate_right(e, 6) ^ rotate_right(e, 11) ^ rotate_right(e, 25)
+        choice = (e & f) ^ (~e & g)
+        t1 = h + big_sigma_1 + choice + SHA256_K[t] + message_schedule[t]
+
+        big_sigma_0 = rotate_right(a, 2) ^ rotate_right(a, 13) ^ rotate_right(a, 22)
+        majority = (a & b) ^ (a & c) ^ (b & c)
+        t2 = big_sigma_0 + majority
+
+        h = g
+        g = f
+        f = e
+        e = d + t1
+        d = c
+        c = b
+        b = a
+        a = t1 + t2
+
+    return [x + y for x, y in zip(state, (a, b, c, d, e, f, g, h))]
+
+def sha256_many(messages):
+    """
+    This function returns the SHA256 hashes of many independent messages, in the same order as the messages.
+    Messages are grouped by padded block count and every group is hashed with the
+    message schedule and compression rounds vectorized over uint32 lanes.
+    Args:
+        messages: Iterable of messages, each a str or any object supporting the buffer protocol
+    """
+    messages = [to_bytes(message) for message in messages]
+    digests = [None] * len(messages)
+
+    for blocks, indices in group_by_blocks(messages):
+        words = pack_lanes([messages[i] for i in indices], blocks, 'big')
+        lanes = len(indices)
+        state = [np.full(lanes, value, dtype=np.uint32) for value in SHA256_H]
+
+        for block in range(blocks):
+            state = sha256_compress_lanes(state, words[block * 16:(block + 1) * 16])
+
+        # One row of eight big-endian words per lane
+        output = np.stack(state, axis=1).astype('>u4').tobytes()
+        for lane, index in enumerate(indices):
+            digests[index] = output[lane * 32:(lane + 1) * 32]
+
+    return digests
+
+def md5_compress_lanes(state, words):
+    """
+    This function runs the MD5 compression function on one block of every lane at once.
+    Args:
+        state: List of four uint32 arrays, the chaining value of every lane
+        words: (16, lanes) uint32 array holding the little-endian words of the block of every lane
+    """
+    A, B, C, D = state
+    for f, index, k, shift in MD5_STEPS:
+        # uint32 arithmetic wraps, so no explicit mod 2**32 is needed
+        result = B + rotate_left(A + f(B, C, D) + words[index] + k, shift)
+
+        # rotate the values of the initialisation vectors
+        A, B, C, D = D, result, B, C
+
+    return [x + y for x, y in zip(state, (A, B, C, D))]
+
+def md5_many(messages):
+    """
+    This function returns the MD5 hashes of many independent messages, in the same order as the messages.
+    Messages are grouped by padded block count and every group runs the four rounds vectorized over uint32 lanes.
+    Args:
+        messages: Iterable of messages, each a str or any object supporting the buffer protocol
+    """
+    messages = [to_bytes(message) for message in messages]
+    digests = [None] * len(messages)
+
+    for blocks, indices in group_by_blocks(messages):
+        words = pack_lanes([messages[i] for i in indices], blocks, 'little')
+        lanes = len(indices)
+        state = [np.full(lanes, value, dtype=np.uint32) for value in MD5_IV]
+
+        for block in range(blocks):
+            state = md5_compress_lanes(state, words[block * 16:(block + 1) * 16])
+
+        # one row of four little-endian words per lane
+        output = np.stack(state, axis=1).astype('<u4').tobytes()
+        for lane, index in enumerate(indices):
+            digests[index] = output[lane * 16:(lane + 1) * 16]
+
+    return digests
+
+# Batched engines available to the command line
+ENGINES = {
+    'sha256': sha256_many,
+    'md5': md5_many,
+}
+
+if __name__ == "__main__":
+    from checksum import expand_paths, format_line
+
+    logging.basicConfig(format='%(asctime)s %(message)s')
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('files', nargs='*', help="Files, directories or glob patterns, hashed together as one batch")
+    parser.add_argument('--algo', choices=sorted(ENGINES), default='sha256', help="Hash algorithm (default: sha256)")
+    parser.add_argument('--throughput', action='store_true', help="Report the hashing throughput in messages/sec on stderr")
+    parser.add_argument('--benchmark', type=int, metavar='COUNT', help="Hash COUNT random messages instead of files and report the throughput")
+    parser.add_argument('--size', type=int, default=64, help="Size in bytes of every benchmark message (default: 64)")
+
+    args = parser.parse_args()
+    engine = ENGINES[args.algo]
+    if args.benchmark:
+        messages = [os.urandom(args.size) for _ in range(args.benchmark)]
+        start = time.perf_counter()
+        engine(messages)
+        elapsed = time.perf_counter() - start
+        print("{}: {} messages of {} bytes in {:.3f} s ({:.0f} messages/sec)".format(
+            args.algo, len(messages), args.size, elapsed, len(messages) / elapsed))
+        exit(0)
+
+    paths = expand_paths(args.files)
+    if not paths:
+        parser.error("no files given")
+
+    contents = []
+    for path in paths:
+        try:
+            with open(path, 'rb') as file:
+                contents.append(file.read())
+        except OSError as error:
+            logger.error("%s: %s", path, error.strerror or error)
+            exit(1)
+
+    start = time.perf_counter()
+    digests = engine(contents)
+    elapsed = time.perf_counter() - start
+
+    for path, digest in zip(paths, digests):
+        print(format_line(digest.hex(), path))
+    sys.stdout.flush()
+
+    if args.throughput:
+        print("{}: {} messages in {:.3f} s ({:.1f} messages/sec)".format(
+            args.algo, len(contents), elapsed, len(contents) / max(elapsed, 1e-9)), file=sys.stderr)
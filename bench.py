@@ -0,0 +1,323 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import sha256
+import sha2
+import md5
+import lea
+import checksum
+
+# Message sizes of the sweep: empty, the 55/56/64 byte padding edges (111/112/128 for SHA-384/512), then 1 KB up to 100 MB
+SIZES = [0, 55, 56, 64, 111, 112, 128, 1 << 10, 1 << 16, 1 << 20, 10 << 20, 100 << 20]
+
+def lea_hash(message):
+    """
+    This function hashes a message through lea.py's SHA256, i.e. the path used by the length extension attack.
+    Args:
+        message: The message to be hashed
+    """
+    return lea.SHA256().generate_hash(bytes(message), sha256.H)
+
+# Engines measured by the benchmark, name -> (our hash function, hashlib equivalent, coreutils command, block size)
+ENGINES = {
+    'sha256': (lambda message: sha256.SHA256(message).digest(), hashlib.sha256, 'sha256sum', 64),
+    'md5': (lambda message: md5.MD5(message).digest(), hashlib.md5, 'md5sum', 64),
+    'lea': (lea_hash, hashlib.sha256, 'sha256sum', 64),
+    'sha224': (lambda message: sha2.SHA224(message).digest(), hashlib.sha224, 'sha224sum', 64),
+    'sha384': (lambda message: sha2.SHA384(message).digest(), hashlib.sha384, 'sha384sum', 128),
+    'sha512': (lambda message: sha2.SHA512(message).digest(), hashlib.sha512, 'sha512sum', 128),
+}
+
+# Compression functions compared by --compress, (label, step by step, straight-line, initial state, block size).
+# The step by step baseline is the refactored reference_compress(), not the original generate_hash() loop
+COMPRESSIONS = [
+    ('sha256', sha256.reference_compress, sha256.compress, sha256.H, 64),
+    ('md5', md5.reference_compress, md5.compress, (md5.A_start, md5.B_start, md5.C_start, md5.D_start), 64),
+    ('sha512', sha2.reference_compress, sha2.compress, sha2.H512, 128),
+]
+
+def padded_blocks(size, block_size=64):
+    """
+    This function returns the number of blocks compressed for a message of the given size.
+    The padding needs one byte plus the length, 8 bytes for 64 byte blocks and 16 bytes for 128 byte blocks.
+    Args:
+        size: Size of the message in bytes
+        block_size: Block size of the hash in bytes
+    """
+    return (size + block_size // 8) // block_size + 1
+
+def time_call(function, message, min_time):
+    """
+    This function calls function(message) repeatedly for at least min_time seconds and returns the seconds per call.
+    Everything runs in this process, so interpreter startup is not part of the measurement.
+    Args:
+        function: The function to be timed
+        message: Its argument
+        min_time: Minimum total time to measure for (in seconds)
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function(message)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / number
+        number *= 2
+
+def coreutils_digest(command, message):
+    """
+    This function returns the digest of a message computed by a command line utility such as sha256sum or md5sum,
+    or None if the utility is not installed.
+    Args:
+        command: Name of the utility
+        message: The message to be hashed
+    """
+    if shutil.which(command) is None:
+        return None
+    with tempfile.NamedTemporaryFile() as file:
+        file.write(message)
+        file.flush()
+        output = subprocess.run([command, file.name], capture_output=True, text=True, check=True).stdout
+    return bytes.fromhex(output.split()[0])
+
+def run_sweep(engines, sizes, min_time):
+    """
+    This function measures every engine on every message size and returns the list of results.
+    Each result records the throughput in MB/s, the µs per block and the ns per message byte for our engine
+    and for hashlib, and whether the digest matched both hashlib and the coreutils utility.
+    The per-byte cost compares engines with different block sizes, e.g. SHA-256 against SHA-512.
+    Args:
+        engines: Names of the engines to measure, keys of ENGINES
+        sizes: Message sizes in bytes
+        min_time: Minimum time to measure every case for (in seconds)
+    """
+    results = []
+    for size in sizes:
+        message = os.urandom(size)
+        for name in engines:
+            function, reference, command, block_size = ENGINES[name]
+            digest = function(message)
+            expected = reference(message).digest()
+            tool_digest = coreutils_digest(command, message)
+            blocks = padded_blocks(size, block_size)
+
+            seconds = time_call(function, message, min_time)
+            reference_seconds = time_call(lambda data: reference(data).digest(), message, min_time)
+            results.append({
+                'engine': name,
+                'size': size,
+                'blocks': blocks,
+                'mb_per_s': size / seconds / 1e6,
+                'us_per_block': seconds / blocks * 1e6,
+                'ns_per_byte': seconds / size * 1e9 if size else None,
+                'hashlib_mb_per_s': size / reference_seconds / 1e6,
+                'hashlib_us_per_block': reference_seconds / blocks * 1e6,
+                'verified': digest == expected and (tool_digest is None or digest == tool_digest),
+            })
+    return results
+
+def compare(results, baseline, tolerance):
+    """
+    This function compares the µs per block of every case with a baseline run and returns the cases that got slower
+    by more than the tolerance, as (engine, size, baseline µs/block, current µs/block).
+    Args:
+        results: Results of the current run
+        baseline: Results of an earlier run, as loaded from its JSON output
+        tolerance: Allowed slowdown as a fraction, e.g. 0.1 for 10%
+    """
+    previous = {(result['engine'], result['size']): result for result in baseline}
+    slower = []
+    for result in results:
+        before = previous.get((result['engine'], result['size']))
+        if before is not None and result['us_per_block'] > before['us_per_block'] * (1 + tolerance):
+            slower.append((result['engine'], result['size'], before['us_per_block'], result['us_per_block']))
+    return slower
+
+def compress_throughput(compress_function, initial_state, data, block_size=64):
+    """
+    This function runs a compression function over every block of data and returns the throughput in MB/s.
+    Args:
+        compress_function: Function taking (state, block, offset) and returning the new state
+        initial_state: Chaining value to start from
+        data: Buffer holding the blocks, a trailing partial block is left out
+        block_size: Block size of the compression function in bytes
+    """
+    state = list(initial_state)
+    end = len(data) - len(data) % block_size
+    start = time.perf_counter()
+    for offset in range(0, end, block_size):
+        state = compress_function(state, data, offset)
+    elapsed = time.perf_counter() - start
+    return end / elapsed / 1e6
+
+class ThrottledReader(io.RawIOBase):
+    """
+    Raw stream over in-memory data that delivers at most rate bytes per second, standing in for slow or
+    network-backed storage. The delay is a sleep, which releases the GIL like a real blocking read does.
+    started and finished count the reads that returned data, so a caller can tell whether a read was in flight.
+    """
+    def __init__(self, data, rate):
+        self._data = memoryview(data)
+        self._position = 0
+        self._rate = rate
+        self.started = 0
+        self.finished = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = min(len(buffer), len(self._data) - self._position)
+        if count:
+            self.started += 1
+        buffer[:count] = self._data[self._position:self._position + count]
+        self._position += count
+        time.sleep(count / self._rate)
+        if count:
+            self.finished += 1
+        return count
+
+def pipeline_benchmark(size, rate, depth, buffer_size, algorithm='sha256'):
+    """
+    This function hashes size bytes from throttled storage with and without the read_ahead() pipeline and returns
+    the seconds spent on I/O alone, on hashing alone, on both in series and on both overlapped. For the pipeline it
+    also returns the number of updates and how many of them overlapped a read of the reader thread, which does not
+    depend on timing: every update but the last one should overlap the read of a later buffer.
+    Args:
+        size: Number of bytes to hash
+        rate: Storage speed in bytes per second, None to match the measured hashing speed (the worst case for serial reads)
+        depth: Number of read ahead buffers
+        buffer_size: Size of every read in bytes
+        algorithm: Name of the hash algorithm
+    """
+    data = os.urandom(size)
+    checksum.new(algorithm, data[:64]) # warm up, generates the straight-line function if needed
+
+    start = time.perf_counter()
+    hasher = checksum.new(algorithm)
+    for offset in range(0, size, buffer_size):
+        hasher.update(data[offset:offset + buffer_size])
+    cpu = time.perf_counter() - start
+    rate = rate or size / cpu
+
+    buffer = bytearray(buffer_size)
+    start = time.perf_counter()
+    reader = ThrottledReader(data, rate)
+    while reader.readinto(buffer):
+        pass
+    io_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reader = ThrottledReader(data, rate)
+    hasher = checksum.new(algorithm)
+    with memoryview(buffer) as view:
+        while True:
+            count = reader.readinto(buffer)
+            if not count:
+                break
+            hasher.update(view[:count])
+    serial = time.perf_counter() - start
+    expected = hasher.digest()
+
+    start = time.perf_counter()
+    reader = ThrottledReader(data, rate)
+    hasher = checksum.new(algorithm)
+    updates = overlapped = 0
+    for chunk in checksum.read_ahead(reader, depth, buffer_size):
+        finished = reader.finished
+        hasher.update(chunk)
+        updates += 1
+        # A read overlapped this update if it started before the update returned and had not finished when it began
+        if reader.started > finished:
+            overlapped += 1
+    pipelined = time.perf_counter() - start
+
+    return {'io': io_time, 'cpu': cpu, 'serial': serial, 'pipelined': pipelined, 'updates': updates,
+            'overlapped': overlapped, 'verified': hasher.digest() == expected}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--engines', type=str, default=','.join(ENGINES), help="Comma separated engines to measure (default: {})".format(','.join(ENGINES)))
+    parser.add_argument('--max-size', type=int, default=1 << 20, help="Largest message size of the sweep in bytes, up to 100 MB (default: 1 MiB)")
+    parser.add_argument('--min-time', type=float, default=0.2, help="Minimum time to measure every case for in seconds (default: 0.2)")
+    parser.add_argument('--json', type=str, metavar='FILE', help="Write the results as JSON to FILE ('-' for stdout)")
+    parser.add_argument('--baseline', type=str, metavar='FILE', help="JSON output of an earlier run, fail if any case got slower")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed slowdown against --baseline as a fraction (default: 0.2)")
+    parser.add_argument('--compress', action='store_true', help="Only compare the step by step reference_compress() with the straight-line compress()")
+    parser.add_argument('--blocks', type=int, default=2000, help="Number of 64 byte blocks worth of data for --compress (default: 2000)")
+    parser.add_argument('--pipeline', action='store_true', help="Only compare serial reads with the read ahead pipeline on throttled storage")
+    parser.add_argument('--pipeline-size', type=int, default=1 << 18, help="Bytes hashed by --pipeline (default: 256 KiB)")
+    parser.add_argument('--io-rate', type=float, help="Storage speed for --pipeline in MB/s (default: the measured hashing speed)")
+    parser.add_argument('--depth', type=int, default=2, help="Number of read ahead buffers for --pipeline (default: 2)")
+    parser.add_argument('--buffer-size', type=int, default=1 << 14, help="Read size for --pipeline in bytes (default: 16 KiB)")
+
+    args = parser.parse_args()
+    if args.compress:
+        data = os.urandom(args.blocks * 64)
+        for label, step_by_step, straight_line, initial_state, block_size in COMPRESSIONS:
+            straight_line(list(initial_state), data) # warm up, generates the straight-line function if needed
+            before = compress_throughput(step_by_step, initial_state, data, block_size)
+            after = compress_throughput(straight_line, initial_state, data, block_size)
+            print("{}: reference_compress {:.3f} MB/s, compress {:.3f} MB/s ({:.2f}x)".format(label, before, after, after / before))
+        exit(0)
+
+    if args.pipeline:
+        result = pipeline_benchmark(args.pipeline_size, args.io_rate and args.io_rate * 1e6, args.depth, args.buffer_size)
+        print("I/O {io:.3f} s, hashing {cpu:.3f} s, serial {serial:.3f} s, pipelined {pipelined:.3f} s".format(**result))
+        print("pipelined / max(I/O, hashing) = {:.2f}, serial / max(I/O, hashing) = {:.2f}".format(
+            result['pipelined'] / max(result['io'], result['cpu']), result['serial'] / max(result['io'], result['cpu'])))
+        print("{overlapped} of {updates} updates overlapped a read".format(**result))
+        exit(0 if result['verified'] else 1)
+
+    engines = args.engines.split(',')
+    for name in engines:
+        if name not in ENGINES:
+            parser.error("unknown engine {}".format(name))
+
+    sizes = [size for size in SIZES if size <= args.max_size]
+    results = run_sweep(engines, sizes, args.min_time)
+
+    # Human readable table on stderr when the JSON goes to stdout
+    table = sys.stderr if args.json == '-' else sys.stdout
+    print("{:<8} {:>10} {:>12} {:>12} {:>10} {:>14} {:>9}".format('engine', 'size', 'MB/s', 'us/block', 'ns/byte', 'hashlib MB/s', 'verified'), file=table)
+    for result in results:
+        print("{engine:<8} {size:>10} {mb_per_s:>12.3f} {us_per_block:>12.2f} {ns_per_byte:>10} {hashlib_mb_per_s:>14.1f} {verified!s:>9}".format(
+            **dict(result, ns_per_byte='-' if result['ns_per_byte'] is None else '{:.1f}'.format(result['ns_per_byte']))), file=table)
+
+    report = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'timestamp': time.time(),
+        'results': results,
+    }
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    elif args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=1)
+            file.write('\n')
+
+    status = 0
+    if not all(result['verified'] for result in results):
+        print("Failed: digests do not match hashlib/coreutils", file=sys.stderr)
+        status = 1
+    if args.baseline:
+        with open(args.baseline) as file:
+            slower = compare(results, json.load(file)['results'], args.tolerance)
+        for engine, size, before, after in slower:
+            print("Slower: {} {} bytes {:.2f} -> {:.2f} us/block".format(engine, size, before, after), file=sys.stderr)
+        if slower:
+            status = 1
+    exit(status)
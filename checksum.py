@@ -0,0 +1,457 @@
+import logging
+import argparse
+import importlib
+import os
+import glob
+import mmap
+import queue
+import stat
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1 << 20 # read files 1 MiB at a time
+
+# Hash algorithms available to the command line, name -> (module, class)
+# The modules are imported lazily so that worker processes only load what they use
+ALGORITHMS = {
+    'sha256': ('sha256', 'SHA256'),
+    'md5': ('md5', 'MD5'),
+    'sha224': ('sha2', 'SHA224'),
+    'sha384': ('sha2', 'SHA384'),
+    'sha512': ('sha2', 'SHA512'),
+}
+
+def new(algorithm, message=None):
+    """
+    This function returns a new hasher object for the given algorithm.
+    Args:
+        algorithm: Name of the hash algorithm, one of the keys of ALGORITHMS
+        message: Optional initial data to feed into the hasher
+    """
+    module_name, class_name = ALGORITHMS[algorithm]
+    return getattr(importlib.import_module(module_name), class_name)(message)
+
+def parse_algorithms(text):
+    """
+    This function splits a comma separated list of algorithm names such as "md5,sha256", dropping repeated names.
+    Raises ValueError for unknown names.
+    Args:
+        text: The list of names
+    """
+    algorithms = []
+    for name in text.split(','):
+        name = name.strip().lower()
+        if name not in ALGORITHMS:
+            raise ValueError("unknown hash algorithm {!r}, expected one of {}".format(name, ', '.join(sorted(ALGORITHMS))))
+        if name not in algorithms:
+            algorithms.append(name)
+    return algorithms
+
+class MultiHasher:
+    """
+    Several hashers behind one update(), so that every chunk of the input is read once and fed to all of them.
+    digest() and hexdigest() return one digest per algorithm, in the order the algorithms were given.
+    """
+    def __init__(self, algorithms, message=None):
+        """
+        Args:
+            algorithms: Names of the hash algorithms, keys of ALGORITHMS
+            message: Optional initial data to feed into the hashers
+        """
+        self.algorithms = list(algorithms)
+        self.hashers = [new(algorithm) for algorithm in self.algorithms]
+        if message is not None:
+            self.update(message)
+
+    def update(self, message):
+        """
+        This function feeds the next chunk of the message into every hasher.
+        Args:
+            message: The next chunk, a str or any object supporting the buffer protocol
+        """
+        for hasher in self.hashers:
+            hasher.update(message)
+        return self
+
+    def digest(self):
+        """
+        This function returns the list of digests of the data so far, one per algorithm.
+        """
+        return [hasher.digest() for hasher in self.hashers]
+
+    def hexdigest(self):
+        """
+        This function returns the list of hex digests of the data so far, one per algorithm.
+        """
+        return [hasher.hexdigest() for hasher in self.hashers]
+
+    def copy(self):
+        """
+        This function returns an independent copy of all the hashers.
+        """
+        other = self.__class__.__new__(self.__class__)
+        other.algorithms = list(self.algorithms)
+        other.hashers = [hasher.copy() for hasher in self.hashers]
+        return other
+
+def update_mapped(hasher, file):
+    """
+    This function feeds a whole file into the hasher through a read-only memory mapping, so the compression loop reads
+    straight from the page cache and only the padded tail is ever copied.
+    Returns False, without touching the hasher, if the file cannot be mapped (pipes, character devices, empty files, ...).
+    Args:
+        hasher: The hasher object to update
+        file: The file object opened in binary mode
+    """
+    try:
+        info = os.fstat(file.fileno())
+        if not stat.S_ISREG(info.st_mode) or info.st_size == 0:
+            return False
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return False
+
+    try:
+        if hasattr(mapping, 'madvise'):
+            mapping.madvise(mmap.MADV_SEQUENTIAL) # let the kernel read ahead aggressively
+        hasher.update(mapping)
+    finally:
+        mapping.close()
+    return True
+
+def read_ahead(file, depth=2, buffer_size=CHUNK_SIZE):
+    """
+    This function yields the contents of a file as memoryviews while a reader thread keeps reading ahead,
+    so waiting for the disk overlaps with whatever the caller does with the data (e.g. compressing it).
+    The reader fills a fixed set of depth preallocated bytearrays with readinto() and hands them over through a queue,
+    depth=2 being classic double buffering. A yielded view is only valid until the next one is requested,
+    as its buffer is then handed back to the reader.
+    Args:
+        file: File object opened in binary mode, unbuffered (buffering=0) avoids an extra copy
+        depth: Number of buffers, i.e. how far the reader may run ahead
+        buffer_size: Size of every buffer in bytes
+    """
+    free = queue.Queue()
+    full = queue.Queue()
+    for _ in range(max(depth, 1)):
+        free.put(bytearray(buffer_size))
+    stop = threading.Event()
+
+    def reader():
+        try:
+            while True:
+                buffer = free.get()
+                if stop.is_set():
+                    return
+                with memoryview(buffer) as view:
+                    filled = 0
+                    # readinto may return short reads, fill the whole buffer unless the file ends
+                    while filled < buffer_size:
+                        count = file.readinto(view[filled:])
+                        if not count:
+                            break
+                        filled += count
+                full.put((buffer, filled, None))
+                if filled < buffer_size:
+                    full.put((None, 0, None))
+                    return
+        except BaseException as error:
+            full.put((None, 0, error))
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    try:
+        while True:
+            buffer, filled, error = full.get()
+            if error is not None:
+                raise error
+            if buffer is None:
+                return
+            if filled:
+                with memoryview(buffer) as view, view[:filled] as data:
+                    yield data
+            free.put(buffer)
+    finally:
+        # Unblock the reader if the caller stopped early
+        stop.set()
+        free.put(None)
+        thread.join()
+
+def update_stream(hasher, file, depth=0, buffer_size=CHUNK_SIZE, tee=None):
+    """
+    This function feeds a stream into the hasher in fixed size chunks, so that memory stays flat whatever its length.
+    It works on pipes and sockets as well as on regular files.
+    Args:
+        hasher: The hasher object to update
+        file: File object opened in binary mode
+        depth: Read ahead in a reader thread with this many buffers (see read_ahead()), 0 to read in this thread
+        buffer_size: Size of the chunks read at a time
+        tee: Optional binary file object every chunk is also written to, unchanged
+    """
+    if depth:
+        chunks = read_ahead(file, depth, buffer_size)
+    else:
+        chunks = iter(lambda: file.read(buffer_size), b'')
+    for chunk in chunks:
+        if tee is not None:
+            tee.write(chunk)
+        hasher.update(chunk)
+
+def hash_file(path, algorithm, use_mmap=False, depth=0, buffer_size=CHUNK_SIZE, tee=None):
+    """
+    This function returns the hex digest of a file, reading it in fixed size chunks so that memory stays flat.
+    Given a list of algorithms, the file is still read once and the list of their hex digests is returned.
+    Args:
+        path: Path of the file to be hashed, '-' for stdin
+        algorithm: Name of the hash algorithm, or a list of names
+        use_mmap: Map the file read-only instead of reading it, falls back to chunked reads if it cannot be mapped
+        depth: Read ahead in a reader thread with this many buffers (see read_ahead()), 0 to read in this thread
+        buffer_size: Size of the chunks read at a time
+        tee: Optional binary file object the data is copied to while it is hashed
+    """
+    hasher = new(algorithm) if isinstance(algorithm, str) else MultiHasher(algorithm)
+    if path == '-':
+        update_stream(hasher, sys.stdin.buffer, depth, buffer_size, tee)
+        return hasher.hexdigest()
+
+    with open(path, 'rb', buffering=0 if depth else -1) as file:
+        if tee is not None or not (use_mmap and update_mapped(hasher, file)):
+            update_stream(hasher, file, depth, buffer_size, tee)
+    return hasher.hexdigest()
+
+def expand_paths(patterns):
+    """
+    This function expands globs and directories into the list of files to be hashed.
+    Directories are walked recursively in sorted order so the output is reproducible.
+    Plain paths are passed through untouched, even if they do not exist, so that the error is reported for them.
+    Args:
+        patterns: List of paths, glob patterns or directories
+    """
+    paths = []
+    for pattern in patterns:
+        if any(char in pattern for char in '*?['):
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                matches = [pattern]
+        else:
+            matches = [pattern]
+
+        for match in matches:
+            if os.path.isdir(match):
+                for root, dirs, files in os.walk(match):
+                    dirs.sort()
+                    for name in sorted(files):
+                        paths.append(os.path.join(root, name))
+            else:
+                paths.append(match)
+    return paths
+
+def order_paths(arguments, file_options, positionals):
+    """
+    This function merges the -f values and the positional paths back into command line order.
+    parse_intermixed_args() collects the two separately, so the command line is walked again to interleave them.
+    Args:
+        arguments: The command line arguments, without the program name
+        file_options: The values of -f, in order
+        positionals: The positional paths, in order
+    """
+    ordered = []
+    file_options = list(file_options)
+    positionals = list(positionals)
+    tokens = iter(arguments)
+    for token in tokens:
+        if token == '--':
+            break
+        if token == '-f' and file_options:
+            next(tokens, None)
+            ordered.append(file_options.pop(0))
+        elif token.startswith('-f') and not token.startswith('--') and file_options:
+            ordered.append(file_options.pop(0))
+        elif positionals and token == positionals[0]:
+            ordered.append(positionals.pop(0))
+    return ordered + file_options + positionals
+
+def format_line(digest, path):
+    """
+    This function formats a result line the same way as sha256sum/md5sum, i.e. "<digest>  <path>".
+    Like the coreutils tools, a path containing a backslash or newline is escaped and the line starts with a backslash.
+    Args:
+        digest: Hex digest of the file
+        path: Path of the file
+    """
+    if '\\' in path or '\n' in path:
+        return '\\{}  {}'.format(digest, path.replace('\\', '\\\\').replace('\n', '\\n'))
+    return '{}  {}'.format(digest, path)
+
+def format_tagged_line(algorithm, digest, path):
+    """
+    This function formats a result line in the BSD style of `sha256sum --tag`, i.e. "SHA256 (<path>) = <digest>",
+    which names the algorithm so that several digests of a file can be listed together.
+    Args:
+        algorithm: Name of the hash algorithm
+        digest: Hex digest of the file
+        path: Path of the file
+    """
+    if '\\' in path or '\n' in path:
+        return '\\{} ({}) = {}'.format(algorithm.upper(), path.replace('\\', '\\\\').replace('\n', '\\n'), digest)
+    return '{} ({}) = {}'.format(algorithm.upper(), path, digest)
+
+def hash_files(paths, algorithm, jobs=1, use_mmap=False, depth=0, buffer_size=CHUNK_SIZE, tee=None):
+    """
+    This function hashes the files and yields (path, digest, error) in the same order as the paths.
+    With more than one job the files are spread over a process pool, otherwise they are hashed in this process.
+    stdin ('-') is always read by this process.
+    Args:
+        paths: List of files to be hashed, '-' for stdin
+        algorithm: Name of the hash algorithm, or a list of names to compute all of them in one pass over every file
+        jobs: Number of worker processes
+        use_mmap: Hash the files through read-only memory mappings
+        depth: Number of read ahead buffers of a reader thread per file, 0 for none
+        buffer_size: Size of the chunks read at a time
+        tee: Optional binary file object the data of every file is copied to in order, hashes in this process
+    """
+    if jobs <= 1 or len(paths) <= 1 or tee is not None:
+        for path in paths:
+            try:
+                yield path, hash_file(path, algorithm, use_mmap, depth, buffer_size, tee), None
+            except OSError as error:
+                yield path, None, error
+        return
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as executor:
+        futures = [None if path == '-' else executor.submit(hash_file, path, algorithm, use_mmap, depth, buffer_size)
+                   for path in paths]
+        for path, future in zip(paths, futures):
+            try:
+                if future is None:
+                    yield path, hash_file(path, algorithm, use_mmap, depth, buffer_size), None
+                else:
+                    yield path, future.result(), None
+            except OSError as error:
+                yield path, None, error
+
+def tree_main(paths, algorithm, leaf_size, jobs, manifest):
+    """
+    This function prints the Merkle tree hash of every file, with the leaves of each file spread over one shared process pool.
+    Returns the exit status.
+    Args:
+        paths: List of files to be hashed
+        algorithm: Name of the hash algorithm
+        leaf_size: Size of a leaf in bytes
+        jobs: Number of worker processes
+        manifest: Whether to store the leaf digests next to every file
+    """
+    import merkle
+
+    status = 0
+    executor = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    try:
+        for path in paths:
+            try:
+                tree = merkle.tree_hash(path, leaf_size, algorithm, executor)
+                if manifest:
+                    merkle.write_manifest(tree, path + '.merkle.json')
+            except OSError as error:
+                logger.error("%s: %s", path, error.strerror or error)
+                status = 1
+                continue
+            print(merkle.format_tree_line(tree, path))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return status
+
+def main(algorithm):
+    """
+    This function is the command line entry point shared by sha256.py, md5.py and sha2.py.
+    Args:
+        algorithm: Name of the hash algorithm the script implements, the default of --algo
+    """
+    logging.basicConfig(format='%(asctime)s %(message)s')
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('files', nargs='*', help="Files, directories or glob patterns to find the checksum of, '-' or none for stdin")
+    parser.add_argument('--algo', type=str, default=algorithm,
+                        help="Hash algorithm, or a comma separated list such as md5,sha256 computed in one pass over every file "
+                             "and printed as tagged lines (default: {}; one of {})".format(algorithm, ', '.join(ALGORITHMS)))
+    parser.add_argument('-f', type=str, action='append', default=[], help="Name of the file to find the checksum (can be repeated)")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument('--self-test', action='store_true', help="Regenerate the constant tables and check them against the frozen ones")
+    parser.add_argument('--mmap', action='store_true', help="Hash files through read-only memory mappings, falls back to chunked reads for pipes and unmappable files")
+    parser.add_argument('--tree', type=int, nargs='?', const=1 << 20, metavar='LEAF_SIZE', help="Merkle tree hash with leaves of LEAF_SIZE bytes (default: 1 MiB) hashed in parallel")
+    parser.add_argument('--manifest', action='store_true', help="With --tree, store the leaf digests of every file in <file>.merkle.json")
+    parser.add_argument('--read-ahead', type=int, default=0, metavar='DEPTH', help="Read files in a separate thread with DEPTH buffers, overlapping I/O with hashing (default: 0, off)")
+    parser.add_argument('--buffer-size', type=int, default=CHUNK_SIZE, help="Size of the chunks files are read in (default: {})".format(CHUNK_SIZE))
+    parser.add_argument('--tee', action='store_true', help="Copy the input through to stdout unchanged and print the digests to stderr")
+    parser.add_argument('--digest-file', type=str, metavar='FILE', help="With --tee, write the digest lines to FILE instead of stderr")
+    parser.add_argument('--stats', action='store_true', help="Print per-phase call counts and timings, blocks and bytes to stderr (hashes in this process)")
+    parser.add_argument('--breakdown', action='store_true', help="With --stats, time the message schedule and the rounds separately (uses the slower reference compression)")
+    parser.add_argument('--profile', type=str, metavar='FILE', help="Write cProfile output of the hashing run to FILE, readable with pstats (hashes in this process)")
+
+    # Options may come between the paths like with sha256sum, e.g. "a -j 4 b"
+    args = parser.parse_intermixed_args()
+    try:
+        algorithms = parse_algorithms(args.algo)
+    except ValueError as error:
+        parser.error(str(error))
+    # A single algorithm keeps the plain sha256sum/md5sum output, several give tagged lines
+    algorithm = algorithms[0] if len(algorithms) == 1 else algorithms
+    if args.self_test:
+        for name in algorithms:
+            if not importlib.import_module(ALGORITHMS[name][0]).verify_constants():
+                logger.error("Frozen constant tables of %s do not match the generated ones", name)
+                exit(1)
+        print("Constant tables verified")
+        exit(0)
+
+    # Like sha256sum, no files at all means stdin
+    paths = expand_paths(order_paths(sys.argv[1:], args.f, args.files)) or ['-']
+
+    if args.tree is not None and args.tree <= 0:
+        parser.error("--tree leaf size must be positive")
+    if args.tree is not None and '-' in paths:
+        parser.error("--tree needs regular files, it cannot read stdin")
+    if args.tree is not None and len(algorithms) > 1:
+        parser.error("--tree takes a single algorithm")
+    if args.tee and args.tree is not None:
+        parser.error("--tee cannot be combined with --tree")
+    if args.digest_file and not args.tee:
+        parser.error("--digest-file requires --tee")
+    if args.manifest and args.tree is None:
+        parser.error("--manifest requires --tree")
+    if args.breakdown and not args.stats:
+        parser.error("--breakdown requires --stats")
+    if args.read_ahead < 0 or args.buffer_size <= 0:
+        parser.error("--read-ahead must not be negative and --buffer-size must be positive")
+
+    # Worker processes would collect their own stats, so measured runs hash everything in this process
+    jobs = 1 if args.stats or args.profile else args.jobs
+
+    # With --tee stdout carries the data, so the digest lines go to stderr or the digest file
+    tee = sys.stdout.buffer if args.tee else None
+    output = sys.stdout
+    if args.tee:
+        output = open(args.digest_file, 'w') if args.digest_file else sys.stderr
+
+    import instrument
+    with instrument.measure(args.stats, args.breakdown, args.profile):
+        if args.tree is not None:
+            status = tree_main(paths, algorithm, args.tree, jobs, args.manifest)
+        else:
+            status = 0
+            for path, digest, error in hash_files(paths, algorithm, jobs, args.mmap, args.read_ahead, args.buffer_size, tee):
+                if error is not None:
+                    logger.error("%s: %s", path, error.strerror or error)
+                    status = 1
+                elif len(algorithms) == 1:
+                    print(format_line(digest, path), file=output)
+                else:
+                    for name, value in zip(algorithms, digest):
+                        print(format_tagged_line(name, value, path), file=output)
+        sys.stdout.flush()
+    if output not in (sys.stdout, sys.stderr):
+        output.close()
+    exit(status)
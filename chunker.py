@@ -0,0 +1,324 @@
+import logging
+import argparse
+import collections
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import checksum
+
+logger = logging.getLogger(__name__)
+
+# Default chunk sizes in bytes, the average has to be a power of two
+MIN_SIZE = 2 << 10
+AVG_SIZE = 8 << 10
+MAX_SIZE = 64 << 10
+
+MASK_64 = 0xffffffffffffffff
+
+def gear_table(seed=0):
+    """
+    This function returns the 256 pseudo random 64-bit values of the Gear rolling hash, one per byte value.
+    They come from splitmix64 so that every run and every machine cuts the same boundaries.
+    Args:
+        seed: Seed of the generator, changing it changes all the boundaries
+    """
+    table = []
+    state = seed
+    for _ in range(256):
+        state = (state + 0x9e3779b97f4a7c15) & MASK_64
+        value = state
+        value = ((value ^ (value >> 30)) * 0xbf58476d1ce4e5b9) & MASK_64
+        value = ((value ^ (value >> 27)) * 0x94d049bb133111eb) & MASK_64
+        table.append(value ^ (value >> 31))
+    return tuple(table)
+
+GEAR = gear_table()
+
+def boundary_masks(avg_size):
+    """
+    This function returns the (strict, loose) cut masks for normalized chunking (FastCDC).
+    Before the average size a boundary needs one more zero bit than the average implies, after it one less,
+    which pulls the chunk sizes towards the average. The masks use the top bits of the hash, as in the Gear hash
+    bit k only depends on the last k + 1 bytes, so the top bits cover a 64 byte window.
+    Args:
+        avg_size: The average chunk size, a power of two
+    """
+    bits = avg_size.bit_length() - 1
+    strict = ((1 << (bits + 1)) - 1) << (64 - bits - 1)
+    loose = ((1 << (bits - 1)) - 1) << (64 - bits + 1)
+    return strict, loose
+
+def find_boundary(data, start, end, min_size, avg_size, max_size):
+    """
+    This function returns the end of the chunk starting at start, rolling the Gear hash over the bytes after min_size.
+    Args:
+        data: Buffer holding the data
+        start: Start of the chunk in the buffer
+        end: End of the data available in the buffer
+        min_size: Minimum chunk size, no boundary is looked for before it
+        avg_size: Average chunk size, a power of two
+        max_size: Maximum chunk size, a boundary is forced there
+    """
+    if end - start <= min_size:
+        return end
+    strict, loose = boundary_masks(avg_size)
+    normal = min(start + avg_size, end)
+    end = min(start + max_size, end)
+    gear = GEAR
+    h = 0
+    for position in range(start + min_size, normal):
+        h = ((h << 1) + gear[data[position]]) & MASK_64
+        if not h & strict:
+            return position + 1
+    for position in range(normal, end):
+        h = ((h << 1) + gear[data[position]]) & MASK_64
+        if not h & loose:
+            return position + 1
+    return end
+
+def chunk_stream(file, min_size=MIN_SIZE, avg_size=AVG_SIZE, max_size=MAX_SIZE, read_size=checksum.CHUNK_SIZE):
+    """
+    This function splits a stream into content-defined chunks and yields (offset, chunk) pairs.
+    The boundaries only depend on the bytes around them, so an insert or delete only changes the chunks it touches.
+    At most read_size + max_size bytes are buffered, whatever the size of the stream.
+    Args:
+        file: File object opened in binary mode
+        min_size: Minimum chunk size
+        avg_size: Average chunk size, a power of two
+        max_size: Maximum chunk size
+        read_size: Number of bytes read at a time
+    """
+    buffer = bytearray()
+    start = 0 # start of the next chunk in the buffer
+    offset = 0 # position of the next chunk in the stream
+    eof = False
+    while True:
+        # Keep at least max_size bytes ahead of start, unless the stream is over
+        if not eof and len(buffer) - start < max_size:
+            del buffer[:start]
+            start = 0
+            data = file.read(max(read_size, max_size))
+            if data:
+                buffer += data
+                continue
+            eof = True
+        if start == len(buffer):
+            return
+
+        cut = find_boundary(buffer, start, len(buffer), min_size, avg_size, max_size)
+        chunk = bytes(buffer[start:cut])
+        yield offset, chunk
+        offset += len(chunk)
+        start = cut
+
+def hash_chunk(chunk, algorithm='sha256'):
+    """
+    This function returns the hex digest of one chunk.
+    Args:
+        chunk: The chunk data
+        algorithm: Name of the hash algorithm
+    """
+    return checksum.new(algorithm, chunk).hexdigest()
+
+def hash_chunks(chunks, algorithm='sha256', executor=None, window=64):
+    """
+    This function hashes a stream of (offset, chunk) pairs and yields (offset, digest, chunk) in the same order.
+    With an executor up to window chunks are being hashed in the workers while the next ones are cut,
+    so chunking and hashing overlap and memory stays bounded.
+    Args:
+        chunks: Iterable of (offset, chunk), e.g. from chunk_stream()
+        algorithm: Name of the hash algorithm
+        executor: Optional concurrent.futures executor for the hashing
+        window: Maximum number of chunks in flight with an executor
+    """
+    if executor is None:
+        for offset, chunk in chunks:
+            yield offset, hash_chunk(chunk, algorithm), chunk
+        return
+
+    pending = collections.deque()
+    for offset, chunk in chunks:
+        pending.append((offset, chunk, executor.submit(hash_chunk, chunk, algorithm)))
+        if len(pending) >= window:
+            offset, chunk, future = pending.popleft()
+            yield offset, future.result(), chunk
+    while pending:
+        offset, chunk, future = pending.popleft()
+        yield offset, future.result(), chunk
+
+class ChunkIndex:
+    """
+    Index of the chunks seen so far: the size of every chunk by digest and the list of chunks of every file.
+    It is saved as JSON so that later runs only report, store or transfer chunks that are new.
+    """
+    def __init__(self, algorithm='sha256', min_size=MIN_SIZE, avg_size=AVG_SIZE, max_size=MAX_SIZE):
+        self.algorithm = algorithm
+        self.min_size = min_size
+        self.avg_size = avg_size
+        self.max_size = max_size
+        self.chunks = {} # digest -> size
+        self.files = {} # path -> list of digests
+
+    def add_file(self, path, entries):
+        """
+        This function records the chunks of a file and returns the list of the digests that were not known before.
+        Args:
+            path: Path of the file
+            entries: List of (digest, size) in file order
+        """
+        new = []
+        for digest, size in entries:
+            if digest not in self.chunks:
+                self.chunks[digest] = size
+                new.append(digest)
+        self.files[path] = [digest for digest, _ in entries]
+        return new
+
+    def shared_chunks(self):
+        """
+        This function returns {digest: sorted list of files} for every chunk that occurs in more than one file.
+        """
+        owners = collections.defaultdict(set)
+        for path, digests in self.files.items():
+            for digest in digests:
+                owners[digest].add(path)
+        return {digest: sorted(paths) for digest, paths in owners.items() if len(paths) > 1}
+
+    def summary(self):
+        """
+        This function returns the number of chunk references, unique chunks, total bytes and unique bytes as a dict.
+        """
+        references = [digest for digests in self.files.values() for digest in digests]
+        total = sum(self.chunks[digest] for digest in references)
+        unique = sum(self.chunks.values())
+        return {'chunks': len(references), 'unique_chunks': len(self.chunks), 'bytes': total, 'unique_bytes': unique}
+
+    def save(self, path):
+        """
+        This function writes the index as JSON, through a temporary file so that it is replaced atomically.
+        Args:
+            path: Path of the index
+        """
+        data = {
+            'algorithm': self.algorithm,
+            'min_size': self.min_size,
+            'avg_size': self.avg_size,
+            'max_size': self.max_size,
+            'chunks': self.chunks,
+            'files': self.files,
+        }
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.chunker-')
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump(data, file)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        This function reads an index written by save().
+        Args:
+            path: Path of the index
+        """
+        with open(path) as file:
+            data = json.load(file)
+        index = cls(data['algorithm'], data['min_size'], data['avg_size'], data['max_size'])
+        index.chunks = data['chunks']
+        index.files = data['files']
+        return index
+
+def store_chunk(directory, digest, chunk):
+    """
+    This function writes a chunk to a content addressed store as <directory>/<first 2 hex digits>/<digest>,
+    unless it is already there.
+    Args:
+        directory: Root directory of the store
+        digest: Hex digest of the chunk
+        chunk: The chunk data
+    """
+    folder = os.path.join(directory, digest[:2])
+    path = os.path.join(folder, digest)
+    if os.path.exists(path):
+        return
+    os.makedirs(folder, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=folder, prefix='.chunk-')
+    with os.fdopen(descriptor, 'wb') as file:
+        file.write(chunk)
+    os.replace(temporary, path)
+
+def chunk_file(path, index, executor=None, store=None):
+    """
+    This function chunks and hashes one file, adds it to the index and returns (number of chunks, new digests).
+    Only new chunks are written to the store.
+    Args:
+        path: Path of the file
+        index: The ChunkIndex to add the file to, which also holds the chunk sizes and hash algorithm
+        executor: Optional executor for the hashing stage
+        store: Optional directory of a content addressed chunk store
+    """
+    entries = []
+    with open(path, 'rb') as file:
+        chunks = chunk_stream(file, index.min_size, index.avg_size, index.max_size)
+        for offset, digest, chunk in hash_chunks(chunks, index.algorithm, executor):
+            if store is not None and digest not in index.chunks:
+                store_chunk(store, digest, chunk)
+            entries.append((digest, len(chunk)))
+    return len(entries), index.add_file(path, entries)
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(asctime)s %(message)s')
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('files', nargs='+', help="Files, directories or glob patterns to chunk")
+    parser.add_argument('--min-size', type=int, default=MIN_SIZE, help="Minimum chunk size in bytes (default: {})".format(MIN_SIZE))
+    parser.add_argument('--avg-size', type=int, default=AVG_SIZE, help="Average chunk size in bytes, a power of two (default: {})".format(AVG_SIZE))
+    parser.add_argument('--max-size', type=int, default=MAX_SIZE, help="Maximum chunk size in bytes (default: {})".format(MAX_SIZE))
+    parser.add_argument('--algo', choices=sorted(checksum.ALGORITHMS), default='sha256', help="Hash algorithm of the chunks (default: sha256)")
+    parser.add_argument('--index', type=str, help="JSON chunk index to load if it exists and to save afterwards")
+    parser.add_argument('--store', type=str, metavar='DIR', help="Write the new chunks to a content addressed store in DIR")
+    parser.add_argument('--shared', action='store_true', help="List the chunks shared by more than one file")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help="Number of worker processes hashing the chunks (default: number of CPUs)")
+
+    args = parser.parse_args()
+    if args.avg_size < 64 or args.avg_size & (args.avg_size - 1):
+        parser.error("--avg-size must be a power of two of at least 64")
+    if not 0 < args.min_size < args.avg_size < args.max_size:
+        parser.error("chunk sizes must satisfy 0 < min < avg < max")
+
+    if args.index and os.path.exists(args.index):
+        index = ChunkIndex.load(args.index)
+        if (index.algorithm, index.min_size, index.avg_size, index.max_size) != \
+           (args.algo, args.min_size, args.avg_size, args.max_size):
+            logger.error("%s was built with other chunk sizes or another hash algorithm", args.index)
+            exit(1)
+    else:
+        index = ChunkIndex(args.algo, args.min_size, args.avg_size, args.max_size)
+
+    status = 0
+    executor = ProcessPoolExecutor(max_workers=args.jobs) if args.jobs > 1 else None
+    try:
+        for path in checksum.expand_paths(args.files):
+            try:
+                count, new = chunk_file(path, index, executor, args.store)
+            except OSError as error:
+                logger.error("%s: %s", path, error.strerror or error)
+                status = 1
+                continue
+            print("{}: {} chunks, {} new".format(path, count, len(new)))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if args.shared:
+        for digest, paths in sorted(index.shared_chunks().items()):
+            print("{}  {}".format(digest, ' '.join(paths)))
+
+    summary = index.summary()
+    saved = summary['bytes'] - summary['unique_bytes']
+    print("{chunks} chunks, {unique_chunks} unique, {bytes} bytes, {unique_bytes} unique bytes".format(**summary), file=sys.stderr)
+    print("dedup saves {} bytes ({:.1f}%)".format(saved, 100 * saved / summary['bytes'] if summary['bytes'] else 0), file=sys.stderr)
+    if args.index:
+        index.save(args.index)
+    exit(status)
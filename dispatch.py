@@ -0,0 +1,413 @@
+import logging
+import argparse
+import collections
+import hashlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import md5
+import sha256
+
+logger = logging.getLogger(__name__)
+
+# Environment variables: force one backend (skips calibration), let the dispatcher use hashlib,
+# and move the calibration cache
+BACKEND_ENV = 'HASH_BACKEND'
+ALLOW_HASHLIB_ENV = 'HASH_ALLOW_HASHLIB'
+CACHE_ENV = 'HASH_CALIBRATION_CACHE'
+
+DEFAULT_CACHE = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+                             'sha256-md5', 'calibration.json')
+
+# Bumped whenever the backends or the cost model change, older cache files are then recalibrated
+CALIBRATION_VERSION = 1
+
+# Calibration shapes: one block, LONG_BLOCKS blocks, and a batch of LANES one-block messages
+LONG_BLOCKS = 9
+LANES = 256
+
+# Minimum time of one timing sample, short calls are repeated until they take this long
+SAMPLE_TIME = 0.01
+
+ALGORITHMS = ('sha256', 'md5')
+
+class ReferenceSHA256(sha256.SHA256):
+    """
+    SHA256 running the step by step reference compression function instead of the generated one.
+    """
+    def _compressor(self):
+        return sha256.reference_compress
+
+class ReferenceMD5(md5.MD5):
+    """
+    MD5 running the step by step reference compression function instead of the generated one.
+    """
+    def _compressor(self):
+        return md5.reference_compress
+
+REFERENCE_CLASSES = {'sha256': ReferenceSHA256, 'md5': ReferenceMD5}
+OPTIMIZED_CLASSES = {'sha256': sha256.SHA256, 'md5': md5.MD5}
+
+def reference_backend(algorithm, messages):
+    """
+    This function hashes every message on its own with the reference compression function.
+    Args:
+        algorithm: 'sha256' or 'md5'
+        messages: List of messages as bytes-like objects
+    """
+    cls = REFERENCE_CLASSES[algorithm]
+    return [cls(message).digest() for message in messages]
+
+def optimized_backend(algorithm, messages):
+    """
+    This function hashes every message on its own with the generated straight-line compression function.
+    Args:
+        algorithm: 'sha256' or 'md5'
+        messages: List of messages as bytes-like objects
+    """
+    cls = OPTIMIZED_CLASSES[algorithm]
+    return [cls(message).digest() for message in messages]
+
+def numpy_backend(algorithm, messages):
+    """
+    This function hashes the messages together over NumPy lanes, see batch.py.
+    Args:
+        algorithm: 'sha256' or 'md5'
+        messages: List of messages as bytes-like objects
+    """
+    import batch
+    return batch.ENGINES[algorithm](messages)
+
+def hashlib_backend(algorithm, messages):
+    """
+    This function passes the messages through to hashlib, only used when explicitly allowed.
+    Args:
+        algorithm: 'sha256' or 'md5'
+        messages: List of messages as bytes-like objects
+    """
+    return [hashlib.new(algorithm, message).digest() for message in messages]
+
+# Backend name -> (function, kind). A 'scalar' backend costs call + blocks * block per message,
+# a 'batch' backend costs call + blocks * (block + lanes * lane) per group of messages with the same block count
+BACKENDS = {
+    'reference': (reference_backend, 'scalar'),
+    'optimized': (optimized_backend, 'scalar'),
+    'numpy': (numpy_backend, 'batch'),
+    'hashlib': (hashlib_backend, 'scalar'),
+}
+
+def block_count(length):
+    """
+    This function returns the number of 512-bit blocks a message of the given length occupies after padding,
+    the same for SHA256 and MD5.
+    Args:
+        length: Length of the message in bytes
+    """
+    return (length + 8) // 64 + 1
+
+def available_backends(algorithm):
+    """
+    This function returns the names of the backends that can run on this interpreter, whether allowed or not.
+    Args:
+        algorithm: 'sha256' or 'md5'
+    """
+    names = ['reference', 'optimized']
+    try:
+        import numpy
+        names.append('numpy')
+    except ImportError:
+        pass
+    if algorithm in hashlib.algorithms_available:
+        names.append('hashlib')
+    return names
+
+def cpu_model():
+    """
+    This function returns a description of the CPU, the model name from /proc/cpuinfo where there is one.
+    """
+    try:
+        with open('/proc/cpuinfo') as file:
+            for line in file:
+                if line.startswith('model name'):
+                    return line.partition(':')[2].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+def machine_key():
+    """
+    This function returns the key the calibration of this interpreter and CPU is cached under.
+    """
+    return '{} {} {} {}'.format(platform.python_implementation(), platform.python_version(),
+                                platform.machine(), cpu_model())
+
+def time_call(function, repeat=5):
+    """
+    This function returns the best time in seconds of one call of the function over a few samples.
+    Fast calls are repeated within a sample so that the timer resolution does not matter.
+    Args:
+        function: Function without arguments
+        repeat: Number of samples
+    """
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    number = max(1, int(SAMPLE_TIME / max(elapsed, 1e-9)))
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+def calibrate_backend(name, algorithm):
+    """
+    This function measures the cost model of one backend and returns it as a dict of seconds
+    with the keys 'call', 'block' and 'lane' (see BACKENDS).
+    Args:
+        name: Name of the backend
+        algorithm: 'sha256' or 'md5'
+    """
+    run, kind = BACKENDS[name]
+    one_block = [bytes(block_count(0) * 64 - 9)]
+    long_message = [bytes(LONG_BLOCKS * 64 - 9)]
+    # The first call generates the compression function or imports numpy, which is not part of the cost
+    run(algorithm, one_block)
+
+    one = time_call(lambda: run(algorithm, one_block))
+    long = time_call(lambda: run(algorithm, long_message))
+    lane = 0.0
+    if kind == 'batch':
+        wide = time_call(lambda: run(algorithm, one_block * LANES))
+        lane = max(0.0, (wide - one) / (LANES - 1))
+    # one = call + block + lane and long = call + LONG_BLOCKS * (block + lane)
+    block = max(0.0, (long - one) / (LONG_BLOCKS - 1) - lane)
+    call = max(0.0, one - block - lane)
+    return {'call': call, 'block': block, 'lane': lane}
+
+def calibrate(algorithms=ALGORITHMS):
+    """
+    This function measures every available backend for every algorithm, algorithm -> backend -> cost model.
+    Takes about a second with the pure Python backends.
+    Args:
+        algorithms: Names of the algorithms to calibrate
+    """
+    return {algorithm: {name: calibrate_backend(name, algorithm) for name in available_backends(algorithm)}
+            for algorithm in algorithms}
+
+def estimate(name, costs, blocks):
+    """
+    This function returns the estimated seconds a backend takes for messages of the given block counts.
+    Args:
+        name: Name of the backend
+        costs: Its cost model from calibrate_backend()
+        blocks: List of the padded block counts of the messages
+    """
+    if BACKENDS[name][1] == 'scalar':
+        return len(blocks) * costs['call'] + sum(blocks) * costs['block']
+    return sum(costs['call'] + count * (costs['block'] + lanes * costs['lane'])
+               for count, lanes in collections.Counter(blocks).items())
+
+def load_cache(path):
+    """
+    This function returns the contents of the calibration cache, an empty cache if it is missing, outdated or unreadable.
+    Args:
+        path: Path of the cache file
+    """
+    try:
+        with open(path) as file:
+            data = json.load(file)
+        if data.get('version') == CALIBRATION_VERSION and isinstance(data.get('machines'), dict):
+            return data
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {'version': CALIBRATION_VERSION, 'machines': {}}
+
+def save_cache(path, data):
+    """
+    This function writes the calibration cache through a temporary file so that it is replaced atomically.
+    Args:
+        path: Path of the cache file, its directory is created if needed
+        data: The cache contents
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=directory, prefix='.calibration-')
+    try:
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump(data, file, indent=1, sort_keys=True)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+class Dispatcher:
+    """
+    Chooses the fastest backend for every call by message size and batch shape, from a one-time calibration
+    that is cached on disk per interpreter version and CPU (see machine_key()).
+    A backend forced through HASH_BACKEND is always used and no calibration is run, as long as it can run here
+    for every algorithm (see available_backends()). hashlib can only be forced when it is allowed as well.
+    """
+    def __init__(self, cache_path=None, allow_hashlib=None, backend=None):
+        """
+        Args:
+            cache_path: Path of the calibration cache, defaults to $HASH_CALIBRATION_CACHE or DEFAULT_CACHE
+            allow_hashlib: Whether hashlib may be chosen, defaults to HASH_ALLOW_HASHLIB=1 in the environment
+            backend: Backend to force, defaults to $HASH_BACKEND, None to choose by calibration.
+                     Forcing an unavailable backend, or hashlib without allowing it, raises ValueError.
+        """
+        self.cache_path = cache_path or os.environ.get(CACHE_ENV) or DEFAULT_CACHE
+        if allow_hashlib is None:
+            allow_hashlib = os.environ.get(ALLOW_HASHLIB_ENV) == '1'
+        self.allow_hashlib = allow_hashlib
+        self.backend = backend or os.environ.get(BACKEND_ENV) or None
+        if self.backend is not None and self.backend not in BACKENDS:
+            raise ValueError("Unknown hash backend {}, expected one of {}".format(self.backend, ', '.join(BACKENDS)))
+        if self.backend == 'hashlib' and not self.allow_hashlib:
+            raise ValueError("The hashlib backend is not allowed, set {}=1 to force it".format(ALLOW_HASHLIB_ENV))
+        if self.backend is not None:
+            missing = [algorithm for algorithm in ALGORITHMS if self.backend not in available_backends(algorithm)]
+            if missing:
+                raise ValueError("The {} backend is not available for {} on this interpreter".format(
+                    self.backend, ', '.join(missing)))
+        self._costs = None
+
+    def costs(self, recalibrate=False):
+        """
+        This function returns the calibration of this machine, algorithm -> backend -> cost model.
+        It is read from the cache, and measured and written back if the cache has none or misses a backend.
+        Args:
+            recalibrate: Measure again even if the cache is up to date
+        """
+        if self._costs is not None and not recalibrate:
+            return self._costs
+
+        data = load_cache(self.cache_path)
+        key = machine_key()
+        costs = data['machines'].get(key)
+        complete = isinstance(costs, dict) and all(
+            name in costs.get(algorithm, {}) for algorithm in ALGORITHMS for name in available_backends(algorithm))
+        if recalibrate or not complete:
+            logger.info("Calibrating the hash backends for %s", key)
+            costs = calibrate()
+            data['machines'][key] = costs
+            try:
+                save_cache(self.cache_path, data)
+            except OSError as error:
+                logger.warning("Could not write the calibration cache %s: %s", self.cache_path, error.strerror or error)
+        self._costs = costs
+        return costs
+
+    def choose(self, algorithm, blocks):
+        """
+        This function returns the name of the backend with the lowest estimated time.
+        Args:
+            algorithm: 'sha256' or 'md5'
+            blocks: List of the padded block counts of the messages
+        """
+        if self.backend is not None:
+            return self.backend
+        costs = self.costs()[algorithm]
+        candidates = [name for name in available_backends(algorithm)
+                      if name in costs and (name != 'hashlib' or self.allow_hashlib)]
+        return min(candidates, key=lambda name: estimate(name, costs[name], blocks))
+
+    def generate_hashes(self, algorithm, messages):
+        """
+        This function returns the digests of many independent messages, in the same order as the messages,
+        all hashed by the backend chosen for the batch.
+        Args:
+            algorithm: 'sha256' or 'md5'
+            messages: Iterable of messages, each a str or any object supporting the buffer protocol
+        """
+        if algorithm not in ALGORITHMS:
+            raise ValueError("Unsupported hash algorithm {}".format(algorithm))
+        messages = [message.encode('ascii') if isinstance(message, str) else message for message in messages]
+        if not messages:
+            return []
+        blocks = [block_count(memoryview(message).nbytes) for message in messages]
+        return BACKENDS[self.choose(algorithm, blocks)][0](algorithm, messages)
+
+    def generate_hash(self, algorithm, message):
+        """
+        This function returns the digest of one message, like SHA256().generate_hash() and MD5().generate_hash().
+        Args:
+            algorithm: 'sha256' or 'md5'
+            message: A str or any object supporting the buffer protocol
+        """
+        return self.generate_hashes(algorithm, [message])[0]
+
+# The dispatcher behind the module level functions, created on first use
+_dispatcher = None
+
+def default_dispatcher():
+    """
+    This function returns the shared Dispatcher, configured from the environment.
+    """
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = Dispatcher()
+    return _dispatcher
+
+def generate_hash(algorithm, message):
+    """
+    This function returns the digest of one message through the shared dispatcher.
+    Args:
+        algorithm: 'sha256' or 'md5'
+        message: A str or any object supporting the buffer protocol
+    """
+    return default_dispatcher().generate_hash(algorithm, message)
+
+def generate_hashes(algorithm, messages):
+    """
+    This function returns the digests of many messages through the shared dispatcher.
+    Args:
+        algorithm: 'sha256' or 'md5'
+        messages: Iterable of messages, each a str or any object supporting the buffer protocol
+    """
+    return default_dispatcher().generate_hashes(algorithm, messages)
+
+# Shapes shown by the command line, (number of messages, message size)
+SHAPES = [(1, 64), (1, 1 << 20), (16, 64), (256, 64), (4096, 64), (256, 4096)]
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(message)s', level=logging.INFO)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--recalibrate', action='store_true', help="Measure the backends again and update the cache")
+    parser.add_argument('--cache', type=str, help="Calibration cache (default: ${} or {})".format(CACHE_ENV, DEFAULT_CACHE))
+    parser.add_argument('--allow-hashlib', action='store_true', help="Let the dispatcher choose hashlib (also ${}=1)".format(ALLOW_HASHLIB_ENV))
+    parser.add_argument('--algo', choices=ALGORITHMS, help="Only show this algorithm (default: both)")
+    parser.add_argument('-n', type=int, help="Show the backend chosen for N messages of --size bytes instead of the usual shapes")
+    parser.add_argument('--size', type=int, default=64, help="Message size in bytes for -n (default: 64)")
+
+    args = parser.parse_args()
+    try:
+        dispatcher = Dispatcher(args.cache, args.allow_hashlib or None)
+    except ValueError as error:
+        logger.error("%s", error)
+        exit(1)
+
+    algorithms = [args.algo] if args.algo else list(ALGORITHMS)
+    if dispatcher.backend is None:
+        costs = dispatcher.costs(args.recalibrate)
+        print("{}  ({})".format(machine_key(), dispatcher.cache_path))
+        print("{:<8} {:<10} {:>12} {:>12} {:>12}".format('algo', 'backend', 'us/call', 'us/block', 'us/lane'))
+        for algorithm in algorithms:
+            for name, model in costs[algorithm].items():
+                print("{:<8} {:<10} {:>12.2f} {:>12.2f} {:>12.2f}".format(
+                    algorithm, name, model['call'] * 1e6, model['block'] * 1e6, model['lane'] * 1e6))
+    else:
+        print("{} forced by ${}".format(dispatcher.backend, BACKEND_ENV))
+
+    shapes = [(args.n, args.size)] if args.n else SHAPES
+    for algorithm in algorithms:
+        for count, size in shapes:
+            print("{} x {} bytes {}: {}".format(count, size, algorithm,
+                                               dispatcher.choose(algorithm, [block_count(size)] * count)))
+    sys.stdout.flush()
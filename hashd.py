@@ -0,0 +1,339 @@
+import logging
+import argparse
+import asyncio
+import collections
+import json
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import checksum
+
+logger = logging.getLogger(__name__)
+
+# Size of the pieces a request body is read and compressed in, also bounds the memory used per request
+CHUNK_SIZE = 1 << 18 # 256 KiB
+
+# Number of recent request latencies kept for the p50/p99 of the stats endpoint
+LATENCY_WINDOW = 10000
+
+def update_state(algorithm, state, chunk):
+    """
+    This function resumes a hasher from its exported state, feeds it one chunk and returns the new exported state.
+    It runs in the worker pool, so only the small state and the chunk travel between the processes.
+    Args:
+        algorithm: Name of the hash algorithm
+        state: State returned by export_state(), or None for a new hasher
+        chunk: The next chunk of the request body
+    """
+    hasher = checksum.new(algorithm) if state is None else type(checksum.new(algorithm)).from_state(state)
+    hasher.update(chunk)
+    return hasher.export_state()
+
+def finish_state(algorithm, state):
+    """
+    This function returns the hex digest of an exported hasher state.
+    Args:
+        algorithm: Name of the hash algorithm
+        state: State returned by export_state(), or None for an empty message
+    """
+    hasher = checksum.new(algorithm) if state is None else type(checksum.new(algorithm)).from_state(state)
+    return hasher.hexdigest()
+
+def percentile(values, fraction):
+    """
+    This function returns the given percentile of a list of values (nearest rank), or 0 for an empty list.
+    Args:
+        values: The values
+        fraction: The percentile as a fraction, e.g. 0.99
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class Stats:
+    """
+    Counters and recent latencies of the service, served as JSON by GET /stats.
+    """
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+
+    def as_dict(self):
+        """
+        This function returns the stats as a dict, latencies in milliseconds and throughput in MB/s since start.
+        """
+        uptime = time.time() - self.started
+        latencies = list(self.latencies)
+        return {
+            'uptime': uptime,
+            'requests': self.requests,
+            'errors': self.errors,
+            'bytes': self.bytes,
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'throughput_mb_per_s': self.bytes / uptime / 1e6 if uptime else 0.0,
+            'requests_per_s': self.requests / uptime if uptime else 0.0,
+            'latency_p50_ms': percentile(latencies, 0.50) * 1e3,
+            'latency_p99_ms': percentile(latencies, 0.99) * 1e3,
+        }
+
+class HashService:
+    """
+    Local hashing service. An asyncio front end speaks a minimal HTTP/1.1 over TCP or a Unix socket:
+        POST /<algorithm>   hashes the request body (Content-Length or chunked) and answers with the hex digest,
+                            PUT is accepted too so that `curl -T file` works
+        GET /stats          answers with the Stats as JSON
+    Bodies are read in CHUNK_SIZE pieces that are compressed in a worker pool while the next piece is being read.
+    A request only reads its next piece once the previous one is compressed, so a slow pool pushes back on the
+    clients through TCP flow control, and at most `concurrency` requests are hashed at the same time.
+    """
+    def __init__(self, workers=None, concurrency=64, pool='process'):
+        """
+        Args:
+            workers: Number of workers in the pool (default: number of CPUs)
+            concurrency: Maximum number of requests hashed at the same time, the others wait
+            pool: 'process' to compress in worker processes, 'thread' to use threads (no pickling, but the GIL)
+        """
+        workers = workers or os.cpu_count() or 1
+        if pool == 'process':
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.workers = workers
+        self.limit = asyncio.Semaphore(concurrency)
+        self.stats = Stats()
+
+    async def warm_up(self):
+        """
+        This function starts the workers and has them generate the compression functions of every algorithm,
+        so that the engines are loaded once up front instead of during the first requests.
+        """
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, finish_state, algorithm, None)
+                               for algorithm in checksum.ALGORITHMS for _ in range(self.workers)))
+
+    async def hash_body(self, algorithm, chunks):
+        """
+        This function hashes a request body given as an async iterator of chunks and returns the hex digest.
+        Reading the next chunk overlaps with the compression of the previous one in the pool.
+        Args:
+            algorithm: Name of the hash algorithm
+            chunks: Async iterator over the chunks of the body
+        """
+        loop = asyncio.get_running_loop()
+        state = None
+        pending = None
+        async for chunk in chunks:
+            self.stats.bytes += len(chunk)
+            if pending is not None:
+                state = await pending
+            pending = loop.run_in_executor(self.executor, update_state, algorithm, state, chunk)
+        if pending is not None:
+            state = await pending
+        return await loop.run_in_executor(self.executor, finish_state, algorithm, state)
+
+    async def handle_connection(self, reader, writer):
+        """
+        This function serves the requests of one client connection until it is closed.
+        Args:
+            reader: The asyncio StreamReader of the connection
+            writer: The asyncio StreamWriter of the connection
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, headers = await read_request_head(request_line, reader)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                if headers.get('expect', '').lower() == '100-continue':
+                    # curl waits for this before it sends larger bodies
+                    writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+
+                if method == 'GET' and path == '/stats':
+                    await respond(writer, 200, json.dumps(self.stats.as_dict()) + '\n', 'application/json')
+                elif method in ('POST', 'PUT') and path.strip('/') in checksum.ALGORITHMS:
+                    await self.handle_hash(path.strip('/'), headers, reader, writer)
+                else:
+                    await drain_body(headers, reader)
+                    await respond(writer, 404, "Unknown endpoint\n")
+
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError) as error:
+            self.stats.errors += 1
+            await respond(writer, 400, "Bad request: {}\n".format(error))
+        except ConnectionError:
+            pass
+        except Exception as error:
+            # e.g. BrokenProcessPool after a worker died, the client still gets an answer
+            self.stats.errors += 1
+            logger.error("Request failed: %r", error)
+            try:
+                await respond(writer, 500, "Internal error: {}\n".format(error))
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    async def handle_hash(self, algorithm, headers, reader, writer):
+        """
+        This function hashes the body of one POST/PUT request within the concurrency limit and sends the digest.
+        Args:
+            algorithm: Name of the hash algorithm
+            headers: The request headers (lower case names)
+            reader: The asyncio StreamReader of the connection
+            writer: The asyncio StreamWriter of the connection
+        """
+        start = time.perf_counter()
+        # A request cancelled while it queues (client gone, timeout) must leave the waiting count as well
+        self.stats.waiting += 1
+        try:
+            await self.limit.acquire()
+        finally:
+            self.stats.waiting -= 1
+        self.stats.in_flight += 1
+        try:
+            digest = await self.hash_body(algorithm, read_body(headers, reader))
+        finally:
+            self.stats.in_flight -= 1
+            self.limit.release()
+        self.stats.requests += 1
+        self.stats.latencies.append(time.perf_counter() - start)
+        await respond(writer, 200, digest + '\n')
+
+    async def serve(self, host='127.0.0.1', port=8256, unix=None):
+        """
+        This function runs the service until it is cancelled.
+        Args:
+            host: Address to listen on, localhost by default
+            port: TCP port to listen on
+            unix: Path of a Unix socket to listen on instead of TCP
+        """
+        await self.warm_up()
+        if unix:
+            server = await asyncio.start_unix_server(self.handle_connection, path=unix)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+        logger.info("Listening on %s", unix or "{}:{}".format(host, port))
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        """
+        This function shuts the worker pool down.
+        """
+        self.executor.shutdown()
+
+async def read_request_head(request_line, reader):
+    """
+    This function parses the request line and the headers of an HTTP request.
+    Returns (method, path, headers) with the header names in lower case.
+    Args:
+        request_line: The first line of the request
+        reader: The asyncio StreamReader to read the headers from
+    """
+    parts = request_line.decode('latin-1').split()
+    if len(parts) != 3:
+        raise ValueError("malformed request line")
+    method, path, _ = parts
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return method, path, headers
+
+async def read_body(headers, reader):
+    """
+    This function yields the request body in chunks of at most CHUNK_SIZE bytes,
+    for both Content-Length and chunked transfer encoding.
+    Args:
+        headers: The request headers (lower case names)
+        reader: The asyncio StreamReader of the connection
+    """
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                # skip the trailers up to the final empty line
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return
+            while size > 0:
+                chunk = await reader.readexactly(min(size, CHUNK_SIZE))
+                size -= len(chunk)
+                yield chunk
+            await reader.readline() # CRLF after every chunk
+    else:
+        remaining = int(headers.get('content-length', 0))
+        while remaining > 0:
+            chunk = await reader.readexactly(min(remaining, CHUNK_SIZE))
+            remaining -= len(chunk)
+            yield chunk
+
+async def drain_body(headers, reader):
+    """
+    This function reads and drops the body of a request that is not hashed.
+    Args:
+        headers: The request headers (lower case names)
+        reader: The asyncio StreamReader of the connection
+    """
+    async for _ in read_body(headers, reader):
+        pass
+
+async def respond(writer, status, body, content_type='text/plain'):
+    """
+    This function sends an HTTP response.
+    Args:
+        writer: The asyncio StreamWriter of the connection
+        status: HTTP status code
+        body: The response body as a str
+        content_type: The Content-Type of the body
+    """
+    reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}
+    payload = body.encode('utf-8')
+    writer.write("HTTP/1.1 {} {}\r\nContent-Type: {}\r\nContent-Length: {}\r\n\r\n".format(
+        status, reasons.get(status, ''), content_type, len(payload)).encode('latin-1') + payload)
+    await writer.drain()
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(asctime)s %(message)s', level=logging.INFO)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', type=str, default='127.0.0.1', help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8256, help="TCP port to listen on (default: 8256)")
+    parser.add_argument('--unix', type=str, help="Listen on this Unix socket instead of TCP")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help="Number of workers compressing the bodies (default: number of CPUs)")
+    parser.add_argument('--concurrency', type=int, default=64, help="Maximum number of requests hashed at the same time (default: 64)")
+    parser.add_argument('--pool', choices=['process', 'thread'], default='process', help="Worker pool type (default: process)")
+
+    args = parser.parse_args()
+
+    async def run():
+        service = HashService(args.jobs, args.concurrency, args.pool)
+        serving = asyncio.ensure_future(service.serve(args.host, args.port, args.unix))
+        # stop cleanly on SIGTERM as well, so the worker processes do not outlive the service
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, serving.cancel)
+        try:
+            await serving
+        except asyncio.CancelledError:
+            pass
+        finally:
+            service.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,194 @@
+import contextlib
+import functools
+import importlib
+import sys
+import time
+
+# Methods timed while instrumentation is enabled, (module, class, methods, method whose argument counts as message bytes)
+# lea.SHA256 and the sha2 classes inherit padding() and update() from sha256, so they are counted as sha256 phases
+TARGETS = [
+    ('sha256', 'SHA256', ('update', 'digest', 'padding', 'parsing', 'generate_hash'), 'update'),
+    ('md5', 'MD5', ('update', 'digest', 'padding', 'parsing', 'generate_hash'), 'update'),
+    ('lea', 'SHA256', ('generate_hash',), 'generate_hash'),
+]
+
+# Modules whose compression function is timed, SHA-224 uses the one of sha256 and SHA-384/512 the one of sha2
+COMPRESS_MODULES = ('sha256', 'md5', 'sha2')
+
+class HashStats:
+    """
+    Per-phase call counts and inclusive timings collected while instrumentation is enabled,
+    plus the number of compressed blocks and of message bytes fed in.
+    Phases are named "<module>.<method>", e.g. sha256.padding, and "<module>.compress" for the compression function,
+    which is split into "<module>.schedule" and "<module>.rounds" in breakdown mode.
+    """
+    def __init__(self):
+        self.calls = {}
+        self.seconds = {}
+        self.blocks = {}
+        self.bytes = 0
+
+    def record(self, phase, seconds):
+        """
+        This function adds one call of a phase.
+        Args:
+            phase: Name of the phase
+            seconds: Time the call took
+        """
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+
+    def reset(self):
+        """
+        This function clears all the counters.
+        """
+        self.__init__()
+
+    def as_dict(self):
+        """
+        This function returns the stats as a dict, e.g. to be dumped as JSON.
+        """
+        return {
+            'phases': {phase: {'calls': self.calls[phase], 'seconds': self.seconds[phase]} for phase in self.calls},
+            'blocks': dict(self.blocks),
+            'bytes': self.bytes,
+        }
+
+    def format(self):
+        """
+        This function returns the stats as a human readable table, the slowest phase first.
+        Timings are inclusive, e.g. sha256.update contains the sha256.compress calls it makes.
+        """
+        lines = ["{:<20} {:>10} {:>12} {:>12}".format('phase', 'calls', 'seconds', 'us/call')]
+        for phase in sorted(self.calls, key=self.seconds.get, reverse=True):
+            lines.append("{:<20} {:>10} {:>12.6f} {:>12.2f}".format(
+                phase, self.calls[phase], self.seconds[phase], self.seconds[phase] / self.calls[phase] * 1e6))
+        for module, blocks in sorted(self.blocks.items()):
+            if blocks:
+                lines.append("{} blocks: {}".format(module, blocks))
+        lines.append("message bytes: {}".format(self.bytes))
+        return "\n".join(lines)
+
+# The stats being collected, None while instrumentation is disabled
+stats = None
+
+# Original attributes replaced by enable(), restored by disable()
+_originals = []
+
+def timed_method(method, phase, count_bytes):
+    """
+    This function wraps a hasher method so that every call is recorded under the given phase.
+    Args:
+        method: The original method
+        phase: Name of the phase
+        count_bytes: Whether the first argument is message data whose size is added to the byte count
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if count_bytes and args and args[0] is not None:
+            stats.bytes += len(args[0]) if isinstance(args[0], str) else memoryview(args[0]).nbytes
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            stats.record(phase, time.perf_counter() - start)
+    return wrapper
+
+def timed_compress(module, breakdown):
+    """
+    This function returns a replacement compression function that records every block.
+    Args:
+        module: The hash module (sha256 or md5)
+        breakdown: Time the message schedule and the rounds separately, on top of the reference compression function
+    """
+    name = module.__name__
+    compress_block = module.load_compress()
+    prepare_schedule = module.prepare_schedule
+    compress_rounds = module.compress_rounds
+    stats.blocks.setdefault(name, 0)
+
+    if breakdown:
+        def compress(state, block, offset=0):
+            start = time.perf_counter()
+            schedule = prepare_schedule(block, offset)
+            middle = time.perf_counter()
+            state = compress_rounds(state, schedule)
+            stats.record(name + '.schedule', middle - start)
+            stats.record(name + '.rounds', time.perf_counter() - middle)
+            stats.blocks[name] += 1
+            return state
+    else:
+        def compress(state, block, offset=0):
+            start = time.perf_counter()
+            state = compress_block(state, block, offset)
+            stats.record(name + '.compress', time.perf_counter() - start)
+            stats.blocks[name] += 1
+            return state
+    return compress
+
+def enable(breakdown=False):
+    """
+    This function starts collecting stats and returns the HashStats object they are collected in.
+    The hasher methods and compression functions are replaced by timed wrappers, so that nothing is paid
+    on the hot path while instrumentation is disabled.
+    Args:
+        breakdown: Time the message schedule and the 64 rounds separately. This runs the reference compression
+                   function, as the straight-line one interleaves the two, so absolute timings get slower.
+    """
+    global stats
+    if stats is not None:
+        return stats
+    stats = HashStats()
+
+    for module_name in COMPRESS_MODULES:
+        module = importlib.import_module(module_name)
+        _originals.append((module, '_compress', module._compress))
+        module._compress = timed_compress(module, breakdown)
+
+    for module_name, class_name, methods, byte_method in TARGETS:
+        cls = getattr(importlib.import_module(module_name), class_name)
+        for method in methods:
+            _originals.append((cls, method, cls.__dict__[method]))
+            setattr(cls, method, timed_method(cls.__dict__[method], module_name + '.' + method, method == byte_method))
+    return stats
+
+def disable():
+    """
+    This function puts the original methods and compression functions back and returns the collected stats.
+    """
+    global stats
+    while _originals:
+        owner, name, original = _originals.pop()
+        setattr(owner, name, original)
+    collected, stats = stats, None
+    return collected
+
+@contextlib.contextmanager
+def measure(show_stats=False, breakdown=False, profile=None):
+    """
+    This function is a context manager for the --stats and --profile command line options.
+    While the block runs, stats are collected and/or cProfile is running. On exit the stats table is printed
+    to stderr and the profile is written to the given file, readable with pstats.
+    Args:
+        show_stats: Collect the per-phase stats and print them
+        breakdown: With show_stats, time the message schedule and the rounds separately
+        profile: Path to write the cProfile output to, None for no profiling
+    """
+    collected = enable(breakdown) if show_stats else None
+    profiler = None
+    if profile:
+        import cProfile
+        # generate the compression functions up front so that compiling them is not part of the profile
+        for module_name in COMPRESS_MODULES:
+            importlib.import_module(module_name).load_compress()
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield collected
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile)
+        if collected is not None:
+            disable()
+            print(collected.format(), file=sys.stderr)
@@ -0,0 +1,167 @@
+import logging
+import argparse
+import hashlib
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+import checksum
+import mac
+
+logger = logging.getLogger(__name__)
+
+# Hash algorithms usable as the PRF, the digest has to be the whole big-endian chaining value
+PRF_ALGORITHMS = ('sha256', 'sha512')
+
+def chaining_value(hasher):
+    """
+    This function returns the chaining value of a hasher as a list of words, read from its exported state.
+    Args:
+        hasher: A SHA256 or SHA512 hasher
+    """
+    return list(hasher.state_header.unpack_from(hasher.export_state())[:-1])
+
+def derive_block(password, salt, iterations, index, algorithm='sha256'):
+    """
+    This function computes one output block T_index = U_1 ^ U_2 ^ ... ^ U_c of PBKDF2 (RFC 8018 sec 5.2).
+    The HMAC key blocks are compressed once (mac.compute_key_midstates, deliberately not the cached
+    mac.key_midstates, so that no password material outlives the call), U_1 is an ordinary HMAC of salt || INT(index),
+    and every later U_j = HMAC(P, U_{j-1}) is exactly two compressions of one preformatted block:
+    U_{j-1} followed by the padding for a key block plus one digest, compressed from the inner midstate,
+    then the inner digest written over the start of the same block and compressed from the outer midstate.
+    Args:
+        password: The password as bytes
+        salt: The salt as bytes
+        iterations: The iteration count c
+        index: The 1-based index of the block
+        algorithm: Name of the hash algorithm of the HMAC, one of PRF_ALGORITHMS
+    """
+    inner, outer = mac.compute_key_midstates(password, algorithm)
+    first = inner.copy().update(salt + index.to_bytes(4, 'big'))
+    digest = outer.copy().update(first.digest()).digest()
+
+    inner_state = chaining_value(inner)
+    outer_state = chaining_value(outer)
+    compress_block = inner._compressor()
+    words = struct.Struct('>{}{}'.format(len(inner_state), 'I' if inner.word_size == 4 else 'Q'))
+
+    # The padding never changes: one key block has been hashed before, so the length is block + digest bytes
+    block = inner.padding(bytearray(digest), length=(inner.block_size + len(digest)) * 8)
+    pack = words.pack_into
+    result = list(words.unpack(digest))
+    for _ in range(iterations - 1):
+        pack(block, 0, *compress_block(inner_state, block, 0))
+        u = compress_block(outer_state, block, 0)
+        pack(block, 0, *u)
+        result = [t ^ w for t, w in zip(result, u)]
+    return words.pack(*result)
+
+def pbkdf2_hmac(algorithm, password, salt, iterations, dklen=None, executor=None):
+    """
+    This function derives a key with PBKDF2-HMAC, with the same arguments as hashlib.pbkdf2_hmac.
+    The output blocks are independent, so with an executor they are computed in parallel.
+    Args:
+        algorithm: Name of the hash algorithm, one of PRF_ALGORITHMS
+        password: The password, a str or bytes
+        salt: The salt, a str or bytes
+        iterations: The iteration count, at least 1
+        dklen: Length of the derived key in bytes, defaults to the digest size
+        executor: Optional concurrent.futures executor for the output blocks
+    """
+    if algorithm not in PRF_ALGORITHMS:
+        raise ValueError("Unsupported PBKDF2 hash algorithm {}".format(algorithm))
+    if iterations < 1:
+        raise ValueError("iterations must be at least 1")
+    if dklen is not None and dklen < 1:
+        raise ValueError("dklen must be at least 1")
+    if isinstance(password, str):
+        password = password.encode('utf-8')
+    if isinstance(salt, str):
+        salt = salt.encode('utf-8')
+    password = bytes(password)
+    salt = bytes(salt)
+
+    digest_size = checksum.new(algorithm).digest_size
+    if dklen is None:
+        dklen = digest_size
+    indices = range(1, (dklen + digest_size - 1) // digest_size + 1)
+    if executor is None or len(indices) == 1:
+        blocks = [derive_block(password, salt, iterations, index, algorithm) for index in indices]
+    else:
+        blocks = list(executor.map(derive_block, *zip(*((password, salt, iterations, index, algorithm) for index in indices))))
+    return b''.join(blocks)[:dklen]
+
+# Test vectors (password, salt, iterations, dklen, expected key) of PBKDF2-HMAC-SHA256 from RFC 7914 sec 11
+TEST_VECTORS = [
+    (b'passwd', b'salt', 1, 64,
+     '55ac046e56e3089fec1691c22544b605f94185216dde0465e68b9d57c20dacbc'
+     '49ca9cccf179b645991664b39d77ef317c71b845b1e30bd509112041d3a19783'),
+    (b'Password', b'NaCl', 80000, 64,
+     '4ddcd8f60b98be21830cee5ef22701f9641a4418d04c0414aeff08876b34ab56'
+     'a1d425a1225833549adb841b51c9b3176a272bdebba1d078478f62b397f33c8d'),
+]
+
+def self_test(max_iterations=None, executor=None):
+    """
+    This function checks the implementation against the RFC 7914 vectors and against hashlib.pbkdf2_hmac,
+    and returns the list of failing (algorithm, password, salt, iterations) cases, empty if everything matches.
+    Args:
+        max_iterations: Skip the RFC vectors with more iterations than this, None to run them all
+        executor: Optional executor for the output blocks
+    """
+    failures = []
+    for password, salt, iterations, dklen, expected in TEST_VECTORS:
+        if max_iterations is None or iterations <= max_iterations:
+            if pbkdf2_hmac('sha256', password, salt, iterations, dklen, executor).hex() != expected:
+                failures.append(('sha256', password, salt, iterations))
+
+    # Odd output lengths, several blocks and both PRFs against hashlib
+    for algorithm in PRF_ALGORITHMS:
+        for password, salt, iterations, dklen in ((b'password', b'salt', 2, 20), (b'k' * 200, b'pepper', 50, 100)):
+            derived = pbkdf2_hmac(algorithm, password, salt, iterations, dklen, executor)
+            if derived != hashlib.pbkdf2_hmac(algorithm, password, salt, iterations, dklen):
+                failures.append((algorithm, password, salt, iterations))
+
+    # Like hashlib, a zero or negative key length or iteration count is an error rather than a default
+    for iterations, dklen in ((1, 0), (1, -1), (0, 32)):
+        try:
+            pbkdf2_hmac('sha256', b'password', b'salt', iterations, dklen, executor)
+        except ValueError:
+            continue
+        failures.append(('sha256', b'password', b'salt', iterations))
+    return failures
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(asctime)s %(message)s')
+
+    parser = argparse.ArgumentParser()
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('-p', type=str, help="The password")
+    group.add_argument('--self-test', action='store_true', help="Check against the RFC 7914 vectors and hashlib.pbkdf2_hmac")
+    parser.add_argument('-s', type=str, default='', help="The salt")
+    parser.add_argument('-i', '--iterations', type=int, default=600000, help="Iteration count (default: 600000)")
+    parser.add_argument('--dklen', type=int, help="Length of the derived key in bytes (default: the digest size)")
+    parser.add_argument('--algo', choices=PRF_ALGORITHMS, default='sha256', help="Hash algorithm of the HMAC (default: sha256)")
+    parser.add_argument('--quick', action='store_true', help="With --self-test, skip the RFC vector with 80000 iterations")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help="Number of worker processes for the output blocks (default: number of CPUs)")
+
+    args = parser.parse_args()
+    executor = ProcessPoolExecutor(max_workers=args.jobs) if args.jobs > 1 else None
+    try:
+        if args.self_test:
+            failures = self_test(1000 if args.quick else None, executor)
+            for algorithm, password, salt, iterations in failures:
+                logger.error("PBKDF2-HMAC-%s failed for password %s, salt %s, %d iterations", algorithm, password, salt, iterations)
+            if failures:
+                exit(1)
+            print("PBKDF2 test vectors verified")
+            exit(0)
+
+        if args.iterations < 1:
+            parser.error("--iterations must be at least 1")
+        if args.dklen is not None and args.dklen < 1:
+            parser.error("--dklen must be at least 1")
+        print(pbkdf2_hmac(args.algo, args.p, args.s, args.iterations, args.dklen, executor).hex())
+    finally:
+        if executor is not None:
+            executor.shutdown()
@@ -1,52 +1,15 @@
-from sha256 import logger, small_sigma_0, small_sigma_1, big_sigma_0, big_sigma_1, choice, majority, fract_64_prime, fract_8_prime
+import sha256
+from sha256 import compress, H
 import argparse
+import json
+import os
+import sys
 
-K = fract_64_prime()
-H = fract_8_prime()
-
-class SHA256:
-    def padding(self, message, length=None):
-        """
-        This function does the padding of the message so that it is a multiple of 512 bits.
-        Step 1:
-            Add a single "1" bit to the end of the message
-        Step 2:
-            Add a fixed number of "0"s to the end of the message. Let the number of 0s be k
-            If l is the size of the message, then l + k + 1 mod 512 should be 64
-        Step 3:
-            Append 64 bit binary representation of l which is the length of the message
-
-        Args:
-            message: The message to be padded to a multiple of 512 bits
-            length: Length to append at the end (in bytes)
-        """
-
-        if length is None:
-            length = len(message) * 8 # len gives number of bytes so multiply by 8 to get bits
-
-        message.append(0x80)
-        while (len(message) * 8 + 64) % 512 != 0:
-            message.append(0x00)
-
-        message += length.to_bytes(8, 'big') # Convert to bytes with big-endian format. MSB is first.
-        #message.append(0x80) #To check if error is logged
-        if (len(message) * 8) % 512 != 0:
-            logger.error("Padding not completed and message not a multiple of 512 bits")
-            exit(1)
-
-        return message
-
-    def parsing(self, padded_message):
-        """
-        Return blocks of 512 bits of the padded message as a list
-        Args:
-            padded_message: The message padded to be a multiple of 512 bits
-        """
-        blocks = [] # contains 512-bit blocks of message
-        for i in range(0, len(padded_message), 64): # 64 bytes is 512 bits
-            blocks.append(padded_message[i:i+64])
-        return blocks
-    
+class SHA256(sha256.SHA256):
+    """
+    SHA256 that can start from an arbitrary chaining value and append an arbitrary length when padding.
+    The padding and the compression function are shared with sha256.SHA256.
+    """
     def generate_hash(self, message, initial_vector=H, length=None):
         """
         This function takes in the message and returns the SHA256 hash of it.
@@ -65,81 +28,13 @@ class SHA256:
             raise TypeError
 
         padded_message = self.padding(message, length=length)
-        blocks = self.parsing(padded_message)
-
-        h0 = initial_vector[0]
-        h1 = initial_vector[1]
-        h2 = initial_vector[2]
-        h3 = initial_vector[3]
-        h4 = initial_vector[4]
-        h5 = initial_vector[5]
-        h6 = initial_vector[6]
-        h7 = initial_vector[7]
-
-        # Hash Computation and message schedule generation
-        for message_block in blocks:
-            # Prepare message schedule as specified by NIST paper sec 6.2.2
-            message_schedule = []
-            for t in range(0, 64):
-                if t <= 15:
-                    # Add the t'th 32 bit word of the block
-                    # Start from the leftmost word
-                    # 4 bytes at a time
-                    message_schedule.append(bytes(message_block[t*4:(t*4)+4]))
-                else:
-                    term1 = small_sigma_1(int.from_bytes(message_schedule[t-2], 'big'))
-                    term2 = int.from_bytes(message_schedule[t-7], 'big')
-                    term3 = small_sigma_0(int.from_bytes(message_schedule[t-15], 'big'))
-                    term4 = int.from_bytes(message_schedule[t-16], 'big')
-
-                    # append a 4-byte byte object
-                    schedule = ((term1 + term2 + term3 + term4) % 2**32).to_bytes(4, 'big')
-                    message_schedule.append(schedule)
-
-            if len(message_schedule) != 64:
-                logger.error("Length of message schedule block is not 8 bytes")
-                exit(1)
-
-            # Initialize working variables
-            a = h0
-            b = h1
-            c = h2
-            d = h3
-            e = h4
-            f = h5
-            g = h6
-            h = h7
-
-            # Iterate for t = 0 to 63
-            for t in range(64):
-                t1 = ((h + big_sigma_1(e) + choice(e, f, g) + K[t] +
-                    int.from_bytes(message_schedule[t], 'big')) % 2**32)
-
-                t2 = (big_sigma_0(a) + majority(a, b, c)) % 2**32
-
-                h = g
-                g = f
-                f = e
-                e = (d + t1) % 2**32
-                d = c
-                c = b
-                b = a
-                a = (t1 + t2) % 2**32
-
-            # Compute intermediate hash value
-            h0 = (a + h0) % 2**32
-            h1 = (b + h1) % 2**32
-            h2 = (c + h2) % 2**32
-            h3 = (d + h3) % 2**32
-            h4 = (e + h4) % 2**32
-            h5 = (f + h5) % 2**32
-            h6 = (g + h6) % 2**32
-            h7 = (h + h7) % 2**32
-
-        return ((h0).to_bytes(4, 'big') + (h1).to_bytes(4, 'big') +
-                (h2).to_bytes(4, 'big') + (h3).to_bytes(4, 'big') +
-                (h4).to_bytes(4, 'big') + (h5).to_bytes(4, 'big') +
-                (h6).to_bytes(4, 'big') + (h7).to_bytes(4, 'big'))
+
+        # Hash Computation, one compression per 512-bit block starting from the given chaining value
+        state = list(initial_vector)
+        for offset in range(0, len(padded_message), 64):
+            state = compress(state, padded_message, offset)
+
+        return b''.join(word.to_bytes(4, 'big') for word in state)
     
 def calc_msg_ext(original_message,extension,key):
     """
@@ -168,28 +63,14 @@ def calc_msg_ext_hash(original_message,extension,key):
     target_hash = sha256.generate_hash(original_bytearray+extension_bytearray).hex()
     return target_hash
 
-def bytearray_to_int_list(byte_arr):
+def calc_len_padded(len_original_message):
     """
-        This function converts a bytearray into a list of length 8
-        where each element is a 32-bit integer value
-
-        Args:
-            byte_arr: Bytearray to be converted to a list
-    """
-    state = []
-    for i in range(0,32,4):
-        state.append(int.from_bytes(byte_arr[i:i+4], "big"))
-    return state
-
-def calc_len_message(len_original_message,len_extension):
-    """
-        This function calculates the length of the extended message
+        This function calculates the length (in bytes) of the original message after padding,
+        a message within 8 bytes of the end of a block needs a whole extra block for the length
         Args:
             len_original_message: The length of (original message + key) that was to be hashed
-            len_extension: length of extension to be appended to the original message
     """
-    num_blocks = int(len_original_message / 64) + 1
-    return num_blocks*512 + len_extension*8
+    return ((len_original_message + 8) // 64 + 1) * 64
 
 def length_extension_attack(org_hash, msg_len, extension):
     """
@@ -198,49 +79,157 @@ def length_extension_attack(org_hash, msg_len, extension):
             org_hash: hash of original message (as bytearray)
             msg_len: length of the previous message len(original_message+key)
     """
-    sha256 = SHA256()
-
-    # (LEA attack) Generating the hash of extended block using the output from 
-    # original message has as the intial vector
-    initial_vector = bytearray_to_int_list(org_hash)
-    ext_msg_len = calc_len_message(msg_len,len(extension))
-    ext_hash = sha256.generate_hash(extension,initial_vector,ext_msg_len).hex()
+    # (LEA attack) The hash of the original message is exactly the SHA256 state after its padded blocks,
+    # so hashing is resumed from that state with the padded length as the number of bytes seen so far
+    state = bytes(org_hash) + calc_len_padded(msg_len).to_bytes(8, 'big')
+    ext_hash = SHA256.from_state(state).update(extension).hexdigest()
     return ext_hash
 
+def glue_padding(msg_len):
+    """
+        This function returns the padding SHA256 appended to the original message,
+        which the forged message has to carry between the original message and the extension
+        Args:
+            msg_len: length of the previous message len(original_message+key)
+    """
+    return b'\x80' + bytes((55 - msg_len) % 64) + (msg_len*8).to_bytes(8, 'big')
+
+def forge_mac(org_hash, padded_len, extension):
+    """
+        This function returns the forged MAC (hex) for every secret length whose key + message pads to padded_len bytes
+        Args:
+            org_hash: hash of original message (as bytes)
+            padded_len: length of key + original message after padding (in bytes)
+            extension: additional component to be appended to the original message
+    """
+    state = bytes(org_hash) + padded_len.to_bytes(8, 'big')
+    return SHA256.from_state(state).update(extension).hexdigest()
+
+def length_extension_batch(org_hash, original_message, extension, key_lengths, executor=None):
+    """
+        This function forges the extended message and its MAC for every candidate secret length and yields them as dicts
+        (key_length, message as hex without the secret, mac) in the order of key_lengths.
+        The forged MAC only depends on the padded length of key + message, so it is computed once per padded block count
+        and shared by all the secret lengths in that group. The groups are independent and are spread over executor if given.
+        Args:
+            org_hash: hash of original message (as bytes)
+            original_message: The original message without the secret
+            extension: additional component to be appended to the original message
+            key_lengths: The candidate lengths of the secret
+            executor: Optional concurrent.futures executor for the groups
+    """
+    if isinstance(original_message, str):
+        original_message = original_message.encode('ascii')
+    if isinstance(extension, str):
+        extension = extension.encode('ascii')
+
+    key_lengths = list(key_lengths)
+    padded_lens = sorted(set(calc_len_padded(key_len + len(original_message)) for key_len in key_lengths))
+    if executor is None:
+        macs = dict((padded_len, forge_mac(org_hash, padded_len, extension)) for padded_len in padded_lens)
+    else:
+        futures = [executor.submit(forge_mac, org_hash, padded_len, extension) for padded_len in padded_lens]
+        macs = dict((padded_len, future.result()) for padded_len, future in zip(padded_lens, futures))
+
+    for key_len in key_lengths:
+        msg_len = key_len + len(original_message)
+        yield {
+            'key_length': key_len,
+            'message': (original_message + glue_padding(msg_len) + extension).hex(),
+            'mac': macs[calc_len_padded(msg_len)],
+        }
+
+def parse_range(text):
+    """
+        This function parses a MIN:MAX range of secret lengths (both inclusive) or a single length,
+        raises ValueError for negative lengths or MIN > MAX
+        Args:
+            text: The range as given on the command line
+    """
+    low, _, high = text.partition(':')
+    low = int(low)
+    high = int(high) if high else low
+    if low < 0:
+        raise ValueError("secret lengths cannot be negative")
+    if low > high:
+        raise ValueError("the range {}:{} is empty, MIN must not exceed MAX".format(low, high))
+    return range(low, high + 1)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('-m', type=str, required=True, help="Message to be hashed")
-    parser.add_argument('-s', type=str, required=True, help="The secret shared by both sender and receiver")
+    parser.add_argument('-s', type=str, help="The secret shared by both sender and receiver")
     parser.add_argument('-e', type=str, required=True, help="The extension to the message")
+    parser.add_argument('--key-lengths', type=str, metavar='MIN:MAX', help="Forge the extended message for every secret length in the range instead")
+    parser.add_argument('--mac', type=str, help="MAC of the original message (hex), for --key-lengths when the secret is unknown")
+    parser.add_argument('-o', type=str, default='-', help="JSONL file to stream the forged (message, MAC) pairs to (default: stdout)")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help="Number of worker processes for --key-lengths (default: number of CPUs)")
+    parser.add_argument('--stats', action='store_true', help="Print per-phase call counts and timings, blocks and bytes to stderr (hashes in this process)")
+    parser.add_argument('--breakdown', action='store_true', help="With --stats, time the message schedule and the rounds separately (uses the slower reference compression)")
+    parser.add_argument('--profile', type=str, metavar='FILE', help="Write cProfile output of the run to FILE, readable with pstats (hashes in this process)")
     
     args = parser.parse_args()
-
-    original_message = args.m
-    extension = args.e
-    key = args.s
-
-    # Generating the hash of the original message
-    sha256 = SHA256()
-    org_hash = sha256.generate_hash(key+original_message)
-
-    # (LEA attack) Generating the hash of extended block using the output from 
-    # original message has as the intial vector
-    ext_hash = length_extension_attack(org_hash, len(key+original_message), extension)
-
-    # Generating the hash of the extending message for verification
-    extended_msg = calc_msg_ext(original_message,extension,key)
-    target = calc_msg_ext_hash(original_message,extension,key)
-
-    print("Original Message to be hashed: {}".format(key+original_message))
-    print("MAC for Original Message: {}\n".format(org_hash.hex()))
-    print("--------------------------------------------------\n")
-    print("Extended Message to be hashed: {}\n".format(extended_msg))
-    print("MAC for Extended Message: {}".format(target))
-    print("MAC for Extended Message with LEA attack: {}\n".format(ext_hash))
-    print("--------------------------------------------------\n")
-
-    if ext_hash == target:
-        print("(LEA successfull) The two hashes are identical")
-    else:
-        print("(LEA unsuccessfull) The two hashes are NOT identical")
+    if args.breakdown and not args.stats:
+        parser.error("--breakdown requires --stats")
+    if args.stats or args.profile:
+        args.jobs = 1 # worker processes would collect their own stats
+
+    # instrument patches lea.SHA256, which has to be this module's class and not the one of a second import
+    sys.modules.setdefault('lea', sys.modules[__name__])
+    import instrument
+    with instrument.measure(args.stats, args.breakdown, args.profile):
+        if args.key_lengths is not None:
+            if args.mac is None and args.s is None:
+                parser.error("--key-lengths needs the original MAC via --mac or the secret via -s")
+            try:
+                key_lengths = parse_range(args.key_lengths)
+            except ValueError as error:
+                parser.error("--key-lengths: {}".format(error))
+            org_hash = bytes.fromhex(args.mac) if args.mac else SHA256().generate_hash(args.s + args.m)
+
+            # Imported here, as the worker pool is only needed by the CLI and is slow to import
+            from concurrent.futures import ProcessPoolExecutor
+            output = sys.stdout if args.o == '-' else open(args.o, 'w')
+            executor = ProcessPoolExecutor(max_workers=args.jobs) if args.jobs > 1 else None
+            try:
+                for forged in length_extension_batch(org_hash, args.m, args.e, key_lengths, executor):
+                    output.write(json.dumps(forged) + '\n')
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+                if output is not sys.stdout:
+                    output.close()
+            exit(0)
+
+        if args.s is None:
+            parser.error("the following arguments are required: -s")
+
+        original_message = args.m
+        extension = args.e
+        key = args.s
+
+        # Generating the hash of the original message
+        sha256 = SHA256()
+        org_hash = sha256.generate_hash(key+original_message)
+
+        # (LEA attack) Generating the hash of extended block using the output from 
+        # original message has as the intial vector
+        ext_hash = length_extension_attack(org_hash, len(key+original_message), extension)
+
+        # Generating the hash of the extending message for verification
+        extended_msg = calc_msg_ext(original_message,extension,key)
+        target = calc_msg_ext_hash(original_message,extension,key)
+
+        print("Original Message to be hashed: {}".format(key+original_message))
+        print("MAC for Original Message: {}\n".format(org_hash.hex()))
+        print("--------------------------------------------------\n")
+        print("Extended Message to be hashed: {}\n".format(extended_msg))
+        print("MAC for Extended Message: {}".format(target))
+        print("MAC for Extended Message with LEA attack: {}\n".format(ext_hash))
+        print("--------------------------------------------------\n")
+
+        if ext_hash == target:
+            print("(LEA successfull) The two hashes are identical")
+        else:
+            print("(LEA unsuccessfull) The two hashes are NOT identical")
 
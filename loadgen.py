@@ -0,0 +1,117 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+from hashd import percentile
+
+async def open_connection(args):
+    """
+    This function opens a connection to the hashing service, over a Unix socket if one is given.
+    Args:
+        args: The parsed command line arguments
+    """
+    if args.unix:
+        return await asyncio.open_unix_connection(args.unix)
+    return await asyncio.open_connection(args.host, args.port)
+
+async def read_response(reader):
+    """
+    This function reads one HTTP response and returns (status, body).
+    Args:
+        reader: The asyncio StreamReader of the connection
+    """
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+async def client(args, payload, expected, latencies, counter):
+    """
+    This function sends hash requests over one keep-alive connection until the request budget is used up,
+    recording the latency of every request.
+    Args:
+        args: The parsed command line arguments
+        payload: The body sent with every request
+        expected: The expected hex digest of the payload
+        latencies: List the latencies are appended to (in seconds)
+        counter: Single element list holding the number of requests left to send
+    """
+    reader, writer = await open_connection(args)
+    head = "POST /{} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {}\r\n\r\n".format(args.algo, len(payload)).encode('latin-1')
+    failures = 0
+    try:
+        while counter[0] > 0:
+            counter[0] -= 1
+            start = time.perf_counter()
+            writer.write(head)
+            writer.write(payload)
+            await writer.drain()
+            status, body = await read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            if status != 200 or body.decode('ascii').strip() != expected:
+                failures += 1
+    finally:
+        writer.close()
+    return failures
+
+async def fetch_stats(args):
+    """
+    This function returns the service's stats endpoint as a dict.
+    Args:
+        args: The parsed command line arguments
+    """
+    reader, writer = await open_connection(args)
+    writer.write(b"GET /stats HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+    await writer.drain()
+    _, body = await read_response(reader)
+    writer.close()
+    return json.loads(body)
+
+async def run(args):
+    """
+    This function runs the load test and prints the client side latency percentiles and throughput.
+    Returns the number of wrong or failed responses.
+    Args:
+        args: The parsed command line arguments
+    """
+    payload = os.urandom(args.size)
+    expected = hashlib.new(args.algo, payload).hexdigest()
+    latencies = []
+    counter = [args.requests]
+
+    start = time.perf_counter()
+    failures = await asyncio.gather(*(client(args, payload, expected, latencies, counter) for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    print("{} requests of {} bytes, {} connections in {:.2f} s".format(len(latencies), args.size, args.concurrency, elapsed))
+    print("throughput: {:.1f} requests/s, {:.3f} MB/s".format(len(latencies) / elapsed, len(latencies) * args.size / elapsed / 1e6))
+    print("latency: p50 {:.2f} ms, p99 {:.2f} ms".format(percentile(latencies, 0.50) * 1e3, percentile(latencies, 0.99) * 1e3))
+    if args.stats:
+        print(json.dumps(await fetch_stats(args), indent=1))
+    return sum(failures)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', type=str, default='127.0.0.1', help="Address of the hashing service (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8256, help="TCP port of the hashing service (default: 8256)")
+    parser.add_argument('--unix', type=str, help="Connect to this Unix socket instead of TCP")
+    parser.add_argument('--algo', choices=['sha256', 'md5'], default='sha256', help="Hash algorithm requested (default: sha256)")
+    parser.add_argument('-n', '--requests', type=int, default=200, help="Total number of requests (default: 200)")
+    parser.add_argument('-c', '--concurrency', type=int, default=8, help="Number of concurrent connections (default: 8)")
+    parser.add_argument('--size', type=int, default=4096, help="Size of every request body in bytes (default: 4096)")
+    parser.add_argument('--stats', action='store_true', help="Print the service's stats endpoint afterwards")
+
+    args = parser.parse_args()
+    failures = asyncio.run(run(args))
+    if failures:
+        print("Failed: {} wrong responses".format(failures))
+        exit(1)
@@ -0,0 +1,191 @@
+import logging
+import argparse
+import functools
+import hmac as reference_hmac
+
+import checksum
+
+logger = logging.getLogger(__name__)
+
+# Number of keys whose inner/outer midstates are kept, least recently used keys are dropped first
+KEY_CACHE_SIZE = 128
+
+IPAD = 0x36
+OPAD = 0x5c
+
+def compute_key_midstates(key, algorithm):
+    """
+    This function compresses the ipad and opad key blocks and returns the two hashers after them (inner, outer).
+    Nothing is cached, see key_midstates() for the cached version.
+    Args:
+        key: The secret key as bytes
+        algorithm: Name of the hash algorithm, one of checksum.ALGORITHMS
+    """
+    block_size = checksum.new(algorithm).block_size
+
+    # Keys longer than a block are hashed first, shorter keys are padded with zeros to a full block
+    if len(key) > block_size:
+        key = checksum.new(algorithm, key).digest()
+    key = key + bytes(block_size - len(key))
+
+    inner = checksum.new(algorithm, bytes(byte ^ IPAD for byte in key))
+    outer = checksum.new(algorithm, bytes(byte ^ OPAD for byte in key))
+    return inner, outer
+
+@functools.lru_cache(maxsize=KEY_CACHE_SIZE)
+def key_midstates(key, algorithm):
+    """
+    This function returns the (inner, outer) hashers of compute_key_midstates(), cached per (key, algorithm)
+    so that every later MAC under the same key only pays for the message blocks plus one outer block.
+    The returned hashers must be copied before they are updated.
+    Args:
+        key: The secret key as bytes
+        algorithm: Name of the hash algorithm, one of checksum.ALGORITHMS
+    """
+    return compute_key_midstates(key, algorithm)
+
+def clear_key_cache():
+    """
+    This function forgets all the cached key midstates, e.g. after a key has been rotated out.
+    """
+    key_midstates.cache_clear()
+
+class HMAC:
+    """
+    HMAC (RFC 2104) on top of SHA256 or MD5 with a hashlib/hmac style interface.
+    The midstates after the ipad and opad key blocks come from the key_midstates() LRU cache.
+    """
+    def __init__(self, key, message=None, algorithm='sha256'):
+        if isinstance(key, str):
+            key = key.encode('ascii')
+        key = bytes(key)
+
+        inner, outer = key_midstates(key, algorithm)
+        self.name = 'hmac-' + algorithm
+        self.digest_size = inner.digest_size
+        self.block_size = inner.block_size
+        self._inner = inner.copy()
+        self._outer = outer
+        if message is not None:
+            self.update(message)
+
+    def update(self, message):
+        """
+        This function feeds the next chunk of the message into the inner hash.
+        Args:
+            message: The next chunk of the message, a str or any object supporting the buffer protocol
+        """
+        self._inner.update(message)
+        return self
+
+    def digest(self):
+        """
+        This function returns the MAC of the message so far, H(K ^ opad || H(K ^ ipad || message)).
+        Only the outer block holding the inner digest is compressed on top of the cached outer midstate.
+        """
+        outer = self._outer.copy()
+        outer.update(self._inner.digest())
+        return outer.digest()
+
+    def hexdigest(self):
+        """
+        This function returns the MAC of the message so far as a hex string.
+        """
+        return self.digest().hex()
+
+    def copy(self):
+        """
+        This function returns an independent copy of the MAC object.
+        """
+        other = self.__class__.__new__(self.__class__)
+        other.__dict__.update(self.__dict__)
+        other._inner = self._inner.copy()
+        return other
+
+def hmac_digest(key, message, algorithm='sha256'):
+    """
+    This function returns the HMAC of a message in one call.
+    Args:
+        key: The secret key
+        message: The message to be authenticated
+        algorithm: Name of the hash algorithm
+    """
+    return HMAC(key, message, algorithm).digest()
+
+def verify(key, message, mac, algorithm='sha256'):
+    """
+    This function checks a MAC in constant time and returns True if it is valid.
+    Args:
+        key: The secret key
+        message: The message that was authenticated
+        mac: The MAC to check, as bytes
+        algorithm: Name of the hash algorithm
+    """
+    return reference_hmac.compare_digest(hmac_digest(key, message, algorithm), mac)
+
+# Test vectors (key, data, algorithm, expected MAC) from RFC 4231 (HMAC-SHA256) and RFC 2202 (HMAC-MD5)
+# RFC 4231 test case 5 is left out as it checks a truncated output
+TEST_VECTORS = [
+    (b'\x0b' * 20, b'Hi There', 'sha256',
+     'b0344c61d8db38535ca8afceaf0bf12b881dc200c9833da726e9376c2e32cff7'),
+    (b'Jefe', b'what do ya want for nothing?', 'sha256',
+     '5bdcc146bf60754e6a042426089575c75a003f089d2739839dec58b964ec3843'),
+    (b'\xaa' * 20, b'\xdd' * 50, 'sha256',
+     '773ea91e36800e46854db8ebd09181a72959098b3ef8c122d9635514ced565fe'),
+    (bytes(range(1, 26)), b'\xcd' * 50, 'sha256',
+     '82558a389a443c0ea4cc819899f2083a85f0faa3e578f8077a2e3ff46729665b'),
+    (b'\xaa' * 131, b'Test Using Larger Than Block-Size Key - Hash Key First', 'sha256',
+     '60e431591ee0b67f0d8a26aacbf5b77f8e0bc6213728c5140546040f0ee37f54'),
+    (b'\xaa' * 131, b'This is a test using a larger than block-size key and a larger than block-size data. '
+                    b'The key needs to be hashed before being used by the HMAC algorithm.', 'sha256',
+     '9b09ffa71b942fcb27635fbcd5b0e944bfdc63644f0713938a7f51535c3a35e2'),
+    (b'\x0b' * 16, b'Hi There', 'md5', '9294727a3638bb1c13f48ef8158bfc9d'),
+    (b'Jefe', b'what do ya want for nothing?', 'md5', '750c783e6ab0b503eaa86e310a5db738'),
+    (b'\xaa' * 16, b'\xdd' * 50, 'md5', '56be34521d144c88dbb8c733f0e8b3f6'),
+    (b'\xaa' * 80, b'Test Using Larger Than Block-Size Key - Hash Key First', 'md5',
+     '6b1ab7fe4bd7bf8f0b62e6ce61b9d0cd'),
+]
+
+def self_test():
+    """
+    This function checks the implementation against the RFC test vectors and against Python's hmac module.
+    Returns the list of failing (key, data, algorithm) cases, empty if everything matches.
+    """
+    failures = []
+    for key, data, algorithm, expected in TEST_VECTORS:
+        mac = hmac_digest(key, data, algorithm)
+        if mac.hex() != expected or mac != reference_hmac.new(key, data, algorithm).digest():
+            failures.append((key, data, algorithm))
+    return failures
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(asctime)s %(message)s')
+
+    parser = argparse.ArgumentParser()
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('-f', type=str, help="Name of the file to authenticate")
+    group.add_argument('--self-test', action='store_true', help="Check against the RFC 4231 and RFC 2202 test vectors")
+    parser.add_argument('-k', type=str, help="The secret key")
+    parser.add_argument('--algo', choices=sorted(checksum.ALGORITHMS), default='sha256', help="Hash algorithm (default: sha256)")
+
+    args = parser.parse_args()
+    if args.self_test:
+        failures = self_test()
+        for key, data, algorithm in failures:
+            logger.error("HMAC-%s test vector failed for key %s", algorithm, key.hex())
+        if failures:
+            exit(1)
+        print("HMAC test vectors verified")
+        exit(0)
+
+    if args.k is None:
+        parser.error("-k is required with -f")
+    try:
+        with open(args.f, 'rb') as file:
+            mac = HMAC(args.k, algorithm=args.algo)
+            for chunk in iter(lambda: file.read(checksum.CHUNK_SIZE), b''):
+                mac.update(chunk)
+            print(mac.hexdigest())
+    except FileNotFoundError:
+        logger.error("File does not exist")
+        exit(1)
@@ -1,19 +1,35 @@
 import logging
 import math
-import argparse
+import struct
 
-logging.basicConfig(format='%(asctime)s %(message)s',
-                    filemode='w')
-logger = logging.getLogger()
-
-logger.setLevel(logging.DEBUG)
+# logging is only configured when run as a script, importing this module leaves the host application's logging alone
+logger = logging.getLogger(__name__)
 
 
 def gen_K(i):
     return int(abs(math.sin(i + 1)) * (2**32))
 
 
-K = [gen_K(i) for i in range(64)]
+# the k values, int(abs(sin(i + 1)) * 2**32) for i in 0..63, frozen so that importing the module does no work
+K = (
+    0xd76aa478, 0xe8c7b756, 0x242070db, 0xc1bdceee, 0xf57c0faf, 0x4787c62a, 0xa8304613, 0xfd469501,
+    0x698098d8, 0x8b44f7af, 0xffff5bb1, 0x895cd7be, 0x6b901122, 0xfd987193, 0xa679438e, 0x49b40821,
+    0xf61e2562, 0xc040b340, 0x265e5a51, 0xe9b6c7aa, 0xd62f105d, 0x02441453, 0xd8a1e681, 0xe7d3fbc8,
+    0x21e1cde6, 0xc33707d6, 0xf4d50d87, 0x455a14ed, 0xa9e3e905, 0xfcefa3f8, 0x676f02d9, 0x8d2a4c8a,
+    0xfffa3942, 0x8771f681, 0x6d9d6122, 0xfde5380c, 0xa4beea44, 0x4bdecfa9, 0xf6bb4b60, 0xbebfbc70,
+    0x289b7ec6, 0xeaa127fa, 0xd4ef3085, 0x04881d05, 0xd9d4d039, 0xe6db99e5, 0x1fa27cf8, 0xc4ac5665,
+    0xf4292244, 0x432aff97, 0xab9423a7, 0xfc93a039, 0x655b59c3, 0x8f0ccc92, 0xffeff47d, 0x85845dd1,
+    0x6fa87e4f, 0xfe2ce6e0, 0xa3014314, 0x4e0811a1, 0xf7537e82, 0xbd3af235, 0x2ad7d2bb, 0xeb86d391,
+)
+
+
+def verify_constants():
+    """
+    This function regenerates the k values from sin and checks them against the frozen table.
+    Returns True if the table matches.
+    """
+    return tuple(gen_K(i) for i in range(64)) == K
+
 
 shifts = [
     [7, 12, 17, 22],
@@ -29,8 +45,170 @@ C_start = 0x98badcfe
 D_start = 0x10325476
 
 
+# the following array stores the values for each of the 4 rounds of md5.
+# the values are as follows
+# [
+#   the function that will be used,
+#   the order in which the 16 words in the block will be processed
+#   the amount to shift each of the 16 words in the block
+# ]
+roundwise_values = [
+    [   # round 1
+        lambda B, C, D: (B & C) | (~B & D),
+        [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15],
+        [shifts[0][i % 4] for i in range(16)]
+    ],
+    [   # round 2
+        lambda B, C, D: (B & D) | (C & ~D),
+        [1, 6, 11, 0, 5, 10, 15, 4, 9, 14, 3, 8, 13, 2, 7, 12],
+        [shifts[1][i % 4] for i in range(16)]
+    ],
+    [   # round 3
+        lambda B, C, D: B ^ C ^ D,
+        [5, 8, 11, 14, 1, 4, 7, 10, 13, 0, 3, 6, 9, 12, 15, 2],
+        [shifts[2][i % 4] for i in range(16)]
+    ],
+    [   # round 4
+        lambda B, C, D: C ^ (B | ~D),
+        [0, 7, 14, 5, 12, 3, 10, 1, 8, 15, 6, 13, 4, 11, 2, 9],
+        [shifts[3][i % 4] for i in range(16)]
+    ]
+]
+
+# the 64 steps flattened once: (function, index of the message word, k value, shift)
+STEPS = tuple(
+    (f, m_ind[i], K[16 * round_number + i], s[i])
+    for round_number, (f, m_ind, s) in enumerate(roundwise_values)
+    for i in range(16)
+)
+
+
+def prepare_schedule(block, offset=0):
+    """
+    This function returns the 16 message words of a 512-bit block.
+    MD5 does not expand them, every step picks one of the 16 words through the STEPS table.
+    Args:
+        block: Any buffer (bytes, bytearray, memoryview, mmap, ...) holding the 512-bit block
+        offset: Position of the block inside the buffer (in bytes)
+    """
+    # read the 16 little-endian words straight out of the buffer without slicing it
+    return struct.unpack_from('<16I', block, offset)
+
+def compress_rounds(state, words):
+    """
+    This function runs the 64 steps of the MD5 compression function over the message words
+    and returns the new chaining value.
+    Args:
+        state: The current chaining value as a list of four 32-bit words
+        words: The 16 words returned by prepare_schedule()
+    """
+    A, B, C, D = state
+
+    for (f, index, k, s) in STEPS:
+        # modular addition, only masked once before the rotation
+        result = (A + f(B, C, D) + words[index] + k) & 0xffffffff
+
+        # bit rotation and more modular addition
+        A = (B + ((result << s) | (result >> (32 - s)))) & 0xffffffff
+
+        # rotate the values of the initialisation vectors
+        A, B, C, D = D, A, B, C
+
+    # add the initial values of the initialisation vectors
+    return [(A + state[0]) & 0xffffffff, (B + state[1]) & 0xffffffff,
+            (C + state[2]) & 0xffffffff, (D + state[3]) & 0xffffffff]
+
+def reference_compress(state, block, offset=0):
+    """
+    This function runs the MD5 compression function on a single block and returns the new chaining value.
+    It walks the STEPS table one step at a time and is kept as the reference for compress().
+    Args:
+        state: The current chaining value as a list of four 32-bit words
+        block: Any buffer (bytes, bytearray, memoryview, mmap, ...) holding the 512-bit block
+        offset: Position of the block inside the buffer (in bytes)
+    """
+    return compress_rounds(state, prepare_schedule(block, offset))
+
+
+def generate_compress_source():
+    """
+    This function generates the source of a straight-line MD5 compression function from the STEPS table.
+    All 64 steps are unrolled on local ints with the round functions inlined and the k values as literals,
+    the 16 words are unpacked once and the four values are renamed every step instead of being rotated.
+    """
+    # round functions written without ~ so that the intermediate values stay positive
+    functions = [
+        "{3} ^ {1} & ({2} ^ {3})",         # (B & C) | (~B & D)
+        "{2} ^ {3} & ({1} ^ {2})",         # (B & D) | (C & ~D)
+        "{1} ^ {2} ^ {3}",                 # B ^ C ^ D
+        "{2} ^ ({1} | {3} ^ 0xffffffff)",  # C ^ (B | ~D)
+    ]
+
+    lines = [
+        "def compress(state, block, offset=0):",
+        "    w0, w1, w2, w3, w4, w5, w6, w7, w8, w9, w10, w11, w12, w13, w14, w15 = unpack_block(block, offset)",
+        "    a0, b0, c0, d0 = state",
+        "    a, b, c, d = a0, b0, c0, d0",
+    ]
+    names = ['a', 'b', 'c', 'd']
+    for step, (f, index, k, s) in enumerate(STEPS):
+        f_source = functions[step // 16].format(*names)
+        lines.append("    {0} = {0} + ({1}) + w{2} + {3} & 0xffffffff".format(names[0], f_source, index, hex(k)))
+        lines.append("    {0} = {1} + ({0} << {2} | {0} >> {3}) & 0xffffffff".format(names[0], names[1], s, 32 - s))
+        # A, B, C, D = D, A, B, C
+        names = [names[3], names[0], names[1], names[2]]
+
+    lines.append("    return [{} + a0 & 0xffffffff, {} + b0 & 0xffffffff, {} + c0 & 0xffffffff, {} + d0 & 0xffffffff]".format(*names))
+    return "\n".join(lines) + "\n"
+
+
+# the generated compression function, built by load_compress() on first use so that importing stays cheap
+_compress = None
+
+
+def load_compress():
+    """
+    This function returns the straight-line compression function, generating and compiling it on the first call.
+    """
+    global _compress
+    if _compress is None:
+        namespace = {'unpack_block': struct.Struct('<16I').unpack_from}
+        exec(compile(generate_compress_source(), '<md5 compress>', 'exec'), namespace)
+        _compress = namespace['compress']
+    return _compress
+
+
+def compress(state, block, offset=0):
+    """
+    This function runs the MD5 compression function on a single block and returns the new chaining value.
+    It calls the straight-line function from generate_compress_source(), which gives the same results as reference_compress().
+    Args:
+        state: The current chaining value as a list of four 32-bit words
+        block: Any buffer (bytes, bytearray, memoryview, mmap, ...) holding the 512-bit block
+        offset: Position of the block inside the buffer (in bytes)
+    """
+    return (_compress or load_compress())(state, block, offset)
+
+
 class MD5:
-    def padding(self, message):
+    """
+    Incremental MD5 hasher with a hashlib style interface.
+    Only the chaining value, the total length and one partial block are kept in memory,
+    so a message can be fed in chunks of any size via update().
+    """
+    name = 'md5'
+    digest_size = 16
+    block_size = 64
+
+    def __init__(self, message=None):
+        # initialise the initialisation vectors
+        self._state = [A_start, B_start, C_start, D_start]
+        self._buffer = bytearray()  # bytes of the current block that are not yet compressed
+        self._length = 0  # total number of message bytes seen so far
+        if message is not None:
+            self.update(message)
+
+    def padding(self, message, length=None):
         """
         This function does the padding of the message so that it is a multiple of 512 bits.
         Step 1:
@@ -40,13 +218,19 @@ class MD5:
             If l is the size of the message, then l + k + 1 mod 512 should be 64
         Step 3:
             Append 64 bit binary representation of l which is the length of the message
+
+        Args:
+            message: The message to be padded to a multiple of 512 bits
+            length: Length to append at the end (in bits), defaults to the length of message
         """
-        length = len(message) * 8  # len gives number of bytes so multiply by 8 to get bits
+        if length is None:
+            length = len(message) * 8  # len gives number of bytes so multiply by 8 to get bits
+
         message.append(0x80)
-        while (len(message) * 8 + 64) % 512 != 0:
-            message.append(0x00)
+        # add all the 0 bytes in one go so that 56 bytes mod 64 are filled
+        message += bytes((56 - len(message)) % 64)
 
-        message += length.to_bytes(8, 'little')  # Convert to bytes with little-endian format.
+        message += (length % 2**64).to_bytes(8, 'little')  # Convert to bytes with little-endian format.
         if (len(message) * 8) % 512 != 0:
             logger.error("Padding not completed and message not a multiple of 512 bits")
             exit(1)
@@ -55,124 +239,125 @@ class MD5:
 
     def parsing(self, padded_message):
         """
-        Return blocks of 512 bits of the padded message as a list
+        Return blocks of 512 bits of the padded message as a list of memoryview slices (no bytes are copied)
         Args:
             padded_message: The message padded to be a multiple of 512 bits
         """
+        view = memoryview(padded_message).cast('B')
         blocks = []  # contains 512-bit blocks of message
-        for i in range(0, len(padded_message), 64):  # 64 bytes is 512 bits
-            blocks.append(padded_message[i:i + 64])
+        for i in range(0, len(view), 64):  # 64 bytes is 512 bits
+            blocks.append(view[i:i + 64])
         return blocks
 
-    def generate_hash(self, message) -> bytes:
+    def _compressor(self):
         """
-        This function takes in the message and returns the SHA256 hash of it.
-        Args:
-            message: The message to be hashed via SHA256
+        This function returns the compression function of the hash, generating it on first use.
         """
+        return _compress or load_compress()
 
+    def update(self, message):
+        """
+        This function feeds the next chunk of the message into the hasher.
+        Every complete 512-bit block is compressed straight out of the caller's buffer and only the remainder is buffered.
+        Args:
+            message: The next chunk of the message to be hashed, a str or any object supporting the buffer protocol
+        """
         # Type checking and type casting accordingly
         if isinstance(message, str):
-            message = bytearray(message, 'ascii')   # encode to bytearray object with ASCII format
-        elif isinstance(message, bytes):
-            message = bytearray(message)
-        elif not isinstance(message, bytearray):
-            raise TypeError
-
-        # pad the message to fit into 512 bit blocks
-        padded_message = self.padding(message)
+            message = message.encode('ascii')   # encode to bytes object with ASCII format
+
+        with memoryview(message) as raw, raw.cast('B') as view:
+            length = len(view)
+            self._length += length
+            state = self._state
+            offset = 0
+            compress_block = self._compressor()
+
+            # top up a partially filled block from an earlier call first
+            if self._buffer:
+                offset = min(64 - len(self._buffer), length)
+                self._buffer += view[:offset]
+                if len(self._buffer) < 64:
+                    return self
+                state = compress_block(state, self._buffer, 0)
+                self._buffer.clear()
+
+            # walk the complete blocks by offset and keep the leftover bytes for the next call
+            end = length - (length - offset) % 64
+            for block_offset in range(offset, end, 64):
+                state = compress_block(state, view, block_offset)
+            self._buffer += view[end:]
+
+        self._state = state
+        return self
+
+    def digest(self) -> bytes:
+        """
+        This function returns the MD5 hash of all the data passed to update() so far.
+        The hasher is not modified, so more data can be added afterwards.
+        """
+        state = self._state
+        compress_block = self._compressor()
+        # only the final one or two padded blocks are ever built
+        padded_tail = self.padding(bytearray(self._buffer), length=self._length * 8)
+        for offset in range(0, len(padded_tail), 64):
+            state = compress_block(state, padded_tail, offset)
 
-        # split the message into separate blocks
-        blocks = self.parsing(padded_message)
+        # concatenate all the values
+        return b''.join(word.to_bytes(4, 'little') for word in state)
 
-        # initialise the initialisation vectors
-        A = A_start
-        B = B_start
-        C = C_start
-        D = D_start
-
-        for block in blocks:
-
-            # save the values of initialisation vector before starting the block
-            _A, _B, _C, _D = A, B, C, D
-
-            # the following array stores the values for each of the 4 rounds of md5.
-            # the values are as follows
-            # [
-            #   the function that will be used,
-            #   the order in which the 16 words in the block will be processed
-            #   the k values used (obtained from sin) for each of the 16 words,
-            #   the amount to shift each of the 16 words in the block
-            # ]
-            roundwise_values = [
-                [   # round 1
-                    lambda B, C, D: (B & C) | (~B & D),
-                    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15],
-                    K[:16],
-                    [shifts[0][i % 4] for i in range(16)]
-                ],
-                [   # round 2
-                    lambda B, C, D: (B & D) | (C & ~D),
-                    [1, 6, 11, 0, 5, 10, 15, 4, 9, 14, 3, 8, 13, 2, 7, 12],
-                    K[16:32],
-                    [shifts[1][i % 4] for i in range(16)]
-                ],
-                [   # round 3
-                    lambda B, C, D: B ^ C ^ D,
-                    [5, 8, 11, 14, 1, 4, 7, 10, 13, 0, 3, 6, 9, 12, 15, 2],
-                    K[32:48],
-                    [shifts[2][i % 4] for i in range(16)]
-                ],
-                [   # round 4
-                    lambda B, C, D: C ^ (B | ~D),
-                    [0, 7, 14, 5, 12, 3, 10, 1, 8, 15, 6, 13, 4, 11, 2, 9],
-                    K[48:64],
-                    [shifts[3][i % 4] for i in range(16)]
-                ]
-            ]
-
-            for (f, m_ind, k, s) in roundwise_values:
-                for i in range(16):
-                    # get the first word to process
-                    m = int.from_bytes(block[m_ind[i] * 4: (m_ind[i] + 1) * 4], 'little')
-
-                    # modular addition
-                    result = (A + f(B, C, D) + m + k[i]) % (2**32)
-
-                    # bit rotation
-                    result = (result >> (32 - s[i])) | (result << s[i])
-
-                    # more modular addition
-                    result = (B + result) % (2**32)
-
-                    A = result
-
-                    # rotate the values of the initialisation vectors
-                    A, B, C, D = D, A, B, C
-
-            # add the initial values of the initialisation vectors
-            A = (A + _A) % (2**32)
-            B = (B + _B) % (2**32)
-            C = (C + _C) % (2**32)
-            D = (D + _D) % (2**32)
+    def hexdigest(self):
+        """
+        This function returns the MD5 hash of the data so far as a hex string.
+        """
+        return self.digest().hex()
 
-        # concatenate all the values
-        return (A.to_bytes(4, 'little') + B.to_bytes(4, 'little') +
-                C.to_bytes(4, 'little') + D.to_bytes(4, 'little'))
+    def copy(self):
+        """
+        This function returns an independent copy of the hasher, useful for hashing messages sharing a common prefix.
+        """
+        other = self.__class__.__new__(self.__class__)
+        other._state = list(self._state)
+        other._buffer = bytearray(self._buffer)
+        other._length = self._length
+        return other
 
+    def export_state(self):
+        """
+        This function returns the internal state as bytes so that hashing can be resumed later, e.g. in another process.
+        The layout is the four chaining words (little-endian, the same layout as a digest), the number of message bytes
+        seen so far as a 64-bit integer and the partial block that is not yet compressed.
+        """
+        return struct.pack('<4IQ', *self._state, self._length) + bytes(self._buffer)
 
-if __name__ == "__main__":
+    @classmethod
+    def from_state(cls, state):
+        """
+        This function returns a hasher resumed from the output of export_state().
+        Args:
+            state: The exported state as bytes
+        """
+        if len(state) < 24 or len(state) - 24 >= 64:
+            raise ValueError("Invalid MD5 state size")
+        *chaining_value, length = struct.unpack_from('<4IQ', state)
+        if length % 64 != len(state) - 24:
+            raise ValueError("MD5 state length does not match its partial block")
+
+        hasher = cls()
+        hasher._state = list(chaining_value)
+        hasher._length = length
+        hasher._buffer = bytearray(state[24:])
+        return hasher
 
-    parser = argparse.ArgumentParser()
-    parser.add_argument('-f', type=str, required=True, help="Name of the file to find the checksum")
+    def generate_hash(self, message) -> bytes:
+        """
+        This function takes in the message and returns the MD5 hash of it.
+        Args:
+            message: The message to be hashed via MD5, a str or any object supporting the buffer protocol
+        """
+        return self.__class__(message).digest()
 
-    args = parser.parse_args()
-    try:
-        with open(args.f, 'rb') as file:
 
-            # Read the contents of the file
-            file_contents = file.read()
-            md5 = MD5()
-            print(md5.generate_hash(file_contents).hex())
-    except FileNotFoundError:
-        logger.error("File does not exist")
+if __name__ == "__main__":
+    from checksum import main
+    main('md5')
@@ -0,0 +1,209 @@
+import logging
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import checksum
+
+logger = logging.getLogger(__name__)
+
+# Domain separation prefixes (as in RFC 6962), so that a leaf can never be confused with an inner node
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+DEFAULT_LEAF_SIZE = 1 << 20 # 1 MiB leaves
+
+def hash_leaf(path, offset, size, algorithm='sha256'):
+    """
+    This function returns the digest of one leaf of a file, i.e. H(0x00 || data[offset:offset + size]).
+    Args:
+        path: Path of the file
+        offset: Position of the leaf in the file (in bytes)
+        size: Number of bytes in the leaf
+        algorithm: Name of the hash algorithm
+    """
+    hasher = checksum.new(algorithm, LEAF_PREFIX)
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        remaining = size
+        while remaining > 0:
+            chunk = file.read(min(checksum.CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            hasher.update(chunk)
+            remaining -= len(chunk)
+    return hasher.digest()
+
+def hash_node(left, right, algorithm='sha256'):
+    """
+    This function returns the digest of an inner node, i.e. H(0x01 || left || right).
+    Args:
+        left: Digest of the left child
+        right: Digest of the right child
+        algorithm: Name of the hash algorithm
+    """
+    hasher = checksum.new(algorithm, NODE_PREFIX)
+    hasher.update(left)
+    hasher.update(right)
+    return hasher.digest()
+
+def merkle_root(leaves, algorithm='sha256'):
+    """
+    This function combines the leaf digests up a binary Merkle tree and returns the root.
+    When a level has an odd number of nodes the last one is promoted to the next level unchanged.
+    Args:
+        leaves: List of leaf digests in file order
+        algorithm: Name of the hash algorithm
+    """
+    level = list(leaves)
+    while len(level) > 1:
+        next_level = []
+        for i in range(0, len(level) - 1, 2):
+            next_level.append(hash_node(level[i], level[i + 1], algorithm))
+        if len(level) % 2 == 1:
+            next_level.append(level[-1])
+        level = next_level
+    return level[0]
+
+def leaf_ranges(size, leaf_size):
+    """
+    This function returns the (offset, size) of every leaf of a file. An empty file has a single empty leaf.
+    Args:
+        size: Size of the file in bytes
+        leaf_size: Size of a leaf in bytes
+    """
+    if size == 0:
+        return [(0, 0)]
+    return [(offset, min(leaf_size, size - offset)) for offset in range(0, size, leaf_size)]
+
+def hash_leaves(path, ranges, algorithm='sha256', executor=None):
+    """
+    This function returns the digests of the given leaves of a file, hashed in the worker processes of executor if given.
+    Args:
+        path: Path of the file
+        ranges: List of (offset, size) of the leaves
+        algorithm: Name of the hash algorithm
+        executor: Optional concurrent.futures executor to spread the leaves over
+    """
+    if executor is None:
+        return [hash_leaf(path, offset, size, algorithm) for offset, size in ranges]
+    futures = [executor.submit(hash_leaf, path, offset, size, algorithm) for offset, size in ranges]
+    return [future.result() for future in futures]
+
+def tree_hash(path, leaf_size=DEFAULT_LEAF_SIZE, algorithm='sha256', executor=None):
+    """
+    This function computes the Merkle tree hash of a file and returns its manifest as a dict:
+    the algorithm, the leaf size, the file size, the root and the digests of all the leaves (hex).
+    Args:
+        path: Path of the file
+        leaf_size: Size of a leaf in bytes
+        algorithm: Name of the hash algorithm
+        executor: Optional concurrent.futures executor to hash the leaves in parallel
+    """
+    if leaf_size <= 0:
+        raise ValueError("leaf size must be positive")
+
+    size = os.path.getsize(path)
+    leaves = hash_leaves(path, leaf_ranges(size, leaf_size), algorithm, executor)
+    return {
+        'algorithm': algorithm,
+        'leaf_size': leaf_size,
+        'size': size,
+        'root': merkle_root(leaves, algorithm).hex(),
+        'leaves': [leaf.hex() for leaf in leaves],
+    }
+
+def write_manifest(manifest, manifest_path):
+    """
+    This function stores a manifest returned by tree_hash() as JSON.
+    Args:
+        manifest: The manifest dict
+        manifest_path: Path of the JSON file to write
+    """
+    with open(manifest_path, 'w') as file:
+        json.dump(manifest, file, indent=1)
+        file.write('\n')
+
+def read_manifest(manifest_path):
+    """
+    This function loads a manifest written by write_manifest().
+    Args:
+        manifest_path: Path of the JSON file
+    """
+    with open(manifest_path) as file:
+        return json.load(file)
+
+def verify_range(path, manifest, start=0, end=None, executor=None):
+    """
+    This function re-verifies the byte range [start, end) of a file against a manifest by rehashing only the leaves covering it.
+    The leaf digests stored in the manifest are first checked against its root.
+    Returns (bad, size): the list of indices of the leaves that do not match (empty if the range is intact), and the
+    size of the file if the range runs to the end of the file and the file grew or shrank since the manifest, else None.
+    Bytes appended after the last leaf are not covered by any leaf, so only the size check catches them.
+    Args:
+        path: Path of the file
+        manifest: Manifest dict returned by tree_hash() or read_manifest()
+        start: First byte of the range
+        end: End of the range (exclusive), defaults to the end of the file
+        executor: Optional concurrent.futures executor to hash the leaves in parallel
+    """
+    algorithm = manifest['algorithm']
+    leaf_size = manifest['leaf_size']
+    leaves = [bytes.fromhex(leaf) for leaf in manifest['leaves']]
+    if merkle_root(leaves, algorithm).hex() != manifest['root']:
+        raise ValueError("manifest leaves do not match its root")
+
+    if end is None or end >= manifest['size']:
+        end = manifest['size']
+        size = os.path.getsize(path)
+        if size == manifest['size']:
+            size = None
+    else:
+        size = None
+    first = start // leaf_size
+    last = max(first + 1, -(-end // leaf_size)) # ceil(end / leaf_size)
+    indices = [i for i in range(first, last) if i < len(leaves)]
+
+    ranges = leaf_ranges(manifest['size'], leaf_size)
+    digests = hash_leaves(path, [ranges[i] for i in indices], algorithm, executor)
+    return [i for i, digest in zip(indices, digests) if digest != leaves[i]], size
+
+def format_tree_line(manifest, path):
+    """
+    This function formats a tree hash result in the BSD tag style, recording the leaf size next to the algorithm,
+    e.g. "SHA256-TREE/1048576 (file) = <root>". The tag keeps it from being mistaken for a plain digest.
+    Args:
+        manifest: The manifest dict
+        path: Path of the file
+    """
+    return "{}-TREE/{} ({}) = {}".format(manifest['algorithm'].upper(), manifest['leaf_size'], path, manifest['root'])
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(asctime)s %(message)s')
+
+    parser = argparse.ArgumentParser(description="Re-verify a byte range of a file against a stored Merkle manifest")
+    parser.add_argument('manifest', help="Manifest written by sha256.py --tree --manifest")
+    parser.add_argument('-f', type=str, required=True, help="Name of the file to verify")
+    parser.add_argument('--range', type=str, default=':', help="Byte range START:END to verify (default: the whole file)")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help="Number of worker processes (default: number of CPUs)")
+
+    args = parser.parse_args()
+    manifest = read_manifest(args.manifest)
+    start, _, end = args.range.partition(':')
+    start = int(start) if start else 0
+    end = int(end) if end else None
+
+    if args.jobs > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            bad, size = verify_range(args.f, manifest, start, end, executor)
+    else:
+        bad, size = verify_range(args.f, manifest, start, end)
+
+    if size is not None:
+        print("Failed: size {} bytes, the manifest has {}".format(size, manifest['size']))
+    if bad or size is not None:
+        for index in bad:
+            print("Failed: leaf {} (bytes {}-{})".format(index, index * manifest['leaf_size'], (index + 1) * manifest['leaf_size'] - 1))
+        exit(1)
+    print("Passed: {}".format(args.f))
@@ -0,0 +1,91 @@
+from collections import OrderedDict
+
+import checksum
+
+class PrefixCache:
+    """
+    Bounded LRU cache mapping message prefixes to the hasher state after them (the midstate).
+    Hashing many messages that share a long header, e.g. templated payloads or the key + message
+    MACs of lea.py, then only compresses the blocks after the shared prefix.
+    """
+    def __init__(self, algorithm='sha256', maxsize=64):
+        """
+        Args:
+            algorithm: Name of the hash algorithm, one of checksum.ALGORITHMS
+            maxsize: Maximum number of prefixes kept, the least recently used one is dropped first
+        """
+        self.algorithm = algorithm
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._midstates = OrderedDict()
+
+    def midstate(self, prefix):
+        """
+        This function returns a fresh hasher that has already absorbed the prefix.
+        The returned hasher is a copy, so it can be updated freely.
+        Args:
+            prefix: The shared prefix, a str or any object supporting the buffer protocol
+        """
+        if isinstance(prefix, str):
+            prefix = prefix.encode('ascii')
+        key = bytes(prefix)
+
+        hasher = self._midstates.get(key)
+        if hasher is not None:
+            self.hits += 1
+            self._midstates.move_to_end(key)
+        else:
+            self.misses += 1
+            hasher = checksum.new(self.algorithm, key)
+            self._midstates[key] = hasher
+            if len(self._midstates) > self.maxsize:
+                self._midstates.popitem(last=False)
+        return hasher.copy()
+
+    def digest(self, prefix, message):
+        """
+        This function returns the hash of prefix + message, resuming from the cached midstate of the prefix.
+        Args:
+            prefix: The shared prefix
+            message: The rest of the message
+        """
+        return self.midstate(prefix).update(message).digest()
+
+    def hexdigest(self, prefix, message):
+        """
+        This function returns the hash of prefix + message as a hex string.
+        Args:
+            prefix: The shared prefix
+            message: The rest of the message
+        """
+        return self.digest(prefix, message).hex()
+
+    def export(self):
+        """
+        This function returns the cached midstates as a {prefix: exported state} dict, e.g. to warm up another process.
+        Only the hasher state is exported, see SHA256.export_state().
+        """
+        return {prefix: hasher.export_state() for prefix, hasher in self._midstates.items()}
+
+    def load(self, exported):
+        """
+        This function adds midstates exported by export() to the cache.
+        Args:
+            exported: Dict returned by export()
+        """
+        hasher_class = type(checksum.new(self.algorithm))
+        for prefix, state in exported.items():
+            self._midstates[bytes(prefix)] = hasher_class.from_state(state)
+            self._midstates.move_to_end(bytes(prefix))
+            if len(self._midstates) > self.maxsize:
+                self._midstates.popitem(last=False)
+
+    def clear(self):
+        """
+        This function drops all the cached midstates.
+        """
+        self._midstates.clear()
+
+    def __len__(self):
+        return len(self._midstates)
@@ -0,0 +1,283 @@
+import logging
+import argparse
+import multiprocessing
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import checksum
+from kdf import chaining_value
+
+logger = logging.getLogger(__name__)
+
+# Hash algorithms with big-endian chaining values, whose first word holds the leading bits of the digest
+SEARCH_ALGORITHMS = ('sha256', 'sha512')
+
+# Nonces are appended to the prefix as 64-bit big-endian integers
+NONCE_SIZE = 8
+NONCE_LIMIT = 1 << (8 * NONCE_SIZE)
+
+# Number of nonces per task handed to a worker, and how often a worker checks whether another one has won
+CHUNK = 1 << 14
+CHECK_INTERVAL = 256
+
+def nonce_bytes(nonce):
+    """
+    This function returns the bytes a nonce is appended to the prefix as.
+    Args:
+        nonce: The nonce as an integer
+    """
+    return nonce.to_bytes(NONCE_SIZE, 'big')
+
+def leading_zero_bits(words, word_bits=32):
+    """
+    This function returns the number of leading zero bits of a digest given as its big-endian words.
+    Args:
+        words: The chaining value as a list of words
+        word_bits: Size of a word in bits
+    """
+    count = 0
+    for word in words:
+        if word:
+            return count + word_bits - word.bit_length()
+        count += word_bits
+    return count
+
+def prepare(prefix, algorithm='sha256'):
+    """
+    This function compresses every full block of the prefix once and returns the search template
+    (algorithm, midstate, tail, offset, word_bits). The tail is the last one or two blocks already padded
+    for a message of prefix + nonce, with the nonce bytes at the given offset left to be filled in.
+    Args:
+        prefix: The fixed prefix as bytes
+        algorithm: Name of the hash algorithm, one of SEARCH_ALGORITHMS
+    """
+    hasher = checksum.new(algorithm, prefix)
+    leftover = hasher.export_state()[hasher.state_header.size:]
+    tail = hasher.padding(bytearray(leftover) + bytes(NONCE_SIZE), length=(len(prefix) + NONCE_SIZE) * 8)
+    return algorithm, chaining_value(hasher), tail, len(leftover), hasher.word_size * 8
+
+def search_range(template, difficulty, start, stop, cancel=None):
+    """
+    This function tries the nonces start <= nonce < stop in order and returns (nonce, hashes), nonce being the first
+    one whose digest has at least difficulty leading zero bits, or None. Only the nonce bytes of the tail change,
+    the tail blocks are compressed from the midstate and the first word is checked before anything else.
+    Args:
+        template: Search template from prepare()
+        difficulty: Required number of leading zero bits
+        start: First nonce
+        stop: End of the range (exclusive)
+        cancel: Optional multiprocessing.Event, the search gives up once it is set
+    """
+    algorithm, midstate, tail, offset, word_bits = template
+    tail = bytearray(tail)
+    hasher = checksum.new(algorithm)
+    compress_block = hasher._compressor()
+    offsets = range(0, len(tail), hasher.block_size)
+    pack_nonce = struct.Struct('>Q').pack_into
+    # Any digest meeting the difficulty has a first word below this limit, which rejects nearly every nonce at once
+    limit = 1 << max(0, word_bits - difficulty)
+
+    for base in range(start, stop, CHECK_INTERVAL):
+        if cancel is not None and cancel.is_set():
+            return None, base - start
+        for nonce in range(base, min(base + CHECK_INTERVAL, stop)):
+            pack_nonce(tail, offset, nonce)
+            state = midstate
+            for block_offset in offsets:
+                state = compress_block(state, tail, block_offset)
+            if state[0] < limit and leading_zero_bits(state, word_bits) >= difficulty:
+                return nonce, nonce - start + 1
+    return None, stop - start
+
+# Search template and cancellation event of a worker process, set by init_worker()
+_template = None
+_cancel = None
+
+def init_worker(template, cancel):
+    """
+    This function runs once in every worker process, it keeps the template and generates the compression function.
+    Args:
+        template: Search template from prepare()
+        cancel: multiprocessing.Event shared by all the workers
+    """
+    global _template, _cancel
+    _template = template
+    _cancel = cancel
+    checksum.new(template[0])._compressor()
+
+def worker_search(difficulty, start, stop):
+    """
+    This function searches one range of nonces in a worker process, see search_range().
+    """
+    return search_range(_template, difficulty, start, stop, _cancel)
+
+def solve(prefix, difficulty, algorithm='sha256', jobs=1, start=0, stop=NONCE_LIMIT, chunk=CHUNK):
+    """
+    This function searches for a nonce such that the digest of prefix + nonce_bytes(nonce) has at least difficulty
+    leading zero bits. With more than one job the nonce space is handed out in chunks to worker processes, and as soon
+    as one of them finds a hit the others are cancelled. Returns a dict with the nonce (None if the range was exhausted),
+    its hex digest, the number of hashes computed and the seconds taken.
+    Args:
+        prefix: The fixed prefix, a str or bytes
+        difficulty: Required number of leading zero bits
+        algorithm: Name of the hash algorithm, one of SEARCH_ALGORITHMS
+        jobs: Number of worker processes
+        start: First nonce to try
+        stop: End of the nonce range (exclusive)
+        chunk: Number of nonces per task
+    """
+    if algorithm not in SEARCH_ALGORITHMS:
+        raise ValueError("Unsupported hash algorithm {}".format(algorithm))
+    if isinstance(prefix, str):
+        prefix = prefix.encode('utf-8')
+    if not 0 <= difficulty <= checksum.new(algorithm).digest_size * 8:
+        raise ValueError("difficulty must be between 0 and the digest size in bits")
+    if not 0 <= start <= stop <= NONCE_LIMIT:
+        raise ValueError("the nonce range must lie within 0 and 2**{}".format(8 * NONCE_SIZE))
+
+    began = time.perf_counter()
+    template = prepare(bytes(prefix), algorithm)
+    if jobs <= 1:
+        nonce, hashes = search_range(template, difficulty, start, stop)
+    else:
+        nonce, hashes = None, 0
+        cancel = multiprocessing.Event()
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(template, cancel))
+        try:
+            pending = set()
+            position = start
+            while True:
+                # Keep two tasks per worker in flight so that none of them idles between chunks
+                while nonce is None and position < stop and len(pending) < 2 * jobs:
+                    pending.add(executor.submit(worker_search, difficulty, position, min(position + chunk, stop)))
+                    position += chunk
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    found, tried = future.result()
+                    hashes += tried
+                    if found is not None and (nonce is None or found < nonce):
+                        nonce = found
+                if nonce is not None and not cancel.is_set():
+                    cancel.set()
+                    pending = {future for future in pending if not future.cancel()}
+        finally:
+            cancel.set()
+            executor.shutdown(cancel_futures=True)
+
+    digest = None
+    if nonce is not None:
+        digest = checksum.new(algorithm, bytes(prefix) + nonce_bytes(nonce)).hexdigest()
+    return {'nonce': nonce, 'digest': digest, 'hashes': hashes, 'seconds': time.perf_counter() - began}
+
+def verify(prefix, nonce, difficulty, algorithm='sha256'):
+    """
+    This function checks a solution the plain way, hashing prefix + nonce with the hasher class.
+    Args:
+        prefix: The fixed prefix, a str or bytes
+        nonce: The nonce as an integer
+        difficulty: Required number of leading zero bits
+        algorithm: Name of the hash algorithm
+    """
+    if isinstance(prefix, str):
+        prefix = prefix.encode('utf-8')
+    digest = checksum.new(algorithm, bytes(prefix) + nonce_bytes(nonce)).digest()
+    return leading_zero_bits(digest, 8) >= difficulty
+
+def scaling_benchmark(count, max_jobs, algorithm='sha256', prefix=b'x' * 100):
+    """
+    This function measures hashes/sec over a fixed number of nonces with 1, 2, 4, ... up to max_jobs processes,
+    with a difficulty no digest meets so that every nonce is tried. Returns a list of (jobs, hashes/sec), led by
+    (0, hashes/sec) of hashing every prefix + nonce from scratch with generate_hash() for comparison.
+    Args:
+        count: Number of nonces per run
+        max_jobs: Largest number of worker processes
+        algorithm: Name of the hash algorithm
+        prefix: The fixed prefix
+    """
+    impossible = checksum.new(algorithm).digest_size * 8 + 1
+    hasher_class = type(checksum.new(algorithm))
+    naive = max(1, count // 8)
+    began = time.perf_counter()
+    for nonce in range(naive):
+        hasher_class().generate_hash(prefix + nonce_bytes(nonce))
+    results = [(0, naive / (time.perf_counter() - began))]
+
+    jobs = 1
+    while jobs <= max_jobs:
+        template = prepare(prefix, algorithm)
+        if jobs == 1:
+            began = time.perf_counter()
+            _, hashes = search_range(template, impossible, 0, count)
+        else:
+            chunk = -(-count // jobs)
+            with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                                     initargs=(template, multiprocessing.Event())) as executor:
+                # Start the workers before timing, so that only the search itself is measured
+                list(executor.map(worker_search, [impossible] * jobs, [0] * jobs, [0] * jobs))
+                began = time.perf_counter()
+                hashes = sum(tried for _, tried in executor.map(
+                    worker_search, [impossible] * jobs, range(0, count, chunk), range(chunk, count + chunk, chunk)))
+        results.append((jobs, hashes / (time.perf_counter() - began)))
+        jobs *= 2
+    return results
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(asctime)s %(message)s')
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('prefix', nargs='?', help="The fixed prefix the nonce is appended to (UTF-8, or hex with --hex)")
+    parser.add_argument('-d', '--difficulty', type=int, default=16, help="Required number of leading zero bits of the digest (default: 16)")
+    parser.add_argument('--hex', action='store_true', help="The prefix is given in hex")
+    parser.add_argument('--algo', choices=SEARCH_ALGORITHMS, default='sha256', help="Hash algorithm (default: sha256)")
+    parser.add_argument('--start', type=int, default=0, help="First nonce to try (default: 0)")
+    parser.add_argument('--limit', type=int, help="Give up after this many nonces (default: the whole 64-bit space)")
+    parser.add_argument('--verify', type=str, metavar='NONCE', help="Check a nonce given in hex instead of searching")
+    parser.add_argument('--benchmark', type=int, metavar='COUNT', help="Measure hashes/sec over COUNT nonces for 1, 2, 4, ... up to -j processes")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help="Number of worker processes (default: number of CPUs)")
+
+    args = parser.parse_args()
+    if args.benchmark:
+        for jobs, rate in scaling_benchmark(args.benchmark, max(1, args.jobs), args.algo):
+            if jobs == 0:
+                baseline = rate
+                print("generate_hash    {:>12.0f} hashes/sec".format(rate))
+            else:
+                if jobs == 1:
+                    single = rate
+                print("{:>2} process{:<3} {:>12.0f} hashes/sec  {:.2f}x generate_hash  {:.2f}x one process".format(
+                    jobs, '' if jobs == 1 else 'es', rate, rate / baseline, rate / single))
+        exit(0)
+
+    if args.prefix is None:
+        parser.error("no prefix given")
+    try:
+        prefix = bytes.fromhex(args.prefix) if args.hex else args.prefix.encode('utf-8')
+    except ValueError:
+        parser.error("--hex prefix is not valid hex")
+
+    if args.verify is not None:
+        if verify(prefix, int(args.verify, 16), args.difficulty, args.algo):
+            print("{}: OK".format(args.verify))
+            exit(0)
+        print("{}: FAILED".format(args.verify))
+        exit(1)
+
+    stop = NONCE_LIMIT if args.limit is None else min(NONCE_LIMIT, args.start + args.limit)
+    try:
+        result = solve(prefix, args.difficulty, args.algo, args.jobs, args.start, stop)
+    except ValueError as error:
+        logger.error("%s", error)
+        exit(1)
+
+    rate = result['hashes'] / max(result['seconds'], 1e-9)
+    if result['nonce'] is None:
+        logger.error("No nonce found in %d tries (%.0f hashes/sec)", result['hashes'], rate)
+        exit(1)
+    print("nonce {}  digest {}".format(nonce_bytes(result['nonce']).hex(), result['digest']))
+    print("{} hashes in {:.3f} s ({:.0f} hashes/sec)".format(result['hashes'], result['seconds'], rate), file=sys.stderr)
+    sys.stdout.flush()
@@ -0,0 +1,202 @@
+import logging
+import struct
+
+import sha256
+from sha256 import get_nth_prime, rotate_right
+
+# Logging is only configured when run as a script, importing this module leaves the host application's logging alone
+logger = logging.getLogger(__name__)
+
+MASK_64 = 0xffffffffffffffff
+
+def integer_root(number, degree):
+    """
+    This function returns the integer part of the degree-th root of a non-negative integer, using Newton's method
+    on integers so that 64 bit fractional parts come out exact (floats only carry 53 bits).
+    Args:
+        number: The integer
+        degree: The degree of the root, 2 for square roots and 3 for cube roots
+    """
+    root = 1 << ((number.bit_length() + degree - 1) // degree)
+    while True:
+        better = ((degree - 1) * root + number // root ** (degree - 1)) // degree
+        if better >= root:
+            return root
+        root = better
+
+def fractional_bits(prime, degree, bits):
+    """
+    This function returns the first bits of the fractional part of the degree-th root of a prime.
+    Args:
+        prime: The prime number
+        degree: The degree of the root
+        bits: Number of bits to return
+    """
+    return integer_root(prime << (degree * bits), degree) & ((1 << bits) - 1)
+
+# Round constants: first 64 bits of the fractional parts of the cube roots of the first 80 primes (sec 4.2.3)
+# Frozen here so that importing the module does no work, verify_constants() regenerates them for checking
+K512 = (
+    0x428a2f98d728ae22, 0x7137449123ef65cd, 0xb5c0fbcfec4d3b2f, 0xe9b5dba58189dbbc,
+    0x3956c25bf348b538, 0x59f111f1b605d019, 0x923f82a4af194f9b, 0xab1c5ed5da6d8118,
+    0xd807aa98a3030242, 0x12835b0145706fbe, 0x243185be4ee4b28c, 0x550c7dc3d5ffb4e2,
+    0x72be5d74f27b896f, 0x80deb1fe3b1696b1, 0x9bdc06a725c71235, 0xc19bf174cf692694,
+    0xe49b69c19ef14ad2, 0xefbe4786384f25e3, 0x0fc19dc68b8cd5b5, 0x240ca1cc77ac9c65,
+    0x2de92c6f592b0275, 0x4a7484aa6ea6e483, 0x5cb0a9dcbd41fbd4, 0x76f988da831153b5,
+    0x983e5152ee66dfab, 0xa831c66d2db43210, 0xb00327c898fb213f, 0xbf597fc7beef0ee4,
+    0xc6e00bf33da88fc2, 0xd5a79147930aa725, 0x06ca6351e003826f, 0x142929670a0e6e70,
+    0x27b70a8546d22ffc, 0x2e1b21385c26c926, 0x4d2c6dfc5ac42aed, 0x53380d139d95b3df,
+    0x650a73548baf63de, 0x766a0abb3c77b2a8, 0x81c2c92e47edaee6, 0x92722c851482353b,
+    0xa2bfe8a14cf10364, 0xa81a664bbc423001, 0xc24b8b70d0f89791, 0xc76c51a30654be30,
+    0xd192e819d6ef5218, 0xd69906245565a910, 0xf40e35855771202a, 0x106aa07032bbd1b8,
+    0x19a4c116b8d2d0c8, 0x1e376c085141ab53, 0x2748774cdf8eeb99, 0x34b0bcb5e19b48a8,
+    0x391c0cb3c5c95a63, 0x4ed8aa4ae3418acb, 0x5b9cca4f7763e373, 0x682e6ff3d6b2b8a3,
+    0x748f82ee5defb2fc, 0x78a5636f43172f60, 0x84c87814a1f0ab72, 0x8cc702081a6439ec,
+    0x90befffa23631e28, 0xa4506cebde82bde9, 0xbef9a3f7b2c67915, 0xc67178f2e372532b,
+    0xca273eceea26619c, 0xd186b8c721c0c207, 0xeada7dd6cde0eb1e, 0xf57d4f7fee6ed178,
+    0x06f067aa72176fba, 0x0a637dc5a2c898a6, 0x113f9804bef90dae, 0x1b710b35131c471b,
+    0x28db77f523047d84, 0x32caab7b40c72493, 0x3c9ebe0a15c9bebc, 0x431d67c49c100d4c,
+    0x4cc5d4becb3e42b6, 0x597f299cfc657e2a, 0x5fcb6fab3ad6faec, 0x6c44198c4a475817,
+)
+
+# SHA-512 initial hash value: first 64 bits of the fractional parts of the square roots of the first 8 primes (sec 5.3.5)
+H512 = (
+    0x6a09e667f3bcc908, 0xbb67ae8584caa73b, 0x3c6ef372fe94f82b, 0xa54ff53a5f1d36f1,
+    0x510e527fade682d1, 0x9b05688c2b3e6c1f, 0x1f83d9abfb41bd6b, 0x5be0cd19137e2179,
+)
+
+# SHA-384 initial hash value: first 64 bits of the fractional parts of the square roots of the 9th to 16th primes (sec 5.3.4)
+H384 = (
+    0xcbbb9d5dc1059ed8, 0x629a292a367cd507, 0x9159015a3070dd17, 0x152fecd8f70e5939,
+    0x67332667ffc00b31, 0x8eb44a8768581511, 0xdb0c2e0d64f98fa7, 0x47b5481dbefa4fa4,
+)
+
+# SHA-224 initial hash value: the second 32 bits of the same fractional parts, i.e. the low halves of H384 (sec 5.3.2)
+H224 = (
+    0xc1059ed8, 0x367cd507, 0x3070dd17, 0xf70e5939, 0xffc00b31, 0x68581511, 0x64f98fa7, 0xbefa4fa4,
+)
+
+# Rotation and shift amounts of ∑0, ∑1, σ0 and σ1 for 64-bit words (sec 4.1.3), the last σ amount is a right shift
+ROTATIONS_512 = ((28, 34, 39), (14, 18, 41), (1, 8, 7), (19, 61, 6))
+
+def verify_constants():
+    """
+    This function regenerates the K512, H512, H384 and H224 tables from the primes and checks them against the frozen tables.
+    Returns True if all the tables match.
+    """
+    return (tuple(fractional_bits(get_nth_prime(i), 3, 64) for i in range(1, 81)) == K512 and
+            tuple(fractional_bits(get_nth_prime(i), 2, 64) for i in range(1, 9)) == H512 and
+            tuple(fractional_bits(get_nth_prime(i), 2, 64) for i in range(9, 17)) == H384 and
+            tuple(fractional_bits(get_nth_prime(i), 2, 64) & 0xffffffff for i in range(9, 17)) == H224)
+
+def prepare_schedule(block, offset=0):
+    """
+    This function expands a 1024-bit block into the 80 word SHA-512 message schedule.
+    Args:
+        block: Any buffer (bytes, bytearray, memoryview, mmap, ...) holding the 1024-bit block
+        offset: Position of the block inside the buffer (in bytes)
+    """
+    message_schedule = list(struct.unpack_from('>16Q', block, offset))
+    for t in range(16, 80):
+        w2 = message_schedule[t-2]
+        w15 = message_schedule[t-15]
+        term1 = rotate_right(w2, 19, 64) ^ rotate_right(w2, 61, 64) ^ (w2 >> 6)
+        term3 = rotate_right(w15, 1, 64) ^ rotate_right(w15, 8, 64) ^ (w15 >> 7)
+        message_schedule.append((term1 + message_schedule[t-7] + term3 + message_schedule[t-16]) & MASK_64)
+    return message_schedule
+
+def compress_rounds(state, message_schedule):
+    """
+    This function runs the 80 rounds of the SHA-512 compression function over a message schedule
+    and returns the new chaining value.
+    Args:
+        state: The current chaining value as a list of eight 64-bit words
+        message_schedule: The 80 words returned by prepare_schedule()
+    """
+    a, b, c, d, e, f, g, h = state
+    for t in range(80):
+        big_sigma_1 = rotate_right(e, 14, 64) ^ rotate_right(e, 18, 64) ^ rotate_right(e, 41, 64)
+        t1 = (h + big_sigma_1 + ((e & f) ^ (~e & g)) + K512[t] + message_schedule[t]) & MASK_64
+        big_sigma_0 = rotate_right(a, 28, 64) ^ rotate_right(a, 34, 64) ^ rotate_right(a, 39, 64)
+        t2 = (big_sigma_0 + ((a & b) ^ (a & c) ^ (b & c))) & MASK_64
+        h, g, f, e, d, c, b, a = g, f, e, (d + t1) & MASK_64, c, b, a, (t1 + t2) & MASK_64
+    return [(x + y) & MASK_64 for x, y in zip(state, (a, b, c, d, e, f, g, h))]
+
+def reference_compress(state, block, offset=0):
+    """
+    This function runs the SHA-512 compression function on a single block and returns the new chaining value.
+    It follows the NIST description step by step and is kept as the reference for compress().
+    Args:
+        state: The current chaining value as a list of eight 64-bit words
+        block: Any buffer (bytes, bytearray, memoryview, mmap, ...) holding the 1024-bit block
+        offset: Position of the block inside the buffer (in bytes)
+    """
+    return compress_rounds(state, prepare_schedule(block, offset))
+
+# The generated compression function, built by load_compress() on first use so that importing stays cheap
+_compress = None
+
+def load_compress():
+    """
+    This function returns the straight-line SHA-512 compression function, generated by sha256.generate_compress_source()
+    with 64-bit words, the 80 K512 constants and the SHA-512 rotations, compiling it on the first call.
+    """
+    global _compress
+    if _compress is None:
+        namespace = {'unpack_block': struct.Struct('>16Q').unpack_from}
+        source = sha256.generate_compress_source(64, K512, ROTATIONS_512)
+        exec(compile(source, '<sha512 compress>', 'exec'), namespace)
+        _compress = namespace['compress']
+    return _compress
+
+def compress(state, block, offset=0):
+    """
+    This function runs the SHA-512 compression function on a single block and returns the new chaining value.
+    It calls the straight-line function, which gives the same results as reference_compress().
+    Args:
+        state: The current chaining value as a list of eight 64-bit words
+        block: Any buffer (bytes, bytearray, memoryview, mmap, ...) holding the 1024-bit block
+        offset: Position of the block inside the buffer (in bytes)
+    """
+    return (_compress or load_compress())(state, block, offset)
+
+class SHA224(sha256.SHA256):
+    """
+    SHA-224: the SHA256 compression function from a different initial value, with the digest cut to 224 bits.
+    """
+    name = 'sha224'
+    digest_size = 28
+    initial_state = H224
+
+class SHA512(sha256.SHA256):
+    """
+    SHA-512: the SHA256 structure with 64-bit words, 80 rounds, 1024-bit blocks and a 128-bit length.
+    Padding, parsing, update() and the exported state all come from sha256.SHA256.
+    On 64-bit hosts it compresses twice the bytes per block for 80 instead of 64 rounds.
+    """
+    name = 'sha512'
+    digest_size = 64
+    block_size = 128
+    word_size = 8
+    length_size = 16
+    initial_state = H512
+    state_header = struct.Struct('>8QQ')
+
+    def _compressor(self):
+        """
+        This function returns the SHA-512 compression function, generating it on first use.
+        """
+        return _compress or load_compress()
+
+class SHA384(SHA512):
+    """
+    SHA-384: SHA-512 from a different initial value, with the digest cut to 384 bits.
+    """
+    name = 'sha384'
+    digest_size = 48
+    initial_state = H384
+
+
+if __name__ == "__main__":
+    from checksum import main
+    main('sha512')
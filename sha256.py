@@ -1,12 +1,9 @@
 import logging
 import math 
-import argparse
+import struct
 
-logging.basicConfig(format='%(asctime)s %(message)s',
-                    filemode='w')
-logger = logging.getLogger()
-
-logger.setLevel(logging.DEBUG)
+# Logging is only configured when run as a script, importing this module leaves the host application's logging alone
+logger = logging.getLogger(__name__)
 
 
 def get_nth_prime(n):
@@ -60,8 +57,34 @@ def fract_8_prime():
         hexadecimal = int(fractional_part * 2**32)
         output.append(hexadecimal)
     return output
-K = fract_64_prime()
-H = fract_8_prime()
+
+# Round constants: first 32 bits of the fractional parts of the cube roots of the first 64 primes (sec 4.2.2)
+# Frozen here so that importing the module does no work, verify_constants() regenerates them for checking
+K = (
+    0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+    0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+    0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+    0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+    0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+    0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+    0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+    0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2,
+)
+
+# Initial hash value: first 32 bits of the fractional parts of the square roots of the first 8 primes (sec 5.3.3)
+H = (
+    0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19,
+)
+
+# Rotation and shift amounts of ∑0, ∑1, σ0 and σ1 (sec 4.1.2), the last σ amount is a right shift
+ROTATIONS = ((2, 13, 22), (6, 11, 25), (7, 18, 3), (17, 19, 10))
+
+def verify_constants():
+    """
+    This function regenerates the K and H tables from the primes and checks them against the frozen tables.
+    Returns True if both tables match.
+    """
+    return tuple(fract_64_prime()) == K and tuple(fract_8_prime()) == H
 
 def rotate_right(num, shift, size = 32):
     """
@@ -123,26 +146,209 @@ def small_sigma_1(num: int):
            (num >> 10))
     return num
 
+def prepare_schedule(block, offset=0):
+    """
+    This function expands a 512-bit block into the 64 word message schedule.
+    Args:
+        block: Any buffer (bytes, bytearray, memoryview, mmap, ...) holding the 512-bit block
+        offset: Position of the block inside the buffer (in bytes)
+    """
+    # Prepare message schedule as specified by NIST paper sec 6.2.2
+    # The first 16 words are read straight out of the buffer without slicing it
+    message_schedule = list(struct.unpack_from('>16I', block, offset))
+    for t in range(16, 64):
+        term1 = small_sigma_1(message_schedule[t-2])
+        term2 = message_schedule[t-7]
+        term3 = small_sigma_0(message_schedule[t-15])
+        term4 = message_schedule[t-16]
+        message_schedule.append((term1 + term2 + term3 + term4) % 2**32)
+
+    if len(message_schedule) != 64:
+        logger.error("Length of message schedule block is not 8 bytes")
+        exit(1)
+    return message_schedule
+
+def compress_rounds(state, message_schedule):
+    """
+    This function runs the 64 rounds of the SHA256 compression function over a message schedule
+    and returns the new chaining value.
+    Args:
+        state: The current chaining value as a list of eight 32-bit words
+        message_schedule: The 64 words returned by prepare_schedule()
+    """
+    h0, h1, h2, h3, h4, h5, h6, h7 = state
+
+    # Initialize working variables
+    a = h0
+    b = h1
+    c = h2
+    d = h3
+    e = h4
+    f = h5
+    g = h6
+    h = h7
+
+    # Iterate for t = 0 to 63
+    for t in range(64):
+        t1 = ((h + big_sigma_1(e) + choice(e, f, g) + K[t] +
+            message_schedule[t]) % 2**32)
+
+        t2 = (big_sigma_0(a) + majority(a, b, c)) % 2**32
+
+        h = g
+        g = f
+        f = e
+        e = (d + t1) % 2**32
+        d = c
+        c = b
+        b = a
+        a = (t1 + t2) % 2**32
+
+    # Compute intermediate hash value
+    return [(a + h0) % 2**32, (b + h1) % 2**32,
+            (c + h2) % 2**32, (d + h3) % 2**32,
+            (e + h4) % 2**32, (f + h5) % 2**32,
+            (g + h6) % 2**32, (h + h7) % 2**32]
+
+def reference_compress(state, block, offset=0):
+    """
+    This function runs the SHA256 compression function on a single block and returns the new chaining value.
+    It follows the NIST description step by step and is kept as the reference for compress().
+    Args:
+        state: The current chaining value as a list of eight 32-bit words
+        block: Any buffer (bytes, bytearray, memoryview, mmap, ...) holding the 512-bit block
+        offset: Position of the block inside the buffer (in bytes)
+    """
+    return compress_rounds(state, prepare_schedule(block, offset))
+
+def generate_compress_source(word_bits=32, constants=K, rotations=ROTATIONS):
+    """
+    This function generates the source of a straight-line SHA-2 compression function, SHA256 by default.
+    All rounds are unrolled on local ints with rotate_right, the sigmas, choice and majority inlined:
+        - the message schedule is a rolling window of 16 locals w0..w15 instead of a full list
+        - the working variables are renamed every round instead of being shifted, so only two are written per round
+        - results are only masked to the word size where a value is fed back into a rotation or returned
+    The generated function expects unpack_block in its namespace, returning the 16 words of a block.
+    Args:
+        word_bits: Size of a word in bits, 32 for SHA-224/256 and 64 for SHA-384/512
+        constants: The round constants, one round per constant
+        rotations: The ∑0, ∑1, σ0 and σ1 amounts, see ROTATIONS
+    """
+    def rotr(x, n):
+        return "({0} >> {1} | {0} << {2})".format(x, n, word_bits - n)
+
+    mask = hex((1 << word_bits) - 1)
+    (s0, s1, s2), (e0, e1, e2), (w0a, w0b, w0c), (w1a, w1b, w1c) = rotations
+
+    lines = [
+        "def compress(state, block, offset=0):",
+        "    w0, w1, w2, w3, w4, w5, w6, w7, w8, w9, w10, w11, w12, w13, w14, w15 = unpack_block(block, offset)",
+        "    h0, h1, h2, h3, h4, h5, h6, h7 = state",
+        "    a, b, c, d, e, f, g, h = h0, h1, h2, h3, h4, h5, h6, h7",
+    ]
+    names = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h']
+    for t in range(len(constants)):
+        w = "w{}".format(t % 16)
+        if t >= 16:
+            # W[t] = σ1(W[t-2]) + W[t-7] + σ0(W[t-15]) + W[t-16], written over W[t-16]
+            w2 = "w{}".format((t - 2) % 16)
+            w15 = "w{}".format((t - 15) % 16)
+            lines.append("    {0} = ({1} ^ {2} ^ {3} >> {8}) + w{4} + ({5} ^ {6} ^ {7} >> {9}) + {0} & {10}".format(
+                w, rotr(w2, w1a), rotr(w2, w1b), w2, (t - 7) % 16, rotr(w15, w0a), rotr(w15, w0b), w15, w1c, w0c, mask))
+
+        a, b, c, d, e, f, g, h = names
+        # T1 = h + ∑1(e) + Ch(e, f, g) + K[t] + W[t], Ch written as g ^ (e & (f ^ g))
+        lines.append("    t1 = {0} + ({1} ^ {2} ^ {3}) + ({4} ^ {5} & ({6} ^ {4})) + {7} + {8}".format(
+            h, rotr(e, e0), rotr(e, e1), rotr(e, e2), g, e, f, hex(constants[t]), w))
+        # e' = d + T1, stored in d
+        lines.append("    {0} = {0} + t1 & {1}".format(d, mask))
+        # a' = T1 + ∑0(a) + Maj(a, b, c), stored in h, Maj written as (a & b) | (c & (a | b))
+        lines.append("    {0} = t1 + ({1} ^ {2} ^ {3}) + ({4} & {5} | {6} & ({4} | {5})) & {7}".format(
+            h, rotr(a, s0), rotr(a, s1), rotr(a, s2), a, b, c, mask))
+        # rename: the old h is the new a and the old d is the new e
+        names = [h] + names[:7]
+
+    lines.append("    return [{0} + h0 & {8}, {1} + h1 & {8}, {2} + h2 & {8}, {3} + h3 & {8},".format(*names, mask))
+    lines.append("            {4} + h4 & {8}, {5} + h5 & {8}, {6} + h6 & {8}, {7} + h7 & {8}]".format(*names, mask))
+    return "\n".join(lines) + "\n"
+
+# The generated compression function, built by load_compress() on first use so that importing stays cheap
+_compress = None
+
+def load_compress():
+    """
+    This function returns the straight-line compression function, generating and compiling it on the first call.
+    """
+    global _compress
+    if _compress is None:
+        namespace = {'unpack_block': struct.Struct('>16I').unpack_from}
+        exec(compile(generate_compress_source(), '<sha256 compress>', 'exec'), namespace)
+        _compress = namespace['compress']
+    return _compress
+
+def compress(state, block, offset=0):
+    """
+    This function runs the SHA256 compression function on a single block and returns the new chaining value.
+    It calls the straight-line function from generate_compress_source(), which gives the same results as reference_compress().
+    Args:
+        state: The current chaining value as a list of eight 32-bit words
+        block: Any buffer (bytes, bytearray, memoryview, mmap, ...) holding the 512-bit block
+        offset: Position of the block inside the buffer (in bytes)
+    """
+    return (_compress or load_compress())(state, block, offset)
+
 class SHA256:
-    def padding(self, message):
+    """
+    Incremental SHA256 hasher with a hashlib style interface.
+    Only the chaining value, the total length and one partial block are kept in memory,
+    so a message can be fed in chunks of any size via update().
+    The other SHA-2 variants in sha2.py reuse this class and only change the class attributes below
+    and the compression function returned by _compressor().
+    """
+    name = 'sha256'
+    digest_size = 32
+    block_size = 64
+    word_size = 4 # bytes per word of the chaining value
+    length_size = 8 # bytes of the message length appended by the padding
+    initial_state = H
+    state_header = struct.Struct('>8IQ') # chaining value and byte count at the start of export_state()
+
+    def __init__(self, message=None):
+        # Setting Initial Hash Value
+        # Consists of eight 32-bit words in hex
+        # They are obtained by taking the first 32-bits of the fractional parts of the square roots of the first eight prime numbers.
+        self._state = list(self.initial_state)
+        self._buffer = bytearray() # bytes of the current block that are not yet compressed
+        self._length = 0 # total number of message bytes seen so far
+        if message is not None:
+            self.update(message)
+
+    def padding(self, message, length=None):
         """
         This function does the padding of the message so that it is a multiple of 512 bits.
         Step 1:
             Add a single "1" bit to the end of the message
         Step 2:
             Add a fixed number of "0"s to the end of the message. Let the number of 0s be k
-            If l is the size of the message, then l + k + 1 mod 512 should be 64
+            If l is the size of the message, then l + k + 1 mod 512 should be 448
         Step 3:
             Append 64 bit binary representation of l which is the length of the message
+        SHA-384/512 do the same with 1024-bit blocks and a 128 bit length.
+
+        Args:
+            message: The message to be padded to a multiple of 512 bits
+            length: Length to append at the end (in bits), defaults to the length of message
         """
-        length = len(message) * 8 # len gives number of bytes so multiply by 8 to get bits
+        if length is None:
+            length = len(message) * 8 # len gives number of bytes so multiply by 8 to get bits
+
         message.append(0x80)
-        while (len(message) * 8 + 64) % 512 != 0:
-            message.append(0x00)
+        # Add all the 0 bytes in one go so that the length ends exactly on a block boundary
+        message += bytes((self.block_size - self.length_size - len(message)) % self.block_size)
 
-        message += length.to_bytes(8, 'big') # Convert to bytes with big-endian format. MSB is first.
+        message += length.to_bytes(self.length_size, 'big') # Convert to bytes with big-endian format. MSB is first.
         #message.append(0x80) #To check if error is logged
-        if (len(message) * 8) % 512 != 0:
+        if len(message) % self.block_size != 0:
             logger.error("Padding not completed and message not a multiple of 512 bits")
             exit(1)
 
@@ -150,125 +356,127 @@ class SHA256:
 
     def parsing(self, padded_message):
         """
-        Return blocks of 512 bits of the padded message as a list
+        Return blocks of 512 bits of the padded message as a list of memoryview slices (no bytes are copied)
         Args:
             padded_message: The message padded to be a multiple of 512 bits
         """
+        view = memoryview(padded_message).cast('B')
         blocks = [] # contains 512-bit blocks of message
-        for i in range(0, len(padded_message), 64): # 64 bytes is 512 bits
-            blocks.append(padded_message[i:i+64])
+        for i in range(0, len(view), self.block_size): # 64 bytes is 512 bits
+            blocks.append(view[i:i+self.block_size])
         return blocks
-        
-    def generate_hash(self, message):
+
+    def _compressor(self):
         """
-        This function takes in the message and returns the SHA256 hash of it.
-        Args:
-            message: The message to be hashed via SHA256
+        This function returns the compression function of the hash, generating it on first use.
         """
+        return _compress or load_compress()
 
-        #print(type(message))
+    def update(self, message):
+        """
+        This function feeds the next chunk of the message into the hasher.
+        Every complete 512-bit block is compressed straight out of the caller's buffer and only the remainder is buffered.
+        Args:
+            message: The next chunk of the message to be hashed, a str or any object supporting the buffer protocol
+        """
         # Type checking and type casting accordingly
         if isinstance(message, str):
-            message = bytearray(message, 'ascii')   # encode to bytearray object with ASCII format
-        elif isinstance(message, bytes):
-            message = bytearray(message)
-        elif not isinstance(message, bytearray):
-            raise TypeError
+            message = message.encode('ascii')   # encode to bytes object with ASCII format
+
+        with memoryview(message) as raw, raw.cast('B') as view:
+            length = len(view)
+            self._length += length
+            state = self._state
+            offset = 0
+            block_size = self.block_size
+            compress_block = self._compressor()
+
+            # Top up a partially filled block from an earlier call first
+            if self._buffer:
+                offset = min(block_size - len(self._buffer), length)
+                self._buffer += view[:offset]
+                if len(self._buffer) < block_size:
+                    return self
+                state = compress_block(state, self._buffer, 0)
+                self._buffer.clear()
+
+            # Walk the complete blocks by offset and keep the leftover bytes for the next call
+            end = length - (length - offset) % block_size
+            for block_offset in range(offset, end, block_size):
+                state = compress_block(state, view, block_offset)
+            self._buffer += view[end:]
+
+        self._state = state
+        return self
+
+    def digest(self):
+        """
+        This function returns the SHA256 hash of all the data passed to update() so far.
+        The hasher is not modified, so more data can be added afterwards.
+        """
+        state = self._state
+        compress_block = self._compressor()
+        # Only the final one or two padded blocks are ever built
+        padded_tail = self.padding(bytearray(self._buffer), length=self._length * 8)
+        for offset in range(0, len(padded_tail), self.block_size):
+            state = compress_block(state, padded_tail, offset)
 
-        padded_message = self.padding(message)
-        blocks = self.parsing(padded_message)
+        # SHA-224 and SHA-384 drop the last words of the chaining value
+        return b''.join(word.to_bytes(self.word_size, 'big') for word in state)[:self.digest_size]
 
-        # Setting Initial Hash Value
-        # Consists of eight 32-bit words in hex
-        # They are obtained by taking the first 32-bits of the fractional parts of the square roots of the first eight prime numbers.
-        h0 = H[0]
-        h1 = H[1]
-        h2 = H[2]
-        h3 = H[3]
-        h4 = H[4]
-        h5 = H[5]
-        h6 = H[6]
-        h7 = H[7]
-
-        # Hash Computation and message schedule generation
-        for message_block in blocks:
-            # Prepare message schedule as specified by NIST paper sec 6.2.2
-            message_schedule = []
-            for t in range(0, 64):
-                if t <= 15:
-                    # Add the t'th 32 bit word of the block
-                    # Start from the leftmost word
-                    # 4 bytes at a time
-                    message_schedule.append(bytes(message_block[t*4:(t*4)+4]))
-                else:
-                    term1 = small_sigma_1(int.from_bytes(message_schedule[t-2], 'big'))
-                    term2 = int.from_bytes(message_schedule[t-7], 'big')
-                    term3 = small_sigma_0(int.from_bytes(message_schedule[t-15], 'big'))
-                    term4 = int.from_bytes(message_schedule[t-16], 'big')
-
-                    # append a 4-byte byte object
-                    schedule = ((term1 + term2 + term3 + term4) % 2**32).to_bytes(4, 'big')
-                    message_schedule.append(schedule)
-
-            if len(message_schedule) != 64:
-                logger.error("Length of message schedule block is not 8 bytes")
-                exit(1)
-
-            # Initialize working variables
-            a = h0
-            b = h1
-            c = h2
-            d = h3
-            e = h4
-            f = h5
-            g = h6
-            h = h7
-
-            # Iterate for t = 0 to 63
-            for t in range(64):
-                t1 = ((h + big_sigma_1(e) + choice(e, f, g) + K[t] +
-                    int.from_bytes(message_schedule[t], 'big')) % 2**32)
-
-                t2 = (big_sigma_0(a) + majority(a, b, c)) % 2**32
-
-                h = g
-                g = f
-                f = e
-                e = (d + t1) % 2**32
-                d = c
-                c = b
-                b = a
-                a = (t1 + t2) % 2**32
-
-            # Compute intermediate hash value
-            h0 = (a + h0) % 2**32
-            h1 = (b + h1) % 2**32
-            h2 = (c + h2) % 2**32
-            h3 = (d + h3) % 2**32
-            h4 = (e + h4) % 2**32
-            h5 = (f + h5) % 2**32
-            h6 = (g + h6) % 2**32
-            h7 = (h + h7) % 2**32
-
-        return ((h0).to_bytes(4, 'big') + (h1).to_bytes(4, 'big') +
-                (h2).to_bytes(4, 'big') + (h3).to_bytes(4, 'big') +
-                (h4).to_bytes(4, 'big') + (h5).to_bytes(4, 'big') +
-                (h6).to_bytes(4, 'big') + (h7).to_bytes(4, 'big'))
+    def hexdigest(self):
+        """
+        This function returns the SHA256 hash of the data so far as a hex string.
+        """
+        return self.digest().hex()
+
+    def copy(self):
+        """
+        This function returns an independent copy of the hasher, useful for hashing messages sharing a common prefix.
+        """
+        other = self.__class__.__new__(self.__class__)
+        other._state = list(self._state)
+        other._buffer = bytearray(self._buffer)
+        other._length = self._length
+        return other
+
+    def export_state(self):
+        """
+        This function returns the internal state as bytes so that hashing can be resumed later, e.g. in another process.
+        The layout is the eight chaining words (big-endian, the same layout as a digest), the number of message bytes
+        seen so far as a 64-bit integer and the partial block that is not yet compressed.
+        """
+        return self.state_header.pack(*self._state, self._length) + bytes(self._buffer)
+
+    @classmethod
+    def from_state(cls, state):
+        """
+        This function returns a hasher resumed from the output of export_state().
+        Args:
+            state: The exported state as bytes
+        """
+        header = cls.state_header.size
+        if len(state) < header or len(state) - header >= cls.block_size:
+            raise ValueError("Invalid {} state size".format(cls.name.upper()))
+        *chaining_value, length = cls.state_header.unpack_from(state)
+        if length % cls.block_size != len(state) - header:
+            raise ValueError("{} state length does not match its partial block".format(cls.name.upper()))
+
+        hasher = cls()
+        hasher._state = list(chaining_value)
+        hasher._length = length
+        hasher._buffer = bytearray(state[header:])
+        return hasher
+
+    def generate_hash(self, message):
+        """
+        This function takes in the message and returns the SHA256 hash of it.
+        Args:
+            message: The message to be hashed via SHA256, a str or any object supporting the buffer protocol
+        """
+        return self.__class__(message).digest()
 
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
-    parser.add_argument('-f', type=str, required=True, help="Name of the file to find the checksum")
-    
-    args = parser.parse_args()
-    try:
-        with open(args.f, 'rb') as file:
-        
-        # Read the contents of the file
-            file_contents = file.read()
-            sha256 = SHA256()
-            print(sha256.generate_hash(file_contents).hex())
-    except FileNotFoundError:
-        logger.error("File does not exist")
-        
-        
\ No newline at end of file
+    from checksum import main
+    main('sha256')
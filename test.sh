@@ -4,14 +4,11 @@ FILES=(tests/test1.pdf tests/test2.txt tests/Nessus.deb)
 
 echo "--- SHA256 Test ---"
 for file in "${FILES[@]}"; do
-    start=$(date +%s.%N)
-    hash=$(python3 sha256.py -f "$file")
-    end=$(date +%s.%N)
-    time_taken=$(echo "$end $start" | awk '{print $1-$2}')
+    hash=$(python3 sha256.py -f "$file" | awk '{print $1}')
     # Compare the hashes using sha256sum which is command line utility
     sha256=$(sha256sum "$file" | awk '{print $1}')
     if [ "$hash" == "$sha256" ]; then
-        echo -e "Passed: $file  Time taken: $time_taken seconds"
+        echo -e "Passed: $file"
     else
         echo "Failed: $file"
     fi
@@ -20,16 +17,512 @@ echo -e "-------------------\n"
 
 echo "--- MD5 Test ---"
 for file in "${FILES[@]}"; do
-    start=$(date +%s.%N)
-    hash=$(python3 md5.py -f "$file")
-    end=$(date +%s.%N)
-    time_taken=$(echo "$end $start" | awk '{print $1-$2}')
+    hash=$(python3 md5.py -f "$file" | awk '{print $1}')
     # Compare the hashes using md5sum which is command line utility
-    sha256=$(md5sum "$file" | awk '{print $1}')
-    if [ "$hash" == "$sha256" ]; then
-        echo -e "Passed: $file  Time taken: $time_taken seconds"
+    md5=$(md5sum "$file" | awk '{print $1}')
+    if [ "$hash" == "$md5" ]; then
+        echo -e "Passed: $file"
     else
         echo "Failed: $file"
     fi
 done
 echo "----------------"
+
+echo "--- SHA-2 Family Test ---"
+for algo in sha224 sha384 sha512; do
+    for file in "${FILES[@]}"; do
+        hash=$(python3 sha2.py --algo $algo -f "$file" | awk '{print $1}')
+        # Compare the hashes using sha224sum/sha384sum/sha512sum which are command line utilities
+        expected=$(${algo}sum "$file" | awk '{print $1}')
+        if [ "$hash" == "$expected" ]; then
+            echo -e "Passed: $algo $file"
+        else
+            echo "Failed: $algo $file"
+        fi
+    done
+done
+echo "----------------"
+
+echo "--- Merkle Test ---"
+# The tree root must match one recomputed with hashlib, a corrupted byte must be pinned to its leaf,
+# and bytes appended after the last leaf must fail the size check
+workdir=$(mktemp -d)
+head -c 10000 /dev/urandom > "$workdir/data.bin"
+root=$(python3 sha256.py --tree 1024 --manifest -j 2 "$workdir/data.bin" | awk '{print $NF}')
+expected=$(python3 - "$workdir/data.bin" <<'PYTHON'
+import hashlib
+import sys
+
+data = open(sys.argv[1], 'rb').read()
+level = [hashlib.sha256(b'\x00' + data[i:i + 1024]).digest() for i in range(0, len(data), 1024)]
+while len(level) > 1:
+    # An odd node is promoted to the next level unchanged
+    level = [hashlib.sha256(b'\x01' + level[i] + level[i + 1]).digest() if i + 1 < len(level) else level[i]
+             for i in range(0, len(level), 2)]
+print(level[0].hex())
+PYTHON
+)
+if [ "$root" == "$expected" ] && python3 merkle.py "$workdir/data.bin.merkle.json" -f "$workdir/data.bin" -j 2 > /dev/null; then
+    echo "Passed: tree root"
+else
+    echo "Failed: tree root"
+fi
+cp "$workdir/data.bin" "$workdir/corrupt.bin"
+printf 'X' | dd of="$workdir/corrupt.bin" bs=1 seek=3000 conv=notrunc 2> /dev/null
+if python3 merkle.py "$workdir/data.bin.merkle.json" -f "$workdir/corrupt.bin" | grep -q "^Failed: leaf 2 "; then
+    echo "Passed: corrupted leaf"
+else
+    echo "Failed: corrupted leaf"
+fi
+cp "$workdir/data.bin" "$workdir/appended.bin"
+echo appended >> "$workdir/appended.bin"
+if ! python3 merkle.py "$workdir/data.bin.merkle.json" -f "$workdir/appended.bin" > /dev/null && \
+   python3 merkle.py "$workdir/data.bin.merkle.json" -f "$workdir/appended.bin" --range 0:5000 > /dev/null; then
+    echo "Passed: appended tail"
+else
+    echo "Failed: appended tail"
+fi
+rm -rf "$workdir"
+echo "----------------"
+
+echo "--- Throughput Test ---"
+# In-process throughput over the padding edges and small sizes, see bench.py for the full sweep up to 100 MB
+python3 bench.py --max-size 65536 --min-time 0.05
+echo "----------------"
+
+echo "--- Memory Test ---"
+# Peak allocation while hashing must stay flat as the message grows,
+# i.e. the input is never copied and only the padded tail is built
+python3 - <<'PYTHON'
+import tracemalloc
+import sha256
+import md5
+from sha256 import SHA256
+from md5 import MD5
+
+# Trace the buffer handling with the short reference compression functions, tracemalloc looks up the
+# line number of every allocation and that is very slow in the long generated straight-line functions
+sha256._compress = sha256.reference_compress
+md5._compress = md5.reference_compress
+
+for hasher in (SHA256, MD5):
+    peaks = []
+    for size in (1 << 14, 1 << 18):
+        message = bytearray(size)
+        tracemalloc.start()
+        hasher().generate_hash(message)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    if peaks[1] <= peaks[0] + 1024:
+        print("Passed: {}  Peak: {} bytes for {} KiB, {} bytes for {} KiB".format(
+            hasher.name, peaks[0], (1 << 14) >> 10, peaks[1], (1 << 18) >> 10))
+    else:
+        print("Failed: {}  Peak: {} bytes grew to {} bytes".format(hasher.name, peaks[0], peaks[1]))
+PYTHON
+echo "----------------"
+
+echo "--- Import Test ---"
+# Importing the modules must not generate the constant tables or the straight-line compression functions,
+# pull in worker pools or numpy, or configure logging. This is checked directly instead of through the import time,
+# which depends on the machine and is only reported next to that of hashlib
+import_time=$(python3 -X importtime -c "import sha256, md5, lea" 2>&1 | \
+    awk -F'|' '$3 ~ /^ (sha256|md5|lea)$/ {split($1, self, ":"); total += self[2]} END {print total}')
+hashlib_time=$(python3 -X importtime -c "import hashlib" 2>&1 | \
+    awk -F'|' '$3 ~ /^ (hashlib|_hashlib)$/ {split($1, self, ":"); total += self[2]} END {print total}')
+python3 - "$import_time" "$hashlib_time" <<'PYTHON'
+import sys
+
+# Functions that build tables or generate code, none of them may run on import
+GENERATORS = {'get_nth_prime', 'fract_64_prime', 'fract_8_prime', 'gen_K', 'verify_constants',
+              'generate_compress_source', 'load_compress'}
+calls = []
+def profile(frame, event, arg):
+    if event == 'call' and frame.f_code.co_name in GENERATORS and frame.f_globals.get('__name__') in ('sha256', 'md5', 'lea'):
+        calls.append('{}.{}'.format(frame.f_globals['__name__'], frame.f_code.co_name))
+
+sys.setprofile(profile)
+import sha256, md5, lea
+sys.setprofile(None)
+
+import logging
+heavy = [name for name in ('concurrent.futures', 'multiprocessing', 'numpy', 'checksum', 'dispatch') if name in sys.modules]
+handlers = len(logging.getLogger().handlers)
+generated = sha256._compress is not None or md5._compress is not None
+summary = "Time taken: {} us (hashlib {} us)".format(*sys.argv[1:])
+if not calls and not heavy and not handlers and not generated:
+    print("Passed: import  " + summary)
+else:
+    print("Failed: import  {}  calls {}  modules {}  root log handlers {}  compression generated {}".format(
+        summary, calls, heavy, handlers, generated))
+PYTHON
+echo "----------------"
+
+echo "--- HMAC Test ---"
+# RFC 4231 (HMAC-SHA256) and RFC 2202 (HMAC-MD5) test vectors, also cross-checked against Python's hmac module
+if python3 mac.py --self-test > /dev/null; then
+    echo "Passed: HMAC-SHA256 and HMAC-MD5 test vectors"
+else
+    echo "Failed: HMAC test vectors"
+fi
+echo "----------------"
+
+echo "--- State Test ---"
+# An exported state must resume to the same digest as hashlib, a state of the wrong size must be refused,
+# and the prefix cache must give the digests of a cold hash and evict its least recently used prefix
+python3 - <<'PYTHON'
+import hashlib
+import os
+import checksum
+from midstate import PrefixCache
+
+data = os.urandom(1000)
+for algorithm in ('sha256', 'md5', 'sha512'):
+    hasher = checksum.new(algorithm, data[:300])
+    state = hasher.export_state()
+    resumed = type(hasher).from_state(state).update(data[300:])
+    try:
+        type(hasher).from_state(state + bytes(hasher.block_size))
+        refused = False
+    except ValueError:
+        refused = True
+    if resumed.digest() == hashlib.new(algorithm, data).digest() and refused:
+        print("Passed: {} state round trip".format(algorithm))
+    else:
+        print("Failed: {} state round trip".format(algorithm))
+
+cache = PrefixCache('sha256', maxsize=2)
+cold = hashlib.sha256(b'header-a' + b'body').hexdigest()
+first = cache.hexdigest(b'header-a', b'body')
+second = cache.hexdigest(b'header-a', b'body')
+cache.midstate(b'header-b')
+cache.midstate(b'header-a')
+cache.midstate(b'header-c') # evicts header-b, the least recently used
+evicted = set(cache.export()) == {b'header-a', b'header-c'}
+if first == second == cold and (cache.hits, cache.misses) == (2, 3) and len(cache) == 2 and evicted:
+    print("Passed: prefix cache")
+else:
+    print("Failed: prefix cache  hits {}, misses {}, {}".format(cache.hits, cache.misses, sorted(cache.export())))
+PYTHON
+echo "----------------"
+
+echo "--- Service Test ---"
+# Start the hashing service on a Unix socket and check the digests of concurrent requests with the load generator
+socket=$(mktemp -u /tmp/hashd.XXXXXX)
+python3 hashd.py --unix "$socket" -j 2 2> /dev/null &
+service=$!
+for _ in $(seq 50); do [ -S "$socket" ] && break; sleep 0.1; done
+if latency=$(python3 loadgen.py --unix "$socket" -n 50 -c 4 --size 4096 | grep latency); then
+    echo "Passed: service  ${latency#latency: }"
+else
+    echo "Failed: service"
+fi
+kill $service
+wait $service 2> /dev/null
+rm -f "$socket"
+# A request cancelled while queued must leave the waiting count, and a failing pool must give a 500 response
+python3 - 2> /dev/null <<'PYTHON'
+import asyncio
+import tempfile
+import hashd
+
+async def check():
+    service = hashd.HashService(1, 1, pool='thread')
+    socket = tempfile.mktemp(prefix='hashd.')
+    server = await asyncio.start_unix_server(service.handle_connection, socket)
+    await service.limit.acquire()
+    queued = asyncio.ensure_future(service.handle_hash('sha256', {'content-length': '0'}, None, None))
+    await asyncio.sleep(0.05)
+    queued.cancel()
+    await asyncio.gather(queued, return_exceptions=True)
+    service.limit.release()
+
+    service.executor.shutdown()
+    reader, writer = await asyncio.open_unix_connection(socket)
+    writer.write(b'POST /sha256 HTTP/1.1\r\nContent-Length: 3\r\n\r\nabc')
+    status = (await reader.read()).split(b'\r\n')[0]
+    server.close()
+    return service.stats.waiting, status, service.stats.errors
+
+waiting, status, errors = asyncio.run(check())
+if waiting == 0 and status == b'HTTP/1.1 500 Internal Server Error' and errors == 1:
+    print("Passed: service errors")
+else:
+    print("Failed: service errors  waiting {}, {}, errors {}".format(waiting, status, errors))
+PYTHON
+echo "----------------"
+
+echo "--- Manifest Test ---"
+# The manifest must verify with sha256sum -c, and a second run must take every digest from the index
+workdir=$(mktemp -d)
+python3 treesum.py tests --index "$workdir/index.sqlite" -o "$workdir/first.sha256" -j 2 2> /dev/null
+summary=$(python3 treesum.py tests --index "$workdir/index.sqlite" -o "$workdir/second.sha256" -j 2 2>&1)
+if sha256sum -c --quiet "$workdir/first.sha256" && cmp -s "$workdir/first.sha256" "$workdir/second.sha256" && \
+   [ "${summary##*, }" = "0 rehashed" ] && python3 treesum.py --check "$workdir/first.sha256" -j 2 --quiet; then
+    echo "Passed: manifest  $summary on the second run"
+else
+    echo "Failed: manifest  $summary"
+fi
+rm -rf "$workdir"
+# With the default index and the manifest inside the tree, neither may end up in the manifest,
+# and a file modified just now must be rehashed by the next run instead of being trusted from the index
+workdir=$(mktemp -d)
+cp tests/test2.txt "$workdir/a.txt" && mkdir "$workdir/sub" && cp tests/test1.pdf "$workdir/sub/b.pdf"
+touch -d '1 hour ago' "$workdir/a.txt" "$workdir/sub/b.pdf"
+(cd "$workdir" && python3 "$OLDPWD/treesum.py" . -o tree.sha256 -j 2 2> /dev/null)
+echo fresh > "$workdir/new.txt"
+(cd "$workdir" && python3 "$OLDPWD/treesum.py" . -o tree.sha256 -j 2 2> /dev/null)
+summary=$(cd "$workdir" && python3 "$OLDPWD/treesum.py" . -o tree.sha256 -j 2 2>&1)
+if (cd "$workdir" && sha256sum -c --quiet tree.sha256) && ! grep -q "treesum\|tree.sha256" "$workdir/tree.sha256" && \
+   [ "$summary" = "3 files, 1 rehashed" ]; then
+    echo "Passed: manifest inside the tree  $summary"
+else
+    echo "Failed: manifest inside the tree  $summary"
+fi
+rm -rf "$workdir"
+echo "----------------"
+
+echo "--- Stats Test ---"
+# test2.txt is 299 bytes, i.e. four full blocks plus one padded tail block
+stats=$(python3 sha256.py tests/test2.txt --stats --breakdown 2>&1 > /dev/null)
+if echo "$stats" | grep -q "^sha256 blocks: 5$" && echo "$stats" | grep -q "^message bytes: 299$" && \
+   echo "$stats" | grep -q "^sha256.rounds "; then
+    echo "Passed: stats"
+else
+    echo "Failed: stats"
+fi
+echo "----------------"
+
+echo "--- Chunking Test ---"
+# Inserting bytes in the middle of a file must only add a few new chunks, and the chunks must add up to the file
+python3 - <<'PYTHON'
+import io
+import os
+from chunker import chunk_stream, ChunkIndex, hash_chunks
+
+original = os.urandom(1 << 18)
+edited = original[:100000] + b'inserted' + original[100000:]
+index = ChunkIndex()
+counts = []
+for name, data in (('original', original), ('edited', edited)):
+    entries = [(digest, len(chunk)) for _, digest, chunk in hash_chunks(chunk_stream(io.BytesIO(data)))]
+    new = index.add_file(name, entries)
+    counts.append((len(entries), len(new)))
+    assert sum(size for _, size in entries) == len(data)
+if counts[1][1] <= 2:
+    print("Passed: chunking  {} chunks, {} new after an insert".format(*counts[1]))
+else:
+    print("Failed: chunking  {} chunks, {} new after an insert".format(*counts[1]))
+PYTHON
+echo "----------------"
+
+echo "--- PBKDF2 Test ---"
+# RFC 7914 PBKDF2-HMAC-SHA256 vectors (the 80000 iteration one is skipped) and hashlib.pbkdf2_hmac for SHA256 and SHA512
+if python3 kdf.py --self-test --quick -j 2 > /dev/null; then
+    echo "Passed: PBKDF2-HMAC-SHA256 and PBKDF2-HMAC-SHA512"
+else
+    echo "Failed: PBKDF2"
+fi
+# The password midstates must not be left behind in the HMAC key cache
+if [ "$(python3 -c "import kdf, mac; kdf.pbkdf2_hmac('sha256', b'secret', b'salt', 2); print(mac.key_midstates.cache_info().currsize)")" == "0" ]; then
+    echo "Passed: no password midstates cached"
+else
+    echo "Failed: password midstates cached"
+fi
+echo "----------------"
+
+echo "--- Pipeline Test ---"
+# With storage as slow as hashing, the reader thread must be reading a later buffer during every update but the last.
+# This is counted by the throttled reader and does not depend on timing, the speed-up is only reported
+python3 - <<'PYTHON'
+from bench import pipeline_benchmark
+
+result = pipeline_benchmark(1 << 18, None, 2, 1 << 14)
+summary = "{overlapped} of {updates} updates overlapped a read  serial {serial:.3f} s, pipelined {pipelined:.3f} s".format(**result)
+if result['verified'] and result['overlapped'] == result['updates'] - 1:
+    print("Passed: pipeline  " + summary)
+else:
+    print("Failed: pipeline  " + summary)
+PYTHON
+echo "----------------"
+
+echo "--- Stdin Test ---"
+# Piped input must hash like sha256sum/md5sum, and --tee must pass the data through unchanged
+for file in "${FILES[@]}"; do
+    [ -f "$file" ] || continue
+    hash=$(python3 sha256.py < "$file" | awk '{print $1}')
+    teed=$(python3 md5.py --tee - < "$file" 2>&1 >/dev/null | awk '{print $1}')
+    if [ "$hash" == "$(sha256sum "$file" | awk '{print $1}')" ] && [ "$teed" == "$(md5sum "$file" | awk '{print $1}')" ] && \
+       cat "$file" | python3 sha256.py --tee 2> /dev/null | cmp -s - "$file"; then
+        echo "Passed: stdin $file"
+    else
+        echo "Failed: stdin $file"
+    fi
+done
+echo "----------------"
+
+echo "--- Dispatch Test ---"
+# Every backend forced through HASH_BACKEND must agree with hashlib, and the calibration must be read back from its cache
+cache=$(mktemp -u /tmp/calibration.XXXXXX)
+first=$(HASH_CALIBRATION_CACHE="$cache" python3 dispatch.py 2>&1)
+second=$(HASH_CALIBRATION_CACHE="$cache" python3 dispatch.py 2>&1)
+python3 - <<'PYTHON'
+import hashlib
+import os
+import dispatch
+
+messages = [b'', b'abc', bytes(55), bytes(56), os.urandom(1000)] * 8
+for backend in dispatch.BACKENDS:
+    dispatcher = dispatch.Dispatcher(allow_hashlib=True, backend=backend)
+    for algorithm in dispatch.ALGORITHMS:
+        if dispatcher.generate_hashes(algorithm, messages) == [hashlib.new(algorithm, m).digest() for m in messages]:
+            print("Passed: {} {}".format(backend, algorithm))
+        else:
+            print("Failed: {} {}".format(backend, algorithm))
+PYTHON
+# Forcing hashlib must not get around the opt-in
+if HASH_BACKEND=hashlib python3 dispatch.py > /dev/null 2>&1; then
+    echo "Failed: hashlib forced without being allowed"
+else
+    echo "Passed: hashlib forced without being allowed is refused"
+fi
+# A forced backend that cannot run here must be refused when the dispatcher is created, not on the first hash
+python3 - <<'PYTHON'
+import sys
+sys.modules['numpy'] = None # makes import numpy fail as if it were not installed
+import dispatch
+
+try:
+    dispatch.Dispatcher(backend='numpy')
+    print("Failed: numpy forced without numpy")
+except ValueError:
+    print("Passed: numpy forced without numpy is refused")
+PYTHON
+if echo "$first" | grep -q "^Calibrating" && ! echo "$second" | grep -q "^Calibrating" && [ -s "$cache" ]; then
+    echo "Passed: calibration cache"
+else
+    echo "Failed: calibration cache"
+fi
+rm -f "$cache"
+echo "----------------"
+
+echo "--- Multi-digest Test ---"
+# One pass over every file must give the MD5 and the SHA256 as tagged lines that md5sum -c and sha256sum -c accept
+digests=$(python3 sha256.py --algo md5,sha256 "${FILES[@]}" 2> /dev/null)
+for file in "${FILES[@]}"; do
+    [ -f "$file" ] || continue
+    if [ "$(echo "$digests" | grep -F "MD5 ($file) = ")" == "$(md5sum --tag "$file")" ] && \
+       [ "$(echo "$digests" | grep -F "SHA256 ($file) = ")" == "$(sha256sum --tag "$file")" ]; then
+        echo "Passed: md5,sha256 $file"
+    else
+        echo "Failed: md5,sha256 $file"
+    fi
+done
+echo "----------------"
+
+echo "--- Proof-of-work Test ---"
+# A nonce found by the worker processes must give a digest with the required leading zero bits according to hashlib
+python3 - <<'PYTHON'
+import hashlib
+import nonce
+
+for algorithm in nonce.SEARCH_ALGORITHMS:
+    result = nonce.solve(b'test.sh puzzle', 8, algorithm, jobs=2, chunk=512)
+    digest = hashlib.new(algorithm, b'test.sh puzzle' + nonce.nonce_bytes(result['nonce'])).digest()
+    if digest.hex() == result['digest'] and digest[0] == 0 and nonce.verify(b'test.sh puzzle', result['nonce'], 8, algorithm):
+        print("Passed: {}  nonce {} after {} hashes".format(algorithm, result['nonce'], result['hashes']))
+    else:
+        print("Failed: {}  nonce {}".format(algorithm, result['nonce']))
+PYTHON
+echo "----------------"
+
+echo "--- Command Line Test ---"
+# Options may come between the paths, and the output follows the order of -f and positional paths on the command line
+if [ "$(python3 sha256.py tests/test2.txt -j 2 -f tests/test1.pdf tests/test2.txt)" == \
+     "$(sha256sum tests/test2.txt tests/test1.pdf tests/test2.txt)" ]; then
+    echo "Passed: intermixed options and paths"
+else
+    echo "Failed: intermixed options and paths"
+fi
+echo "----------------"
+
+echo "--- Length Extension Test ---"
+# Only the row for the true length of the secret may verify, and the rows follow the order of --key-lengths
+workdir=$(mktemp -d)
+mac=$(python3 -c 'import hashlib; print(hashlib.sha256(b"hello" + b"user=joel&role=user").hexdigest())')
+python3 lea.py -m "user=joel&role=user" -e "&role=admin" --mac "$mac" --key-lengths 2:9 -o "$workdir/forged.jsonl" -j 2
+python3 - "$workdir/forged.jsonl" <<'PYTHON'
+import hashlib
+import json
+import sys
+
+with open(sys.argv[1]) as file:
+    rows = [json.loads(line) for line in file]
+lengths = [row['key_length'] for row in rows]
+valid = [row['key_length'] for row in rows
+         if row['mac'] == hashlib.sha256(b'hello' + bytes.fromhex(row['message'])).hexdigest()]
+if lengths == list(range(2, 10)) and valid == [5]:
+    print("Passed: --key-lengths 2:9 forges a valid MAC for the 5 byte secret")
+else:
+    print("Failed: --key-lengths 2:9  lengths {}  valid {}".format(lengths, valid))
+PYTHON
+for range in 9:2 -3:2; do
+    if python3 lea.py -m a -e b --mac "$mac" --key-lengths=$range > /dev/null 2>&1; then
+        echo "Failed: --key-lengths $range was accepted"
+    else
+        echo "Passed: --key-lengths $range is rejected"
+    fi
+done
+rm -rf "$workdir"
+echo "----------------"
+
+echo "--- Mmap Test ---"
+# Mapped regular files must match coreutils, empty files and pipes cannot be mapped and must fall back to chunked reads
+for file in "${FILES[@]}"; do
+    [ -f "$file" ] || continue
+    if [ "$(python3 sha256.py --mmap "$file")" == "$(sha256sum "$file")" ] && \
+       [ "$(python3 md5.py --mmap "$file")" == "$(md5sum "$file")" ]; then
+        echo "Passed: --mmap $file"
+    else
+        echo "Failed: --mmap $file"
+    fi
+done
+workdir=$(mktemp -d)
+: > "$workdir/empty"
+if [ "$(python3 sha256.py --mmap "$workdir/empty")" == "$(sha256sum "$workdir/empty")" ] && \
+   [ "$(python3 md5.py --mmap "$workdir/empty")" == "$(md5sum "$workdir/empty")" ]; then
+    echo "Passed: --mmap empty file"
+else
+    echo "Failed: --mmap empty file"
+fi
+rm -rf "$workdir"
+file=tests/test1.pdf
+expected=$(sha256sum "$file" | awk '{print $1}')
+if [ "$(cat "$file" | python3 sha256.py --mmap | awk '{print $1}')" == "$expected" ] && \
+   [ "$(python3 sha256.py --mmap <(cat "$file") | awk '{print $1}')" == "$expected" ]; then
+    echo "Passed: --mmap stdin and pipe"
+else
+    echo "Failed: --mmap stdin and pipe"
+fi
+python3 - "$file" <<'PYTHON'
+import os
+import sys
+import tempfile
+import checksum
+
+def mapped(file):
+    return checksum.update_mapped(checksum.new('sha256'), file)
+
+with open(sys.argv[1], 'rb') as file:
+    regular = mapped(file)
+with tempfile.TemporaryFile() as file:
+    empty = mapped(file)
+read_end, write_end = os.pipe()
+os.close(write_end)
+with open(read_end, 'rb') as file:
+    pipe = mapped(file)
+if regular and not empty and not pipe:
+    print("Passed: only the regular file is mapped")
+else:
+    print("Failed: mapped regular {}, empty {}, pipe {}".format(regular, empty, pipe))
+PYTHON
+echo "----------------"
@@ -0,0 +1,273 @@
+import logging
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import checksum
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX = '.treesum.sqlite'
+
+# Seconds a run waits for another run holding the index lock before giving up
+LOCK_TIMEOUT = 60
+
+# Files modified less than this long before a run are hashed but not indexed. Within one timestamp tick
+# (2 s on FAT, a coarse kernel clock elsewhere) a file can change again without its size or mtime changing.
+RACY_WINDOW_NS = 2 * 10**9
+
+# sqlite files kept next to the index while it is open
+INDEX_SIDECARS = ('', '-wal', '-shm', '-journal')
+
+class StatIndex:
+    """
+    Persistent index of file digests keyed by (path, device, inode, size, mtime_ns), stored in sqlite.
+    A file whose stat fields all match its row is not rehashed. The database runs in WAL mode and every
+    run writes its new rows in one short transaction, so concurrent runs can share the same index.
+    """
+    def __init__(self, path=DEFAULT_INDEX):
+        """
+        Args:
+            path: Path of the sqlite database, created if it does not exist
+        """
+        self.connection = sqlite3.connect(path, timeout=LOCK_TIMEOUT)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS digests ('
+                'path TEXT NOT NULL, algorithm TEXT NOT NULL, device INTEGER NOT NULL, inode INTEGER NOT NULL, '
+                'size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, digest TEXT NOT NULL, '
+                'PRIMARY KEY (path, algorithm)) WITHOUT ROWID')
+
+    def lookup(self, path, algorithm, info):
+        """
+        This function returns the indexed digest of a file, or None if the file is new or its stat fields changed.
+        Args:
+            path: Path of the file
+            algorithm: Name of the hash algorithm
+            info: os.stat_result of the file
+        """
+        row = self.connection.execute(
+            'SELECT digest FROM digests WHERE path = ? AND algorithm = ? AND device = ? AND inode = ? '
+            'AND size = ? AND mtime_ns = ?', (os.path.abspath(path), algorithm, info.st_dev, info.st_ino,
+                                              info.st_size, info.st_mtime_ns)).fetchone()
+        return row[0] if row else None
+
+    def store(self, entries):
+        """
+        This function records the digests of freshly hashed files in one transaction.
+        Args:
+            entries: Iterable of (path, algorithm, os.stat_result, digest)
+        """
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(os.path.abspath(path), algorithm, info.st_dev, info.st_ino, info.st_size, info.st_mtime_ns, digest)
+                 for path, algorithm, info, digest in entries])
+
+    def close(self):
+        self.connection.close()
+
+def same_file(before, after):
+    """
+    This function returns True if two stat results describe the same unmodified file.
+    Args:
+        before: os.stat_result taken before hashing
+        after: os.stat_result taken after hashing
+    """
+    return (before.st_dev, before.st_ino, before.st_size, before.st_mtime_ns) == \
+           (after.st_dev, after.st_ino, after.st_size, after.st_mtime_ns)
+
+def excluded_paths(index_path, output):
+    """
+    This function returns the real paths a run must not put in its manifest, because the run itself writes them:
+    the index with its sqlite sidecar files and the manifest.
+    Args:
+        index_path: Path of the index, None without one
+        output: Path of the manifest, '-' for stdout
+    """
+    excluded = set()
+    if index_path is not None:
+        excluded.update(os.path.realpath(index_path + suffix) for suffix in INDEX_SIDECARS)
+    if output != '-':
+        excluded.add(os.path.realpath(output))
+    return excluded
+
+def tree_checksum(paths, algorithm, index=None, jobs=1, use_mmap=False):
+    """
+    This function returns the (path, digest, error) of every file in input order together with the number of
+    files that had to be rehashed. Files whose stat fields match the index are taken from it, the others are
+    hashed in parallel and added to it, unless they changed while being hashed or were modified too recently
+    (see RACY_WINDOW_NS), in which case they are rehashed on the next run.
+    Args:
+        paths: List of files
+        algorithm: Name of the hash algorithm
+        index: StatIndex to consult and update, or None to hash every file
+        jobs: Number of worker processes
+        use_mmap: Hash the files through read-only memory mappings
+    """
+    racy_after = time.time_ns() - RACY_WINDOW_NS
+    digests = {}
+    errors = {}
+    infos = {}
+    stale = []
+    for path in paths:
+        try:
+            infos[path] = os.stat(path)
+        except OSError as error:
+            errors[path] = error
+            continue
+        digest = index.lookup(path, algorithm, infos[path]) if index is not None else None
+        if digest is None:
+            stale.append(path)
+        else:
+            digests[path] = digest
+
+    fresh = []
+    for path, digest, error in checksum.hash_files(stale, algorithm, jobs, use_mmap):
+        if error is not None:
+            errors[path] = error
+            continue
+        digests[path] = digest
+        try:
+            if same_file(infos[path], os.stat(path)) and infos[path].st_mtime_ns < racy_after:
+                fresh.append((path, algorithm, infos[path], digest))
+        except OSError:
+            pass
+    if index is not None and fresh:
+        index.store(fresh)
+
+    results = [(path, digests.get(path), errors.get(path)) for path in paths]
+    return results, len(stale)
+
+def write_manifest(results, output):
+    """
+    This function writes the digests as a manifest that `sha256sum -c`/`md5sum -c` can verify.
+    A file is written to a temporary name first and renamed, so readers never see a partial manifest.
+    Args:
+        results: List of (path, digest, error), failed files are left out
+        output: Path of the manifest, '-' for stdout
+    """
+    lines = ''.join(checksum.format_line(digest, path) + '\n' for path, digest, error in results if error is None)
+    if output == '-':
+        sys.stdout.write(lines)
+        return
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output)), prefix='.treesum-')
+    try:
+        with os.fdopen(descriptor, 'w') as file:
+            file.write(lines)
+        os.replace(temporary, output)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+def parse_manifest_line(line):
+    """
+    This function parses one sha256sum/md5sum line into (digest, path), undoing the backslash escaping.
+    Raises ValueError for malformed lines.
+    Args:
+        line: The line without its newline
+    """
+    escaped = line.startswith('\\')
+    if escaped:
+        line = line[1:]
+    digest, separator, path = line.partition(' ')
+    if not separator or not path or path[0] not in ' *':
+        raise ValueError("improperly formatted checksum line")
+    path = path[1:]
+    if escaped:
+        path = path.replace('\\\\', '\0').replace('\\n', '\n').replace('\0', '\\')
+    int(digest, 16)
+    return digest.lower(), path
+
+def check_manifests(manifests, algorithm, jobs=1, use_mmap=False, quiet=False):
+    """
+    This function verifies every file listed in the manifests, hashing them in parallel, and prints
+    "<path>: OK" or "<path>: FAILED" like `sha256sum -c`. Returns the exit status.
+    Args:
+        manifests: Paths of the manifests, '-' for stdin
+        algorithm: Name of the hash algorithm
+        jobs: Number of worker processes
+        use_mmap: Hash the files through read-only memory mappings
+        quiet: Do not print the files that are OK
+    """
+    entries = []
+    malformed = 0
+    for manifest in manifests:
+        file = sys.stdin if manifest == '-' else open(manifest)
+        with file:
+            for line in file:
+                try:
+                    entries.append(parse_manifest_line(line.rstrip('\n')))
+                except ValueError:
+                    malformed += 1
+
+    expected = [digest for digest, _ in entries]
+    paths = [path for _, path in entries]
+    mismatched = unreadable = 0
+    for wanted, (path, digest, error) in zip(expected, checksum.hash_files(paths, algorithm, jobs, use_mmap)):
+        if error is not None:
+            print("{}: FAILED open or read".format(path))
+            unreadable += 1
+        elif digest != wanted:
+            print("{}: FAILED".format(path))
+            mismatched += 1
+        elif not quiet:
+            print("{}: OK".format(path))
+    sys.stdout.flush()
+
+    if malformed:
+        logger.warning("WARNING: %d lines are improperly formatted", malformed)
+    if unreadable:
+        logger.warning("WARNING: %d listed files could not be read", unreadable)
+    if mismatched:
+        logger.warning("WARNING: %d computed checksums did NOT match", mismatched)
+    return 1 if malformed or unreadable or mismatched or not entries else 0
+
+if __name__ == "__main__":
+    logging.basicConfig(format='%(message)s')
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('files', nargs='*', help="Files, directories or glob patterns to put in the manifest")
+    parser.add_argument('--algo', choices=sorted(checksum.ALGORITHMS), default='sha256', help="Hash algorithm (default: sha256)")
+    parser.add_argument('-o', type=str, default='-', metavar='MANIFEST', help="Write the manifest to MANIFEST instead of stdout")
+    parser.add_argument('--index', type=str, default=DEFAULT_INDEX, help="sqlite index of known digests (default: {})".format(DEFAULT_INDEX))
+    parser.add_argument('--no-index', action='store_true', help="Rehash every file and leave the index alone")
+    parser.add_argument('-c', '--check', type=str, nargs='+', metavar='MANIFEST', help="Verify the files listed in the manifests ('-' for stdin)")
+    parser.add_argument('--quiet', action='store_true', help="With --check, only print the files that failed")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument('--mmap', action='store_true', help="Hash files through read-only memory mappings")
+
+    args = parser.parse_args()
+    if args.check:
+        if args.files:
+            parser.error("--check takes manifests, not files")
+        try:
+            exit(check_manifests(args.check, args.algo, args.jobs, args.mmap, args.quiet))
+        except FileNotFoundError as error:
+            logger.error("%s: No such file or directory", error.filename)
+            exit(1)
+
+    excluded = excluded_paths(None if args.no_index else args.index, args.o)
+    paths = [path for path in checksum.expand_paths(args.files) if os.path.realpath(path) not in excluded]
+    if not paths:
+        parser.error("no files given")
+
+    index = None if args.no_index else StatIndex(args.index)
+    try:
+        results, rehashed = tree_checksum(paths, args.algo, index, args.jobs, args.mmap)
+    finally:
+        if index is not None:
+            index.close()
+    write_manifest(results, args.o)
+
+    status = 0
+    for path, digest, error in results:
+        if error is not None:
+            logger.error("%s: %s", path, error.strerror or error)
+            status = 1
+    print("{} files, {} rehashed".format(len(results), rehashed), file=sys.stderr)
+    exit(status)